@@ -0,0 +1,177 @@
+"""
+Wall time, registered resources and tracemalloc peak of constructing WebSites under pulumi.runtime.Mocks,
+compared with benchmarks/baselines.json. Exits with 1 and a diff of the regressed metrics.
+
+    python -m benchmarks.bench_construction
+    python -m benchmarks.bench_construction --scenario sites-100 --update
+
+Wall time is compared as a ratio to a calibration loop run in the same process, so baselines stored on
+one machine hold on another. The 10,000 scenarios need several GB of memory, mostly for the Pulumi runtime,
+run them with --large; baselines.json has no entries for them until they are stored with --large --update.
+"""
+import argparse
+import json
+import os
+import sys
+import math
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# scenario: (number of WebSites, additional buckets per WebSite)
+SCENARIOS = {
+    'sites-1': (1, 0),
+    'sites-100': (100, 0),
+    'sites-1000': (1000, 0),
+    'sites-10000': (10000, 0),
+    'buckets-100': (1, 100),
+    'buckets-1000': (1, 1000),
+    'buckets-10000': (1, 10000),
+}
+LARGE_SCENARIOS = ['sites-10000', 'buckets-10000']
+
+# allowed increase over the baseline, resource counts have to match exactly
+TOLERANCES = {
+    'wall_ratio': 0.5,
+    'peak_mb': 0.2,
+}
+CALIBRATION_ROUNDS = 5
+CALIBRATION_SIZE = 200000
+
+
+def calibrate() -> float:
+    """
+    Best of CALIBRATION_ROUNDS runs of a fixed loop of object allocation and dict work, the unit of wall_ratio
+    """
+    best = math.inf
+    for _ in range(CALIBRATION_ROUNDS):
+        start = time.perf_counter()
+        objects = {}
+        for i in range(CALIBRATION_SIZE):
+            objects[f'key-{i}'] = {'id': i, 'name': str(i)}
+        sorted(objects, reverse=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_scenario(name: str) -> dict:
+    """
+    Runs in a fresh process, so the Pulumi runtime settings and tracemalloc start clean
+    """
+    import pulumi
+    from pulumi_aws_website import WebSite, config
+
+    sites, buckets = SCENARIOS[name]
+
+    class CountingMocks(pulumi.runtime.Mocks):
+        def __init__(self):
+            self.resources = Counter()
+
+        def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+            self.resources[args.typ] += 1
+            return args.name + '_id', args.inputs
+
+        def call(self, args: pulumi.runtime.MockCallArgs):
+            return {}
+
+    calibration = calibrate()
+    mocks = CountingMocks()
+    pulumi.runtime.set_mocks(mocks, preview=False)
+
+    @pulumi.runtime.test
+    def construct():
+        websites = []
+        for i in range(sites):
+            websites.append(WebSite(
+                f'bench-{i}',
+                stack='bench',
+                issue='bench',
+                zones={'ABCDEF123': [f'site-{i}.example.com']},
+                viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                additional_buckets_mapping={f'bucket-{b}': f'/bucket-{b}/*' for b in range(buckets)}))
+        # includes the time until every Output resolved
+        return pulumi.Output.all(*[w.distribution.id for w in websites])
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    construct()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'wall_seconds': round(elapsed, 3),
+        'wall_ratio': round(elapsed / calibration, 2),
+        'resources': sum(mocks.resources.values()),
+        'peak_mb': round(peak / 1024 / 1024, 2),
+        'resources_by_type': dict(sorted(mocks.resources.items())),
+    }
+
+
+def compare(name: str, baseline: dict, result: dict) -> list:
+    """
+    :return: Lines describing every regressed metric
+    """
+    regressions = []
+    if result['resources'] != baseline['resources']:
+        regressions.append(f'{name}: resources {baseline["resources"]} -> {result["resources"]}')
+        for typ in sorted(set(baseline.get('resources_by_type', {})) | set(result['resources_by_type'])):
+            before = baseline.get('resources_by_type', {}).get(typ, 0)
+            after = result['resources_by_type'].get(typ, 0)
+            if before != after:
+                regressions.append(f'    {typ}: {before} -> {after} ({after - before:+d})')
+    for metric, tolerance in TOLERANCES.items():
+        if metric not in baseline:
+            continue
+        before, after = baseline[metric], result[metric]
+        if after > before * (1 + tolerance):
+            regressions.append(f'{name}: {metric} {before} -> {after} (+{(after / before - 1) * 100:.0f}%, '
+                               f'tolerance {tolerance * 100:.0f}%)')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenarios to run, all but the large ones by default')
+    parser.add_argument('--large', action='store_true', help=f'Also run {", ".join(LARGE_SCENARIOS)}')
+    parser.add_argument('--update', action='store_true', help='Store the results as the new baselines')
+    parser.add_argument('--baselines', default=BASELINES)
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    regressions = []
+    print(f'{"scenario":<15} {"seconds":>9} {"ratio":>9} {"resources":>10} {"peak MB":>9}   baseline')
+    scenarios = args.scenario or [s for s in SCENARIOS if args.large or s not in LARGE_SCENARIOS]
+    for name in scenarios:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            result = executor.submit(run_scenario, name).result()
+        baseline = baselines.get(name)
+        reference = '-' if baseline is None else \
+            f'{baseline.get("wall_ratio", "-")}x {baseline["resources"]} {baseline["peak_mb"]:.1f}MB'
+        print(f'{name:<15} {result["wall_seconds"]:>9.2f} {result["wall_ratio"]:>8.2f}x {result["resources"]:>10} '
+              f'{result["peak_mb"]:>9.1f}   {reference}')
+        if args.update:
+            baselines[name] = result
+        elif baseline is not None:
+            regressions += compare(name, baseline, result)
+
+    if args.update:
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if regressions:
+        print('\nRegressions:', file=sys.stderr)
+        print('\n'.join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
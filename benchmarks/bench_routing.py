@@ -0,0 +1,87 @@
+"""
+Compares routing.PatternIndex with trying every path pattern with fnmatch, the way CloudFront orders them.
+
+    python -m benchmarks.bench_routing --urls 1000000 --behaviors 50
+"""
+import argparse
+import random
+import time
+from fnmatch import fnmatchcase
+
+from pulumi_aws_website.patterns import normalize_path_pattern
+from pulumi_aws_website.routing import PatternIndex
+
+
+def generate_patterns(n: int, rnd: random.Random):
+    patterns = []
+    for i in range(n):
+        kind = i % 5
+        if kind == 0:
+            patterns.append(f'/section-{i}/*')
+        elif kind == 1:
+            patterns.append(f'/section-{i - 1}/api/v?/*')
+        elif kind == 2:
+            patterns.append(f'/static/{i}/*.js')
+        elif kind == 3:
+            patterns.append(f'/exact-{i}.html')
+        else:
+            patterns.append(f'*.ext{i}')
+    rnd.shuffle(patterns)
+    return patterns
+
+
+def generate_urls(n: int, behaviors: int, unique: int, rnd: random.Random):
+    pool = []
+    for _ in range(unique):
+        i = rnd.randrange(behaviors * 2)
+        pool.append(rnd.choice([
+            f'/section-{i}/page-{rnd.randrange(1000)}.html',
+            f'/section-{i}/api/v{rnd.randrange(3)}/items/{rnd.randrange(100)}',
+            f'/static/{i}/chunk-{rnd.randrange(1000)}.js',
+            f'/exact-{i}.html',
+            f'/files/{rnd.randrange(1000)}.ext{i}',
+        ]))
+    return [rnd.choice(pool) for _ in range(n)]
+
+
+def naive(patterns, urls):
+    normalized = [normalize_path_pattern(p) for p in patterns]
+    output = []
+    for url in urls:
+        match = None
+        for i, pattern in enumerate(normalized):
+            if fnmatchcase(url, pattern):
+                match = i
+                break
+        output.append(match)
+    return output
+
+
+def indexed(patterns, urls):
+    first_match = PatternIndex(patterns).first_match
+    return [first_match(url) for url in urls]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', type=int, default=1000000)
+    parser.add_argument('--unique', type=int, default=200000, help='Number of distinct URLs')
+    parser.add_argument('--behaviors', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    patterns = generate_patterns(args.behaviors, rnd)
+    urls = generate_urls(args.urls, args.behaviors, args.unique, rnd)
+
+    results = {}
+    for name, fn in (('fnmatch', naive), ('index', indexed)):
+        start = time.perf_counter()
+        results[name] = fn(patterns, urls)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<8} {elapsed:8.2f}s {args.urls / elapsed:14,.0f} urls/s')
+    assert results['fnmatch'] == results['index'], 'resolutions differ'
+
+
+if __name__ == '__main__':
+    main()
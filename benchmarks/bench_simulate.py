@@ -0,0 +1,39 @@
+"""
+Simulates a Zipf workload against two behaviors with a daily invalidation, reports the time per million requests.
+
+    python -m benchmarks.bench_simulate --requests 100000000 --objects 1000000
+"""
+import argparse
+import resource
+import time
+
+from pulumi_aws_website import config
+from pulumi_aws_website import simulate
+from pulumi_aws_website.routing import BehaviorIndex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=10000000)
+    parser.add_argument('--objects', type=int, default=1000000)
+    parser.add_argument('--alpha', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=86400, help='Seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    trace = simulate.zipf_trace(args.requests, args.objects, alpha=args.alpha, duration=args.duration,
+                                seed=args.seed)
+    generated = time.perf_counter()
+    index = BehaviorIndex(config.CacheBehavior(default_ttl=3600),
+                          [config.CacheBehavior(path_pattern='/objects/1*', default_ttl=300)])
+    result = simulate.Simulator(index).run(trace, [simulate.Invalidation(args.duration / 2, ['/*'])])
+    elapsed = time.perf_counter() - generated
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'trace    {generated - start:8.2f}s')
+    print(f'simulate {elapsed:8.2f}s {args.requests / elapsed:14,.0f} requests/s, peak {peak:.0f} MB')
+    print(result.format())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,104 @@
 import json
-from copy import deepcopy
 from typing import Dict, List
 
 import pulumi
+import pulumi_aws
 from pulumi_aws import cloudfront
+from pulumi_aws import iam
 from pulumi_aws import route53
 from pulumi_aws import s3
 
 from pulumi_aws_website import config
+from pulumi_aws_website import dns
+from pulumi_aws_website import fingerprint
+from pulumi_aws_website import invalidation
+from pulumi_aws_website import routing
+from pulumi_aws_website import sync
+from pulumi_aws_website import tracing
 
 DEFAULT_ORIGIN_ID = 'S3ContentDefault'
+DEFAULT_REPLICA_ORIGIN_ID = 'S3ContentDefaultReplica'
+DEFAULT_ORIGIN_GROUP_ID = 'S3ContentDefaultGroup'
+
+
+class SharedResources:
+    """
+    Origin access identity and policies which can be used by several WebSites, see WebSiteFleet
+    """
+    origin_access_identity: cloudfront.OriginAccessIdentity
+    cache_policy_config: config.CachePolicy
+    cache_policy: cloudfront.CachePolicy
+    origin_request_policy: cloudfront.OriginRequestPolicy
+    response_headers_policy: cloudfront.ResponseHeadersPolicy
+
+    def __init__(self, origin_access_identity: cloudfront.OriginAccessIdentity,
+                 cache_policy_config: config.CachePolicy = None,
+                 cache_policy: cloudfront.CachePolicy = None,
+                 origin_request_policy: cloudfront.OriginRequestPolicy = None,
+                 response_headers_policy: cloudfront.ResponseHeadersPolicy = None):
+        self.origin_access_identity = origin_access_identity
+        self.cache_policy_config = cache_policy_config
+        self.cache_policy = cache_policy
+        self.origin_request_policy = origin_request_policy
+        self.response_headers_policy = response_headers_policy
+
+    @staticmethod
+    def create(resource_name: str, parent: pulumi.Resource,
+               cache_policy: config.CachePolicy = None,
+               origin_request_policy: config.OriginRequestPolicy = None,
+               precompressed: bool = False,
+               image_negotiation: bool = False) -> 'SharedResources':
+        """
+        :param resource_name: Name of the created resources, the identity gets an '-origin-access-identity' suffix
+        :param cache_policy: Cache policy used instead of TTLs and forwarded values of the behaviors
+        :param origin_request_policy: Origin request policy of every cache behavior
+        :param precompressed: Adds Vary: Accept-Encoding to responses, see WebSite
+        :param image_negotiation: Adds Vary: Accept to responses, see WebSite
+        """
+        opts = pulumi.ResourceOptions(parent=parent)
+        policy = None
+        if cache_policy is not None:
+            policy = cloudfront.CachePolicy(
+                resource_name,
+                name=resource_name,
+                comment=cache_policy.comment,
+                default_ttl=cache_policy.default_ttl,
+                min_ttl=cache_policy.min_ttl,
+                max_ttl=cache_policy.max_ttl,
+                parameters_in_cache_key_and_forwarded_to_origin=cache_policy.to_dict(),
+                opts=opts)
+
+        request_policy = None
+        if origin_request_policy is not None:
+            request_policy = cloudfront.OriginRequestPolicy(
+                resource_name,
+                name=resource_name,
+                comment=origin_request_policy.comment,
+                cookies_config=origin_request_policy.cookies_config(),
+                headers_config=origin_request_policy.headers_config(),
+                query_strings_config=origin_request_policy.query_strings_config(),
+                opts=opts)
+
+        response_headers_policy = None
+        vary = []
+        if image_negotiation:
+            vary.append('Accept')
+        if precompressed:
+            if cache_policy is None or not (cache_policy.enable_accept_encoding_brotli or
+                                            cache_policy.enable_accept_encoding_gzip):
+                raise Exception('precompressed requires a cache_policy with Accept-Encoding normalization')
+            vary.append('Accept-Encoding')
+        if vary:
+            response_headers_policy = cloudfront.ResponseHeadersPolicy(
+                resource_name,
+                name=resource_name,
+                custom_headers_config={
+                    'items': [{'header': 'Vary', 'value': ', '.join(vary), 'override': True}],
+                },
+                opts=opts)
+
+        oai = cloudfront.OriginAccessIdentity(f'{resource_name}-origin-access-identity', opts=opts)
+        return SharedResources(oai, cache_policy, policy, request_policy, response_headers_policy)
 
 
 class WebSite(pulumi.ComponentResource):
@@ -24,6 +113,20 @@ class WebSite(pulumi.ComponentResource):
                  additional_buckets_mapping: Dict[str, str] = None,
                  default_cache_behavior: config.CacheBehavior = None,
                  custom_error_responses: List[config.CustomErrorResponse] = None,
+                 cache_policy: config.CachePolicy = None,
+                 origin_request_policy: config.OriginRequestPolicy = None,
+                 precompressed: bool = False,
+                 image_negotiation: bool = False,
+                 origin_shield_region: str = None,
+                 replica_region: str = None,
+                 replica_origin_shield_region: str = None,
+                 custom_origins: List[config.CustomOrigin] = None,
+                 function_associations: List[config.FunctionAssociation] = None,
+                 shared_resources: SharedResources = None,
+                 distribution_depends_on: List[pulumi.Resource] = None,
+                 ipv6: bool = True,
+                 latency_routing: dns.LatencyRouting = None,
+                 tracer: tracing.Tracer = None,
                  opts: pulumi.ResourceOptions = None):
         """
         Constructs a WebSite.
@@ -35,12 +138,37 @@ class WebSite(pulumi.ComponentResource):
         :param zones: Map of zone_id: to domains names, for example {'12345ABCDE': ['example.com', 'www.example.com']}
             zone_id will use to create DNS alias to CloudFront Distribution
         :param default_cache_behavior: Default cache behavior configuration
+        :param cache_policy: Cache policy created once and used by the default and every additional cache behavior
+            instead of TTLs and forwarded values of the behaviors
+        :param origin_request_policy: Origin request policy created once and used by every cache behavior
+        :param precompressed: Buckets hold Brotli and Gzip variants made by compression.Precompress, adds
+            Vary: Accept-Encoding to responses. Requires a cache_policy normalizing Accept-Encoding and
+            a compression.origin_request_handler_code origin-request association which picks the variant
+        :param image_negotiation: Buckets hold image variants made by images.ImageVariants, adds Vary: Accept to
+            responses. Requires cache behaviors made by images.cache_behavior
+        :param origin_shield_region: Enables Origin Shield for the bucket origins in this region,
+            use the region of the buckets
+        :param replica_region: Creates a replica of every bucket in this region with S3 replication, every cache
+            behavior then targets an origin group which fails over to the replica on 5xx
+        :param replica_origin_shield_region: Origin Shield region of the replica origins, replica_region by default
+            if origin_shield_region is set
+        :param custom_origins: HTTP origins such as API or SSR backends, their cache behaviors follow the
+            additional bucket behaviors
+        :param function_associations: CloudFront Functions of the default and every additional bucket cache
+            behavior, see functions.RequestRules
+        :param shared_resources: Origin access identity and policies shared with other WebSites, created for this
+            WebSite from cache_policy, origin_request_policy, precompressed and image_negotiation by default
+        :param distribution_depends_on: Resources the CloudFront distribution waits for
+        :param ipv6: Enables IPv6 on the distribution and creates AAAA alias records next to the A records
+        :param latency_routing: Latency-based routing settings of the alias records
+        :param tracer: Records spans around the buckets, the distribution and the records, see tracing.Tracer
         """
         super().__init__('WebSite', name, None, opts)
         self.name = name
         self.stack = stack
         self.issue = issue
         self.zones = zones
+        self.tracer = tracer
         self.logging_config = logging_config
         self.viewer_certificate = viewer_certificate
         self.tags = {
@@ -49,84 +177,249 @@ class WebSite(pulumi.ComponentResource):
             'issue': self.issue,
         }
 
-        self.aliases = []
-        for _, domains_list in self.zones.items():
-            self.aliases += domains_list
+        self.aliases = dns.unique_domains(self.zones)
+        self.ipv6 = ipv6
 
         if default_cache_behavior is None:
-            behavior = config.CacheBehavior()
-            behavior.allowed_methods = ['GET', 'HEAD']
-            behavior.cached_methods = ['GET', 'HEAD']
-            behavior.compress = True
-            behavior.forwarded_values_cookies = 'none'
-            behavior.forwarded_values_headers = None
-            behavior.forwarded_values_query_string = True
-            behavior.path_pattern = None
-            behavior.min_ttl = 0
-            behavior.default_ttl = 3600
-            behavior.max_ttl = 86400
-            behavior.target_origin_id = DEFAULT_ORIGIN_ID
-            behavior.viewer_protocol_policy = config.VIEWER_PROTOCOL_POLICY_REDIRECT_TO_HTTPS
-            behavior.lambda_function_associations = []
-            self.default_cache_behavior = behavior
-        else:
-            self.default_cache_behavior = default_cache_behavior
+            default_cache_behavior = config.CacheBehavior(target_origin_id=DEFAULT_ORIGIN_ID)
 
         if lambda_function_associations is None:
             self.lambda_function_associations = []
         else:
             self.lambda_function_associations = lambda_function_associations
 
+        self.function_associations = function_associations or []
+
         if custom_error_responses is None:
             self.custom_error_responses = []
         else:
             self.custom_error_responses = custom_error_responses
 
-        oai = cloudfront.OriginAccessIdentity(
-            f'website-{self.name}-{self.stack}-origin-access-identity',
-            opts=pulumi.ResourceOptions(parent=self))
+        if shared_resources is None:
+            shared_resources = SharedResources.create(f'website-{self.name}-{self.stack}', self,
+                                                      cache_policy=cache_policy,
+                                                      origin_request_policy=origin_request_policy,
+                                                      precompressed=precompressed,
+                                                      image_negotiation=image_negotiation)
+        elif cache_policy is not None or origin_request_policy is not None or precompressed or image_negotiation:
+            raise Exception('cache_policy, origin_request_policy, precompressed and image_negotiation '
+                            'come from shared_resources')
+        self.shared_resources = shared_resources
+        self.cache_policy_config = shared_resources.cache_policy_config
+        self.cache_policy = shared_resources.cache_policy
+        self.origin_request_policy = shared_resources.origin_request_policy
+        self.response_headers_policy = shared_resources.response_headers_policy
+        self.distribution_depends_on = distribution_depends_on
 
-        self.default_bucket = self._create_bucket('default', oai)
-        default_origin = config.Origin(
-            domain_name=self.default_bucket.bucket_regional_domain_name,
-            origin_id=pulumi.Output.from_input(DEFAULT_ORIGIN_ID),
-            s3_origin_access_identity=oai.cloudfront_access_identity_path
-        )
+        self.origin_shield_region = origin_shield_region
+        self.replica_region = replica_region
+        if replica_origin_shield_region is None and origin_shield_region is not None:
+            replica_origin_shield_region = replica_region
+        self.replica_origin_shield_region = replica_origin_shield_region
+        self.replica_buckets = {}
+        self.origin_groups = []
+        if replica_region is not None:
+            self._create_replication_resources()
+
+        oai = shared_resources.origin_access_identity
 
         self.cache_behaviors = []
-        self.origins = [default_origin]
+        self.origins = []
+        self.buckets = {}
+        self.bucket_path_patterns = {}
+        self.default_bucket, _ = self._create_origin('default', oai, pulumi.Output.from_input(DEFAULT_ORIGIN_ID))
+        if replica_region is not None:
+            default_cache_behavior = default_cache_behavior.replace(target_origin_id=DEFAULT_ORIGIN_GROUP_ID)
+        if self.function_associations:
+            default_cache_behavior = default_cache_behavior.replace(function_associations=self.function_associations)
+        self.default_cache_behavior = self._with_policies(
+            default_cache_behavior.replace(lambda_function_associations=self.lambda_function_associations))
 
         if additional_buckets_mapping is not None:
             for b, path in additional_buckets_mapping.items():
-                bucket = self._create_bucket(b, oai)
-                cb = deepcopy(self.default_cache_behavior)
-                cb.lambda_function_associations = self.lambda_function_associations
-                cb.path_pattern = path
-                cb.target_origin_id = bucket.id
-                self.cache_behaviors.append(cb)
-                self.origins.append(config.Origin(
-                    domain_name=bucket.bucket_regional_domain_name,
-                    origin_id=bucket.id,
-                    s3_origin_access_identity=oai.cloudfront_access_identity_path)
-                )
-
-        self.default_cache_behavior.lambda_function_associations = self.lambda_function_associations
-        self._create_cloudfront()
-        record_aliases = [{
-            'evaluateTargetHealth': False,
-            'name': self.distribution.domain_name,
-            'zone_id': self.distribution.hosted_zone_id,
-            }]
-        i = 0
-        for zone_id, domains_list in self.zones.items():
-            for name in domains_list:
-                route53.Record(f'{name}-record-{i}',
-                               zone_id=zone_id,
-                               type='A',
-                               name=name,
-                               aliases=record_aliases,
-                               opts=pulumi.ResourceOptions(parent=self))
-                i += 1
+                bucket, target = self._create_origin(b, oai)
+                self.bucket_path_patterns[b] = path
+                self.cache_behaviors.append(self.default_cache_behavior.with_path(path, target))
+
+        self.custom_origins = custom_origins or []
+        for custom_origin in self.custom_origins:
+            self.origins.append(custom_origin)
+            self.cache_behaviors += custom_origin.cache_behaviors()
+
+        for issue in routing.find_pattern_issues([cb.path_pattern for cb in self.cache_behaviors]):
+            if issue.kind == routing.ISSUE_UNREACHABLE:
+                pulumi.log.warn(str(issue), resource=self)
+        with tracing.optional_span(self.tracer, 'create_cloudfront', website=f'{self.name}-{self.stack}') as span:
+            self._create_cloudfront()
+            span.track(self.distribution.id)
+        self.records = []
+        for record in dns.alias_records(self.zones, ipv6=ipv6, latency_routing=latency_routing):
+            with tracing.optional_span(self.tracer, 'create_record', website=f'{self.name}-{self.stack}',
+                                       record=record.resource_name) as span:
+                aliases = [pulumi.Alias(name=record.previous_name)] if record.previous_name else None
+                self.records.append(route53.Record(
+                    record.resource_name,
+                    **record.record_args(self.distribution.domain_name, self.distribution.hosted_zone_id),
+                    opts=pulumi.ResourceOptions(parent=self, aliases=aliases)))
+                span.track(self.records[-1].id)
+
+    def sync_content(self, source_dir: str, bucket: str = 'default', **kwargs) -> pulumi.Output:
+        """
+        Uploads new and changed files from a local build directory into one of the WebSite buckets
+        and deletes orphaned objects, see sync.ContentSync. Nothing is uploaded during preview.
+        The upload is not a resource: it runs in an apply callback once the bucket exists during every
+        `pulumi up`, is not part of the preview diff, is not undone by a failed update or `pulumi destroy`,
+        and can run before the distribution is updated.
+        :param source_dir: Local build directory
+        :param bucket: 'default' or a key of additional_buckets_mapping
+        :param kwargs: Passed to sync.ContentSync, for example max_workers or stages
+        :return: Output of sync.SyncResult, None during preview
+        """
+        def run(bucket_name):
+            if pulumi.runtime.is_dry_run():
+                return None
+            return sync.ContentSync(bucket_name, source_dir, **kwargs).run()
+
+        return self.buckets[bucket].id.apply(run)
+
+    def invalidation_plan(self, changed_keys: Dict[str, List[str]], all_keys: Dict[str, List[str]] = None,
+                          **kwargs) -> invalidation.InvalidationPlan:
+        """
+        Computes the CloudFront invalidations for changed objects, see invalidation.plan_invalidations.
+        Keys are mapped to viewer paths through the path_pattern of the bucket's cache behavior,
+        paths which CloudFront routes to another behavior are skipped.
+        :param changed_keys: Map of bucket ('default' or a key of additional_buckets_mapping) to changed keys,
+            for example {'default': website.sync_content(...).changed_keys}
+        :param all_keys: Map of bucket to every key viewers request, lets the planner avoid wildcards covering
+            unchanged objects. Leave out precompressed variants, changed_keys doesn't report them either
+        """
+        patterns = [cb.path_pattern for cb in self.cache_behaviors]
+
+        def viewer_paths(keys_by_bucket):
+            paths = set()
+            for bucket, keys in keys_by_bucket.items():
+                paths |= invalidation.paths_for_keys(keys, patterns, self.bucket_path_patterns.get(bucket),
+                                                     config.DEFAULT_ROOT_OBJECT)
+            return paths
+
+        return invalidation.plan_invalidations(viewer_paths(changed_keys),
+                                               viewer_paths(all_keys) if all_keys is not None else None,
+                                               **kwargs)
+
+    def check_cache_control(self, rules: List[fingerprint.CacheControlRule]) -> List[str]:
+        """
+        Checks Cache-Control rules of the content sync against the TTLs of every bucket cache behavior,
+        CloudFront cuts a max-age above max_ttl and raises one below min_ttl. Problems are logged as warnings.
+        :return: Problems found
+        """
+        problems = []
+        bucket_patterns = set(self.bucket_path_patterns.values())
+        bucket_behaviors = [cb for cb in self.cache_behaviors if cb.path_pattern in bucket_patterns]
+        for behavior in [self.default_cache_behavior] + bucket_behaviors:
+            name = f'cache behavior {behavior.path_pattern or "default"}'
+            if behavior.cache_policy_id is not None and self.cache_policy_config is not None:
+                ttls = self.cache_policy_config
+            else:
+                ttls = behavior
+            problems += fingerprint.check_ttls(rules, ttls.min_ttl, ttls.max_ttl, name)
+        for problem in problems:
+            pulumi.log.warn(problem, resource=self)
+        return problems
+
+    def _create_origin(self, name: str, origin_access_identity: cloudfront.OriginAccessIdentity,
+                       origin_id: pulumi.Output[str] = None):
+        """
+        Creates the bucket (and its replica) of an origin
+        :return: Bucket and the origin id cache behaviors should target
+        """
+        replica = None
+        if self.replica_region is not None:
+            replica = self._create_bucket(name, origin_access_identity, suffix='-replica',
+                                          provider=self.replica_provider)
+            self.replica_buckets[name] = replica
+        bucket = self._create_bucket(name, origin_access_identity, replica=replica)
+        self.buckets[name] = bucket
+        if origin_id is None:
+            origin_id = bucket.id
+        self.origins.append(config.Origin(
+            domain_name=bucket.bucket_regional_domain_name,
+            origin_id=origin_id,
+            s3_origin_access_identity=origin_access_identity.cloudfront_access_identity_path,
+            origin_shield_region=self.origin_shield_region))
+        if replica is None:
+            return bucket, origin_id
+
+        if name == 'default':
+            replica_origin_id = pulumi.Output.from_input(DEFAULT_REPLICA_ORIGIN_ID)
+            group_id = pulumi.Output.from_input(DEFAULT_ORIGIN_GROUP_ID)
+        else:
+            replica_origin_id = replica.id
+            group_id = bucket.id.apply(lambda i: f'{i}-group')
+        self.origins.append(config.Origin(
+            domain_name=replica.bucket_regional_domain_name,
+            origin_id=replica_origin_id,
+            s3_origin_access_identity=origin_access_identity.cloudfront_access_identity_path,
+            origin_shield_region=self.replica_origin_shield_region))
+        self.origin_groups.append(config.OriginGroup(
+            origin_id=group_id,
+            primary_origin_id=origin_id,
+            failover_origin_id=replica_origin_id))
+        return bucket, group_id
+
+    def _create_replication_resources(self):
+        self.replica_provider = pulumi_aws.Provider(f'website-{self.name}-{self.stack}-replica',
+                                                    region=self.replica_region,
+                                                    opts=pulumi.ResourceOptions(parent=self))
+        self.replication_role = iam.Role(f'website-{self.name}-{self.stack}-replication',
+                                         assume_role_policy=json.dumps({
+                                             'Version': '2012-10-17',
+                                             'Statement': [{
+                                                 'Effect': 'Allow',
+                                                 'Principal': {'Service': 's3.amazonaws.com'},
+                                                 'Action': 'sts:AssumeRole',
+                                             }],
+                                         }),
+                                         tags=self.tags,
+                                         opts=pulumi.ResourceOptions(parent=self))
+
+    @staticmethod
+    def _get_replication_policy(args):
+        source_arn, destination_arn = args
+        return json.dumps({
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Effect": "Allow",
+                    "Action": ["s3:GetReplicationConfiguration", "s3:ListBucket"],
+                    "Resource": f"{source_arn}"
+                },
+                {
+                    "Effect": "Allow",
+                    "Action": ["s3:GetObjectVersionForReplication", "s3:GetObjectVersionAcl",
+                               "s3:GetObjectVersionTagging"],
+                    "Resource": f"{source_arn}/*"
+                },
+                {
+                    "Effect": "Allow",
+                    "Action": ["s3:ReplicateObject", "s3:ReplicateDelete", "s3:ReplicateTags"],
+                    "Resource": f"{destination_arn}/*"
+                }
+            ]
+        })
+
+    def behavior_index(self, strict: bool = False) -> routing.BehaviorIndex:
+        """
+        Index resolving URLs to the cache behavior, origin and TTL of this WebSite, see routing.BehaviorIndex
+        """
+        return routing.BehaviorIndex.from_website(self, strict=strict)
+
+    def _with_policies(self, behavior: config.CacheBehavior) -> config.CacheBehavior:
+        def policy_id(policy):
+            return policy.id if policy is not None else None
+
+        return behavior.with_policies(cache_policy_id=policy_id(self.cache_policy),
+                                      origin_request_policy_id=policy_id(self.origin_request_policy),
+                                      response_headers_policy_id=policy_id(self.response_headers_policy))
 
     @staticmethod
     def _get_s3_policy(args):
@@ -150,39 +443,90 @@ class WebSite(pulumi.ComponentResource):
                     },
                     "Action": "s3:ListBucket",
                     "Resource": f"{bucket_iam_arn}"
+                },
+                {
+                    "Effect": "Deny",
+                    "Principal": {
+                        "AWS": f"{cf_iam_arn}"
+                    },
+                    "Action": "s3:GetObject",
+                    "Resource": f"{bucket_iam_arn}/{sync.MANIFEST_PREFIX}*"
                 }
             ]
         })
 
-    def _create_bucket(self, name, origin_access_identity):
-        bucket = s3.Bucket(f'website-{self.name}-{self.stack}-{name}', acl='private', tags=self.tags,
-                           opts=pulumi.ResourceOptions(parent=self))
-        s3.BucketPublicAccessBlock(f'website-{self.name}-{self.stack}-{name}',
-                                   bucket=bucket.id,
-                                   block_public_acls=True,
-                                   block_public_policy=True,
-                                   ignore_public_acls=True,
-                                   restrict_public_buckets=True,
-                                   opts=pulumi.ResourceOptions(parent=self))
-        s3.BucketPolicy(f'website-{self.name}-{self.stack}-{name}-policy',
-                        bucket=bucket.id,
-                        policy=pulumi.Output.all(origin_access_identity.iam_arn, bucket.arn).apply(self._get_s3_policy),
-                        opts=pulumi.ResourceOptions(parent=self))
+    def _create_bucket(self, name, origin_access_identity, suffix='', provider=None, replica=None):
+        """
+        :param suffix: Resource name suffix, '-replica' for replica buckets
+        :param provider: Provider of a replica bucket in another region
+        :param replica: Replica bucket, enables versioning and replication into it
+        """
+        resource_name = f'website-{self.name}-{self.stack}-{name}{suffix}'
+        with tracing.optional_span(self.tracer, 'create_bucket', website=f'{self.name}-{self.stack}',
+                                   bucket=resource_name) as span:
+            bucket, resources = self._create_bucket_resources(resource_name, origin_access_identity, provider, replica)
+            span.track(*[r.id for r in resources])
         return bucket
 
+    def _create_bucket_resources(self, resource_name, origin_access_identity, provider, replica):
+        """
+        :return: Bucket and every resource created for it
+        """
+        opts = pulumi.ResourceOptions(parent=self, provider=provider)
+        replication = {}
+        if provider is not None:
+            replication['versioning'] = {'enabled': True}
+        if replica is not None:
+            replication['versioning'] = {'enabled': True}
+            replication['replication_configuration'] = {
+                'role': self.replication_role.arn,
+                'rules': [{
+                    'id': 'website-replica',
+                    'status': 'Enabled',
+                    'destination': {
+                        'bucket': replica.arn,
+                        'storageClass': 'STANDARD',
+                    },
+                }],
+            }
+        bucket = s3.Bucket(resource_name, acl='private', tags=self.tags, opts=opts, **replication)
+        resources = [bucket]
+        resources.append(s3.BucketPublicAccessBlock(resource_name,
+                                                    bucket=bucket.id,
+                                                    block_public_acls=True,
+                                                    block_public_policy=True,
+                                                    ignore_public_acls=True,
+                                                    restrict_public_buckets=True,
+                                                    opts=opts))
+        resources.append(s3.BucketPolicy(f'{resource_name}-policy',
+                                         bucket=bucket.id,
+                                         policy=pulumi.Output.all(origin_access_identity.iam_arn,
+                                                                  bucket.arn).apply(self._get_s3_policy),
+                                         opts=opts))
+        if replica is not None:
+            resources.append(iam.RolePolicy(f'{resource_name}-replication',
+                                            role=self.replication_role.id,
+                                            policy=pulumi.Output.all(bucket.arn,
+                                                                     replica.arn).apply(self._get_replication_policy),
+                                            opts=pulumi.ResourceOptions(parent=self)))
+        return bucket, resources
+
     def _create_cloudfront(self):
         self.distribution = cloudfront.Distribution(f'website-{self.name}-{self.stack}',
                                                     aliases=self.aliases,
                                                     comment=f'website-{self.name}-{self.stack}',
                                                     default_cache_behavior=self.default_cache_behavior.to_dict(),
-                                                    default_root_object="index.html",
+                                                    default_root_object=config.DEFAULT_ROOT_OBJECT,
                                                     enabled=True,
-                                                    is_ipv6_enabled=True,
-                                                    logging_config=self.logging_config,
+                                                    is_ipv6_enabled=self.ipv6,
+                                                    logging_config=(self.logging_config.to_dict()
+                                                                    if self.logging_config else None),
                                                     ordered_cache_behaviors=list(map(lambda x: x.to_dict(),
                                                                                      self.cache_behaviors)),
                                                     origins=list(
                                                         map(lambda x: x.to_dict(), self.origins)),
+                                                    origin_groups=list(map(lambda x: x.to_dict(),
+                                                                           self.origin_groups)),
                                                     tags=self.tags,
                                                     custom_error_responses=list(map(lambda x: x.to_dict(),
                                                                                     self.custom_error_responses)),
@@ -192,4 +536,103 @@ class WebSite(pulumi.ComponentResource):
                                                         }
                                                     },
                                                     viewer_certificate=self.viewer_certificate.to_dict(),
-                                                    opts=pulumi.ResourceOptions(parent=self))
+                                                    opts=pulumi.ResourceOptions(
+                                                        parent=self, depends_on=self.distribution_depends_on))
+
+
+class WebSiteFleet(pulumi.ComponentResource):
+    """
+    Many WebSites from a declarative list, sharing one origin access identity, one logging bucket
+    and one set of cache, origin request and response headers policies. Bucket settings can't be shared,
+    every bucket of every site keeps its own public access block and bucket policy.
+    """
+    sites: Dict[str, WebSite]
+
+    def __init__(self,
+                 name: str,
+                 stack: str,
+                 issue: str,
+                 sites: List[Dict],
+                 cache_policy: config.CachePolicy = None,
+                 origin_request_policy: config.OriginRequestPolicy = None,
+                 precompressed: bool = False,
+                 image_negotiation: bool = False,
+                 logging: bool = True,
+                 log_retention_days: int = None,
+                 max_parallel: int = 10,
+                 opts: pulumi.ResourceOptions = None):
+        """
+        Constructs a WebSiteFleet.
+        :param sites: WebSite arguments of every site, for example
+            [{'name': 'docs', 'zones': {'12345ABCDE': ['docs.example.com']}, 'viewer_certificate': ...}],
+            stack and issue default to the ones of the fleet
+        :param logging: Creates a logging bucket, every site logs under its name prefix unless it sets logging_config
+        :param log_retention_days: Expires access logs after this many days
+        :param max_parallel: Number of CloudFront distributions created or updated at the same time,
+            every distribution waits for the one max_parallel sites before it
+        """
+        super().__init__('WebSiteFleet', name, None, opts)
+        if max_parallel < 1:
+            raise Exception(f'max_parallel must be positive, not {max_parallel}')
+        self.name = name
+        self.stack = stack
+        self.issue = issue
+        self.tags = {
+            'website-fleet': f'{self.name}-{self.stack}',
+            'stack': self.stack,
+            'issue': self.issue,
+        }
+        self.shared_resources = SharedResources.create(f'website-fleet-{self.name}-{self.stack}', self,
+                                                       cache_policy=cache_policy,
+                                                       origin_request_policy=origin_request_policy,
+                                                       precompressed=precompressed,
+                                                       image_negotiation=image_negotiation)
+        self.logging_bucket = None
+        if logging:
+            self.logging_bucket = self._create_logging_bucket(log_retention_days)
+
+        self.sites = {}
+        websites = []
+        for spec in sites:
+            kwargs = dict(spec)
+            site_name = kwargs.pop('name')
+            if site_name in self.sites:
+                raise Exception(f'Duplicate site {site_name}')
+            kwargs.setdefault('stack', self.stack)
+            kwargs.setdefault('issue', self.issue)
+            if self.logging_bucket is not None and kwargs.get('logging_config') is None:
+                kwargs['logging_config'] = config.LoggingConfig(bucket=self.logging_bucket.bucket_domain_name,
+                                                                include_cookies=False,
+                                                                prefix=f'{site_name}/')
+            if len(websites) >= max_parallel:
+                kwargs['distribution_depends_on'] = (list(kwargs.get('distribution_depends_on') or []) +
+                                                     [websites[-max_parallel].distribution])
+            site = WebSite(site_name,
+                           shared_resources=self.shared_resources,
+                           opts=pulumi.ResourceOptions(parent=self),
+                           **kwargs)
+            websites.append(site)
+            self.sites[site_name] = site
+
+        self.register_outputs({})
+
+    def _create_logging_bucket(self, log_retention_days: int = None) -> s3.Bucket:
+        resource_name = f'website-fleet-{self.name}-{self.stack}-logs'
+        opts = pulumi.ResourceOptions(parent=self)
+        lifecycle_rules = []
+        if log_retention_days is not None:
+            lifecycle_rules.append({'enabled': True, 'expiration': {'days': log_retention_days}})
+        bucket = s3.Bucket(resource_name, lifecycle_rules=lifecycle_rules, tags=self.tags, opts=opts)
+        # CloudFront writes logs through bucket ACLs
+        s3.BucketOwnershipControls(resource_name,
+                                   bucket=bucket.id,
+                                   rule={'object_ownership': 'BucketOwnerPreferred'},
+                                   opts=opts)
+        s3.BucketPublicAccessBlock(resource_name,
+                                   bucket=bucket.id,
+                                   block_public_acls=True,
+                                   block_public_policy=True,
+                                   ignore_public_acls=True,
+                                   restrict_public_buckets=True,
+                                   opts=opts)
+        return bucket
@@ -0,0 +1,239 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from pulumi_aws_website.sync import Stage, SyncObject
+
+ENCODING_BROTLI = 'br'
+ENCODING_GZIP = 'gzip'
+
+# suffix of the precompressed variant key, 'app.js' is stored as 'app.js', 'app.js.br' and 'app.js.gz'
+ENCODING_SUFFIXES = {
+    ENCODING_BROTLI: '.br',
+    ENCODING_GZIP: '.gz',
+}
+
+COMPRESSIBLE_CONTENT_TYPES = [
+    'text/',
+    'application/javascript',
+    'application/json',
+    'application/manifest+json',
+    'application/wasm',
+    'application/xml',
+    'application/xhtml+xml',
+    'application/rss+xml',
+    'application/atom+xml',
+    'application/vnd.ms-fontobject',
+    'font/ttf',
+    'font/otf',
+    'image/svg+xml',
+    'image/x-icon',
+    'image/vnd.microsoft.icon',
+]
+
+DEFAULT_MIN_SIZE = 1024
+# a variant is only uploaded when it is at most this fraction of the original size
+DEFAULT_MAX_RATIO = 0.9
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pulumi-aws-website', 'compressed')
+
+# extensions of keys which get a variant for every encoding, compressed or a copy of the original, so the handler
+# can rewrite without knowing the content
+COMPRESSIBLE_EXTENSIONS = [
+    '.html', '.htm', '.xhtml', '.css', '.js', '.mjs', '.map', '.json', '.webmanifest', '.wasm',
+    '.xml', '.rss', '.atom', '.txt', '.csv', '.md', '.svg', '.ico', '.eot', '.ttf', '.otf',
+]
+
+# Lambda@Edge origin-request handler which picks the precompressed variant.
+# It runs on cache misses only: with a cache policy which normalizes Accept-Encoding, CloudFront keeps
+# one cache entry per encoding and forwards the normalized header to the origin request.
+# The source depends on the encodings only, so content deploys don't publish a new function version.
+ORIGIN_REQUEST_HANDLER = """'use strict';
+const SUFFIXES = %(suffixes)s;
+const EXTENSIONS = new Set(%(extensions)s);
+
+exports.handler = async (event) => {
+    const request = event.Records[0].cf.request;
+    const dot = request.uri.lastIndexOf('.');
+    const extension = dot > request.uri.lastIndexOf('/') ? request.uri.slice(dot).toLowerCase() : '';
+    if (!EXTENSIONS.has(extension)) {
+        return request;
+    }
+    const header = request.headers['accept-encoding'];
+    const accepted = header ? header[0].value.split(',').map(e => e.trim().split(';')[0]) : [];
+    for (const [encoding, suffix] of SUFFIXES) {
+        if (accepted.includes(encoding)) {
+            request.uri = request.uri + suffix;
+            break;
+        }
+    }
+    return request;
+};
+"""
+
+
+def has_variants(key: str) -> bool:
+    """
+    Precompress stores a variant of key for every encoding
+    """
+    name = key.rsplit('/', 1)[-1]
+    dot = name.rfind('.')
+    return dot >= 0 and name[dot:].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def is_compressible(o: SyncObject, min_size: int = DEFAULT_MIN_SIZE) -> bool:
+    if o.size < min_size or 'Content-Encoding' in o.headers:
+        return False
+    content_type = o.headers.get('Content-Type', '').split(';')[0]
+    return any(content_type.startswith(t) for t in COMPRESSIBLE_CONTENT_TYPES)
+
+
+def _encodings(encodings: List[str] = None) -> List[str]:
+    encodings = encodings or [ENCODING_BROTLI, ENCODING_GZIP]
+    for e in encodings:
+        if e not in ENCODING_SUFFIXES:
+            raise Exception(f'Encoding must be < br | gzip >, not {e}')
+    return encodings
+
+
+def select_variant(uri: str, accept_encoding: str, encodings: List[str] = None) -> str:
+    """
+    Python twin of ORIGIN_REQUEST_HANDLER, returns the URI the origin request is rewritten to
+    """
+    if not has_variants(uri):
+        return uri
+    accepted = [e.strip().split(';')[0] for e in accept_encoding.split(',')] if accept_encoding else []
+    for encoding in _encodings(encodings):
+        if encoding in accepted:
+            return uri + ENCODING_SUFFIXES[encoding]
+    return uri
+
+
+def origin_request_handler_code(encodings: List[str] = None) -> str:
+    """
+    Source of the Lambda@Edge origin-request handler, encodings in order of preference
+    must be the ones of Precompress
+    """
+    suffixes = [[e, ENCODING_SUFFIXES[e]] for e in _encodings(encodings)]
+    return ORIGIN_REQUEST_HANDLER % {'suffixes': json.dumps(suffixes),
+                                     'extensions': json.dumps(COMPRESSIBLE_EXTENSIONS)}
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == ENCODING_GZIP:
+        out = io.BytesIO()
+        # mtime=0 keeps the output and therefore the manifest hash stable between builds
+        with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=9, mtime=0) as f:
+            f.write(data)
+        return out.getvalue()
+    if encoding == ENCODING_BROTLI:
+        try:
+            import brotli
+        except ImportError:
+            raise Exception('Brotli precompression requires brotli, '
+                            'install it with `pip install pulumi-aws-website[compression]`')
+        return brotli.compress(data, quality=11, lgwin=24)
+    raise Exception(f'Encoding must be < br | gzip >, not {encoding}')
+
+
+def _compress_to_cache(args: Tuple[str, bytes, str, str]) -> Tuple[str, int]:
+    """
+    Process pool worker, compresses a file or bytes into the cache and returns md5 and size of the variant
+    """
+    path, data, encoding, cache_path = args
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    compressed = compress(data, encoding)
+    md5 = hashlib.md5(compressed).hexdigest()
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(compressed)
+    with open(tmp + '.md5', 'w') as f:
+        f.write(md5)
+    os.replace(tmp + '.md5', cache_path + '.md5')
+    os.replace(tmp, cache_path)
+    return md5, len(compressed)
+
+
+class Precompress(Stage):
+    """
+    Sync pipeline stage which adds maximum level Brotli and Gzip variants of compressible objects.
+    Variants are cached on disk by source hash, so unchanged files are never compressed twice.
+    Every key with one of COMPRESSIBLE_EXTENSIONS gets a variant for every encoding, a copy of the original
+    when it is small, not compressible or doesn't compress well. Variants are never requested by viewers,
+    SyncResult.changed_keys reports the original key instead.
+    """
+    encodings: List[str]
+    cache_dir: str
+    min_size: int
+    max_ratio: float
+    max_workers: int
+    variants: List[str]
+
+    def __init__(self, encodings: List[str] = None, cache_dir: str = DEFAULT_CACHE_DIR,
+                 min_size: int = DEFAULT_MIN_SIZE, max_ratio: float = DEFAULT_MAX_RATIO, max_workers: int = None):
+        """
+        :param encodings: Subset of < br | gzip >, both by default
+        :param cache_dir: Directory of the content-addressed variant cache
+        :param min_size: Smaller objects are not compressed
+        :param max_ratio: Variants larger than this fraction of the original are not uploaded
+        :param max_workers: Size of the compression process pool, the number of CPUs by default
+        """
+        self.encodings = _encodings(encodings)
+        self.cache_dir = cache_dir
+        self.min_size = min_size
+        self.max_ratio = max_ratio
+        self.max_workers = max_workers
+        self.variants = []
+
+    def cache_path(self, o: SyncObject, encoding: str) -> str:
+        return os.path.join(self.cache_dir, o.md5[:2], o.md5 + ENCODING_SUFFIXES[encoding])
+
+    def process(self, objects: List[SyncObject]) -> List[SyncObject]:
+        eligible = [o for o in objects if has_variants(o.key) and is_compressible(o, self.min_size)]
+        compressed = {}
+        missing = []
+        for o in eligible:
+            for encoding in self.encodings:
+                cache_path = self.cache_path(o, encoding)
+                if os.path.exists(cache_path) and os.path.exists(cache_path + '.md5'):
+                    with open(cache_path + '.md5') as f:
+                        compressed[(o.key, encoding)] = (f.read(), os.path.getsize(cache_path))
+                else:
+                    missing.append((o, encoding))
+
+        if missing:
+            # objects produced by earlier stages are sent to the workers as bytes
+            work = [(o.path if o.data is None else None, o.data, e, self.cache_path(o, e)) for o, e in missing]
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                for (o, encoding), result in zip(missing, executor.map(_compress_to_cache, work, chunksize=16)):
+                    compressed[(o.key, encoding)] = result
+
+        output = list(objects)
+        self.variants = []
+        for o in objects:
+            if not has_variants(o.key):
+                continue
+            for encoding in self.encodings:
+                key = o.key + ENCODING_SUFFIXES[encoding]
+                md5, size = compressed.get((o.key, encoding), (None, None))
+                if md5 is not None and size <= o.size * self.max_ratio:
+                    headers = self._variant_headers(o.headers, encoding)
+                    output.append(SyncObject(key=key, path=self.cache_path(o, encoding), md5=md5, size=size,
+                                             headers=headers, fingerprinted=o.fingerprinted, variant_of=o.key))
+                else:
+                    output.append(SyncObject(key=key, path=o.path, data=o.data, md5=o.md5, size=o.size,
+                                             headers=o.headers, fingerprinted=o.fingerprinted, variant_of=o.key))
+                self.variants.append(key)
+        return output
+
+    @staticmethod
+    def _variant_headers(headers: Dict[str, str], encoding: str) -> Dict[str, str]:
+        variant = dict(headers)
+        variant['Content-Encoding'] = encoding
+        return variant
@@ -14,18 +14,92 @@ LAMBDA_EVENT_TYPES = [
     LAMBDA_EVENT_TYPE_VIEWER_RESPONSE,
 ]
 
+DEFAULT_ROOT_OBJECT = 'index.html'
 
-class LoggingConfig:
+
+def _freeze(cls, name: str, value):
+    if name in cls._sequences and value is not None:
+        return tuple(value)
+    return value
+
+
+def _restore(cls, values):
+    obj = object.__new__(cls)
+    for name, value in zip(cls.__slots__, values):
+        object.__setattr__(obj, name, _freeze(cls, name, value))
+    object.__setattr__(obj, '_dict', None)
+    return obj
+
+
+class _Frozen:
+    """
+    Immutable config value. replace() makes a copy which shares every unchanged value,
+    to_dict() is computed once per object. List fields named in _sequences are stored as tuples.
+    """
+    __slots__ = ('_dict',)
+    _sequences = ()
+
+    def _init(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, _freeze(type(self), name, value))
+        object.__setattr__(self, '_dict', None)
+        self._check()
+
+    def _check(self):
+        """
+        Raises when the values are invalid, runs for __init__ and replace()
+        """
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable, use replace(...)')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self):
+        return _restore, (type(self), tuple(getattr(self, name) for name in self.__slots__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({values})'
+
+    def replace(self, **changes):
+        unknown = set(changes) - set(self.__slots__)
+        if unknown:
+            raise TypeError(f'{type(self).__name__} has no {", ".join(sorted(unknown))}')
+        result = _restore(type(self), tuple(changes[name] if name in changes else getattr(self, name)
+                                            for name in self.__slots__))
+        result._check()
+        return result
+
+    def to_dict(self) -> Dict:
+        """
+        Cached, the returned dict must not be modified
+        """
+        if self._dict is None:
+            object.__setattr__(self, '_dict', self._to_dict())
+        return self._dict
+
+    def _to_dict(self) -> Dict:
+        raise NotImplementedError
+
+
+class LoggingConfig(_Frozen):
+    __slots__ = ('bucket', 'include_cookies', 'prefix')
     bucket: str
     include_cookies: bool
     prefix: str
 
     def __init__(self, bucket: str, include_cookies: bool, prefix: str):
-        self.bucket = bucket
-        self.include_cookies = include_cookies
-        self.prefix = prefix
+        self._init(bucket=bucket, include_cookies=include_cookies, prefix=prefix)
 
-    def to_dict(self) -> Dict[str, str]:
+    def _to_dict(self) -> Dict[str, str]:
         return {
             'bucket': self.bucket,
             'includeCookies': self.include_cookies,
@@ -33,7 +107,8 @@ class LoggingConfig:
         }
 
 
-class LambdaFunctionAssociation:
+class LambdaFunctionAssociation(_Frozen):
+    __slots__ = ('event_type', 'lambda_arn', 'include_body')
     event_type: str
     lambda_arn: pulumi.Input[str]
     include_body: bool
@@ -43,11 +118,9 @@ class LambdaFunctionAssociation:
             raise Exception(f'Lambda edge event type must be '
                             f'< viewer-request | origin-request | viewer-response | origin-response >, '
                             f'not {event_type}')
-        self.event_type = event_type
-        self.lambda_arn = lambda_arn
-        self.include_body = include_body
+        self._init(event_type=event_type, lambda_arn=lambda_arn, include_body=include_body)
 
-    def to_dict(self) -> Dict[str, str]:
+    def _to_dict(self) -> Dict[str, str]:
         return {
             'eventType': self.event_type,
             'lambdaArn': self.lambda_arn,
@@ -55,26 +128,229 @@ class LambdaFunctionAssociation:
         }
 
 
-class Origin:
+FUNCTION_EVENT_TYPE_VIEWER_REQUEST = 'viewer-request'
+FUNCTION_EVENT_TYPE_VIEWER_RESPONSE = 'viewer-response'
+
+FUNCTION_EVENT_TYPES = [
+    FUNCTION_EVENT_TYPE_VIEWER_REQUEST,
+    FUNCTION_EVENT_TYPE_VIEWER_RESPONSE,
+]
+
+
+class FunctionAssociation(_Frozen):
+    __slots__ = ('event_type', 'function_arn')
+    event_type: str
+    function_arn: pulumi.Input[str]
+
+    def __init__(self, event_type: str, function_arn: pulumi.Input[str]):
+        """
+        CloudFront Functions association, see functions.RequestRules for generated viewer-request functions
+        """
+        if event_type not in FUNCTION_EVENT_TYPES:
+            raise Exception(f'CloudFront function event type must be < viewer-request | viewer-response >, '
+                            f'not {event_type}')
+        self._init(event_type=event_type, function_arn=function_arn)
+
+    def _to_dict(self) -> Dict[str, str]:
+        return {
+            'eventType': self.event_type,
+            'functionArn': self.function_arn,
+        }
+
+
+class Origin(_Frozen):
+    __slots__ = ('domain_name', 'origin_id', 's3_origin_access_identity', 'origin_shield_region')
     domain_name: pulumi.Output[str]
     origin_id: pulumi.Output[str]
     s3_origin_access_identity: pulumi.Output[str]
+    origin_shield_region: str
 
     def __init__(self, domain_name: pulumi.Output[str],
                  origin_id: pulumi.Output[str],
-                 s3_origin_access_identity: pulumi.Output[str]):
-        self.domain_name = domain_name
-        self.origin_id = origin_id
-        self.s3_origin_access_identity = s3_origin_access_identity
+                 s3_origin_access_identity: pulumi.Output[str],
+                 origin_shield_region: str = None):
+        """
+        :param origin_shield_region: Enables Origin Shield in this region, an additional caching layer
+            in front of the origin. Choose the region of the bucket or the closest one.
+            https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/origin-shield.html
+        """
+        self._init(domain_name=domain_name, origin_id=origin_id, s3_origin_access_identity=s3_origin_access_identity,
+                   origin_shield_region=origin_shield_region)
 
-    def to_dict(self) -> Dict:
-        return {
+    def _to_dict(self) -> Dict:
+        output = {
             "domain_name": self.domain_name,
             "originId": self.origin_id,
             "s3OriginConfig": {
                 "originAccessIdentity": self.s3_origin_access_identity,
             },
         }
+        if self.origin_shield_region is not None:
+            output["originShield"] = {
+                "enabled": True,
+                "originShieldRegion": self.origin_shield_region,
+            }
+        return output
+
+
+FAILOVER_STATUS_CODES = [500, 502, 503, 504]
+
+
+class OriginGroup(_Frozen):
+    __slots__ = ('origin_id', 'primary_origin_id', 'failover_origin_id', 'status_codes')
+    _sequences = ('status_codes',)
+    origin_id: pulumi.Input[str]
+    primary_origin_id: pulumi.Input[str]
+    failover_origin_id: pulumi.Input[str]
+    status_codes: [int]
+
+    def __init__(self, origin_id: pulumi.Input[str],
+                 primary_origin_id: pulumi.Input[str],
+                 failover_origin_id: pulumi.Input[str],
+                 status_codes: [int] = None):
+        """
+        Origin group, CloudFront retries a request on the failover origin when the primary one
+        responds with one of status_codes. Cache behaviors target the group by origin_id.
+        :param status_codes: Failover status codes, 5xx by default
+        """
+        self._init(origin_id=origin_id, primary_origin_id=primary_origin_id, failover_origin_id=failover_origin_id,
+                   status_codes=status_codes if status_codes is not None else FAILOVER_STATUS_CODES)
+
+    def _to_dict(self) -> Dict:
+        return {
+            'originId': self.origin_id,
+            'failoverCriteria': {
+                'statusCodes': list(self.status_codes),
+            },
+            'members': [
+                {'originId': self.primary_origin_id},
+                {'originId': self.failover_origin_id},
+            ],
+        }
+
+
+CACHE_KEY_BEHAVIOR_NONE = 'none'
+CACHE_KEY_BEHAVIOR_WHITELIST = 'whitelist'
+CACHE_KEY_BEHAVIOR_ALL_EXCEPT = 'allExcept'
+CACHE_KEY_BEHAVIOR_ALL = 'all'
+ORIGIN_REQUEST_HEADER_BEHAVIOR_ALL_VIEWER = 'allViewer'
+ORIGIN_REQUEST_HEADER_BEHAVIOR_ALL_VIEWER_AND_WHITELIST_CLOUDFRONT = 'allViewerAndWhitelistCloudFront'
+
+
+def _cache_key_items(behavior_key: str, behavior: str, items_key: str, items: [str]) -> Dict:
+    if behavior is None:
+        behavior = CACHE_KEY_BEHAVIOR_WHITELIST if items else CACHE_KEY_BEHAVIOR_NONE
+    output = {behavior_key: behavior}
+    if items:
+        output[items_key] = {'items': sorted(items)}
+    return output
+
+
+class _RequestValues(_Frozen):
+    __slots__ = ()
+    _sequences = ('query_strings', 'headers', 'cookies')
+    query_strings: [str]
+    query_string_behavior: str
+    headers: [str]
+    header_behavior: str
+    cookies: [str]
+    cookie_behavior: str
+
+    def cookies_config(self) -> Dict:
+        return _cache_key_items('cookieBehavior', self.cookie_behavior, 'cookies', self.cookies)
+
+    def headers_config(self) -> Dict:
+        return _cache_key_items('headerBehavior', self.header_behavior, 'headers', self.headers)
+
+    def query_strings_config(self) -> Dict:
+        return _cache_key_items('queryStringBehavior', self.query_string_behavior, 'queryStrings', self.query_strings)
+
+
+class CachePolicy(_RequestValues):
+    __slots__ = ('comment', 'default_ttl', 'min_ttl', 'max_ttl', 'query_strings', 'query_string_behavior', 'headers',
+                 'header_behavior', 'cookies', 'cookie_behavior', 'enable_accept_encoding_brotli',
+                 'enable_accept_encoding_gzip')
+    comment: str
+    default_ttl: int
+    min_ttl: int
+    max_ttl: int
+    enable_accept_encoding_brotli: bool
+    enable_accept_encoding_gzip: bool
+
+    def __init__(self, default_ttl: int = 3600, min_ttl: int = 0, max_ttl: int = 86400,
+                 query_strings: [str] = None, query_string_behavior: str = None,
+                 headers: [str] = None, header_behavior: str = None,
+                 cookies: [str] = None, cookie_behavior: str = None,
+                 enable_accept_encoding_brotli: bool = True,
+                 enable_accept_encoding_gzip: bool = True,
+                 comment: str = None):
+        """
+        CloudFront cache policy, controls TTLs and which parts of a request form the cache key.
+            https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/controlling-the-cache-key.html
+        By default the cache key is the URL path only, so tracking parameters like utm_* don't split the cache.
+        :param query_strings: Allowlist of query string parameters in the cache key
+        :param query_string_behavior: < none | whitelist | allExcept | all >, by default whitelist if
+            query_strings are given and none otherwise
+        :param headers: Allowlist of headers in the cache key
+        :param header_behavior: < none | whitelist >, derived from headers by default
+        :param cookies: Allowlist of cookies in the cache key
+        :param cookie_behavior: < none | whitelist | allExcept | all >, derived from cookies by default
+        :param enable_accept_encoding_brotli: Add normalized Accept-Encoding to the cache key so Brotli
+            responses are cached
+        :param enable_accept_encoding_gzip: Add normalized Accept-Encoding to the cache key so Gzip
+            responses are cached
+        """
+        self._init(comment=comment,
+                   default_ttl=default_ttl,
+                   min_ttl=min_ttl,
+                   max_ttl=max_ttl,
+                   query_strings=query_strings,
+                   query_string_behavior=query_string_behavior,
+                   headers=headers,
+                   header_behavior=header_behavior,
+                   cookies=cookies,
+                   cookie_behavior=cookie_behavior,
+                   enable_accept_encoding_brotli=enable_accept_encoding_brotli,
+                   enable_accept_encoding_gzip=enable_accept_encoding_gzip)
+
+    def _to_dict(self) -> Dict:
+        """
+        parametersInCacheKeyAndForwardedToOrigin of cloudfront.CachePolicy
+        """
+        return {
+            'cookiesConfig': self.cookies_config(),
+            'headersConfig': self.headers_config(),
+            'queryStringsConfig': self.query_strings_config(),
+            'enableAcceptEncodingBrotli': self.enable_accept_encoding_brotli,
+            'enableAcceptEncodingGzip': self.enable_accept_encoding_gzip,
+        }
+
+
+class OriginRequestPolicy(_RequestValues):
+    __slots__ = ('comment', 'query_strings', 'query_string_behavior', 'headers', 'header_behavior', 'cookies',
+                 'cookie_behavior')
+    comment: str
+
+    def __init__(self, query_strings: [str] = None, query_string_behavior: str = None,
+                 headers: [str] = None, header_behavior: str = None,
+                 cookies: [str] = None, cookie_behavior: str = None,
+                 comment: str = None):
+        """
+        CloudFront origin request policy, values sent to the origin in addition to the cache key.
+        Values which are only forwarded don't split the cache.
+            https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/controlling-origin-requests.html
+        :param query_string_behavior: < none | whitelist | all >, derived from query_strings by default
+        :param header_behavior: < none | whitelist | allViewer | allViewerAndWhitelistCloudFront >,
+            derived from headers by default
+        :param cookie_behavior: < none | whitelist | all >, derived from cookies by default
+        """
+        self._init(comment=comment,
+                   query_strings=query_strings,
+                   query_string_behavior=query_string_behavior,
+                   headers=headers,
+                   header_behavior=header_behavior,
+                   cookies=cookies,
+                   cookie_behavior=cookie_behavior)
 
 
 VIEWER_PROTOCOL_POLICY_HTTP_ONLY = 'http-only'
@@ -83,7 +359,13 @@ VIEWER_PROTOCOL_POLICY_REDIRECT_TO_HTTPS = 'redirect-to-https'
 VIEWER_PROTOCOL_POLICY_MATCH_VIEWER = 'match-viewer'
 
 
-class CacheBehavior:
+class CacheBehavior(_Frozen):
+    __slots__ = ('allowed_methods', 'cached_methods', 'compress', 'default_ttl', 'min_ttl', 'max_ttl', 'path_pattern',
+                 'target_origin_id', 'viewer_protocol_policy', 'forwarded_values_cookies', 'forwarded_values_headers',
+                 'forwarded_values_query_string', 'lambda_function_associations', 'function_associations',
+                 'cache_policy_id', 'origin_request_policy_id', 'response_headers_policy_id')
+    _sequences = ('allowed_methods', 'cached_methods', 'forwarded_values_headers', 'lambda_function_associations',
+                  'function_associations')
     allowed_methods: [str]
     cached_methods: [str]
     compress: bool
@@ -91,38 +373,261 @@ class CacheBehavior:
     min_ttl: int
     max_ttl: int
     path_pattern: str
-    target_origin_id: str
+    target_origin_id: pulumi.Input[str]
     viewer_protocol_policy: str
     forwarded_values_cookies: str
     forwarded_values_headers: [str]
     forwarded_values_query_string: bool
     lambda_function_associations: [LambdaFunctionAssociation]
+    function_associations: [FunctionAssociation]
+    cache_policy_id: pulumi.Input[str]
+    origin_request_policy_id: pulumi.Input[str]
+    response_headers_policy_id: pulumi.Input[str]
 
-    def to_dict(self) -> Dict:
+    def __init__(self, allowed_methods: [str] = None,
+                 cached_methods: [str] = None,
+                 compress: bool = True,
+                 default_ttl: int = 3600,
+                 min_ttl: int = 0,
+                 max_ttl: int = 86400,
+                 path_pattern: str = None,
+                 target_origin_id: pulumi.Input[str] = None,
+                 viewer_protocol_policy: str = VIEWER_PROTOCOL_POLICY_REDIRECT_TO_HTTPS,
+                 forwarded_values_cookies: str = 'none',
+                 forwarded_values_headers: [str] = None,
+                 forwarded_values_query_string: bool = True,
+                 lambda_function_associations: [LambdaFunctionAssociation] = None,
+                 function_associations: [FunctionAssociation] = None,
+                 cache_policy_id: pulumi.Input[str] = None,
+                 origin_request_policy_id: pulumi.Input[str] = None,
+                 response_headers_policy_id: pulumi.Input[str] = None):
+        """
+        Cache behavior, the defaults are the ones of the WebSite default cache behavior.
+        Derive variants with replace(...), with_path(...) and with_policies(...).
+        :param allowed_methods: ['GET', 'HEAD'] by default, list arguments are stored as tuples
+        :param cached_methods: ['GET', 'HEAD'] by default
+        :param cache_policy_id: When set TTLs and forwarded_values_* are ignored, the policy defines the cache key
+        """
+        self._init(allowed_methods=allowed_methods if allowed_methods is not None else ['GET', 'HEAD'],
+                   cached_methods=cached_methods if cached_methods is not None else ['GET', 'HEAD'],
+                   compress=compress,
+                   default_ttl=default_ttl,
+                   min_ttl=min_ttl,
+                   max_ttl=max_ttl,
+                   path_pattern=path_pattern,
+                   target_origin_id=target_origin_id,
+                   viewer_protocol_policy=viewer_protocol_policy,
+                   forwarded_values_cookies=forwarded_values_cookies,
+                   forwarded_values_headers=forwarded_values_headers,
+                   forwarded_values_query_string=forwarded_values_query_string,
+                   lambda_function_associations=lambda_function_associations or [],
+                   function_associations=function_associations or [],
+                   cache_policy_id=cache_policy_id,
+                   origin_request_policy_id=origin_request_policy_id,
+                   response_headers_policy_id=response_headers_policy_id)
+
+    def _check(self):
+        conflicts = ({a.event_type for a in self.lambda_function_associations} &
+                     {a.event_type for a in self.function_associations})
+        if conflicts:
+            raise Exception(f'Cache behavior {self.path_pattern or "default"} has a Lambda@Edge and a CloudFront '
+                            f'Function association for {", ".join(sorted(conflicts))}, CloudFront allows only one')
+
+    def with_path(self, path_pattern: str, target_origin_id: pulumi.Input[str] = None) -> 'CacheBehavior':
+        """
+        Copy routing path_pattern, to target_origin_id if given
+        """
+        if target_origin_id is None:
+            return self.replace(path_pattern=path_pattern)
+        return self.replace(path_pattern=path_pattern, target_origin_id=target_origin_id)
+
+    def with_policies(self, cache_policy_id: pulumi.Input[str] = None,
+                      origin_request_policy_id: pulumi.Input[str] = None,
+                      response_headers_policy_id: pulumi.Input[str] = None) -> 'CacheBehavior':
+        """
+        Copy using the given policies, policies which are None are kept
+        """
+        changes = {name: value for name, value in (('cache_policy_id', cache_policy_id),
+                                                   ('origin_request_policy_id', origin_request_policy_id),
+                                                   ('response_headers_policy_id', response_headers_policy_id))
+                   if value is not None}
+        return self.replace(**changes) if changes else self
+
+    def _to_dict(self) -> Dict:
         output = {
-            'allowedMethods': self.allowed_methods,
-            'cachedMethods': self.cached_methods,
+            'allowedMethods': list(self.allowed_methods),
+            'cachedMethods': list(self.cached_methods),
             'compress': self.compress,
-            'defaultTtl': self.default_ttl,
-            'forwardedValues': {
+            'targetOriginId': self.target_origin_id,
+            'viewerProtocolPolicy': self.viewer_protocol_policy,
+            'lambdaFunctionAssociations': [x.to_dict() for x in self.lambda_function_associations]
+        }
+        if self.function_associations:
+            output['functionAssociations'] = [x.to_dict() for x in self.function_associations]
+        if self.cache_policy_id is not None:
+            output['cachePolicyId'] = self.cache_policy_id
+        else:
+            output['defaultTtl'] = self.default_ttl
+            output['maxTtl'] = self.max_ttl
+            output['minTtl'] = self.min_ttl
+            output['forwardedValues'] = {
                 'cookies': {
                     'forward': self.forwarded_values_cookies,
                 },
                 'queryString': self.forwarded_values_query_string,
-            },
-            'maxTtl': self.max_ttl,
-            'minTtl': self.min_ttl,
-            'targetOriginId': self.target_origin_id,
-            'viewerProtocolPolicy': self.viewer_protocol_policy,
-            'lambdaFunctionAssociations': list(map(lambda x: x.to_dict(), self.lambda_function_associations))
-        }
-        if self.forwarded_values_headers is not None:
-            output['forwardedValues']['headers'] = self.forwarded_values_headers
+            }
+            if self.forwarded_values_headers is not None:
+                output['forwardedValues']['headers'] = list(self.forwarded_values_headers)
+        if self.origin_request_policy_id is not None:
+            output['originRequestPolicyId'] = self.origin_request_policy_id
+        if self.response_headers_policy_id is not None:
+            output['responseHeadersPolicyId'] = self.response_headers_policy_id
         if self.path_pattern is not None:
             output['pathPattern'] = self.path_pattern
         return output
 
 
+ORIGIN_PROTOCOL_POLICY_HTTP_ONLY = 'http-only'
+ORIGIN_PROTOCOL_POLICY_HTTPS_ONLY = 'https-only'
+ORIGIN_PROTOCOL_POLICY_MATCH_VIEWER = 'match-viewer'
+
+ORIGIN_SSL_PROTOCOL_SSLV3 = 'SSLv3'
+ORIGIN_SSL_PROTOCOL_TLSV1 = 'TLSv1'
+ORIGIN_SSL_PROTOCOL_TLSV1_1 = 'TLSv1.1'
+ORIGIN_SSL_PROTOCOL_TLSV1_2 = 'TLSv1.2'
+
+
+def _check_range(name: str, value: int, minimum: int, maximum: int):
+    if not minimum <= value <= maximum:
+        raise Exception(f'{name} must be between {minimum} and {maximum}, not {value}')
+
+
+def dynamic_cache_behavior() -> CacheBehavior:
+    """
+    Cache behavior for dynamic content: every method is allowed, nothing is cached,
+    query strings and cookies are forwarded to the origin
+    """
+    return CacheBehavior(allowed_methods=['GET', 'HEAD', 'OPTIONS', 'PUT', 'POST', 'PATCH', 'DELETE'],
+                         forwarded_values_cookies='all',
+                         forwarded_values_headers=['Authorization', 'Origin', 'Accept', 'Accept-Language'],
+                         forwarded_values_query_string=True,
+                         min_ttl=0,
+                         default_ttl=0,
+                         max_ttl=0)
+
+
+class CustomOrigin(_Frozen):
+    __slots__ = ('origin_id', 'domain_name', 'path_patterns', 'cache_behavior', 'origin_path', 'http_port', 'https_port',
+                 'origin_protocol_policy', 'origin_ssl_protocols', 'origin_keepalive_timeout', 'origin_read_timeout',
+                 'connection_attempts', 'connection_timeout', 'custom_headers', 'origin_shield_region')
+    _sequences = ('path_patterns', 'origin_ssl_protocols')
+    origin_id: str
+    domain_name: pulumi.Input[str]
+    path_patterns: [str]
+    cache_behavior: CacheBehavior
+    origin_path: str
+    http_port: int
+    https_port: int
+    origin_protocol_policy: str
+    origin_ssl_protocols: [str]
+    origin_keepalive_timeout: int
+    origin_read_timeout: int
+    connection_attempts: int
+    connection_timeout: int
+    custom_headers: Dict[str, pulumi.Input[str]]
+    origin_shield_region: str
+
+    def __init__(self, origin_id: str,
+                 domain_name: pulumi.Input[str],
+                 path_patterns: [str],
+                 cache_behavior: CacheBehavior = None,
+                 origin_path: str = None,
+                 http_port: int = 80,
+                 https_port: int = 443,
+                 origin_protocol_policy: str = ORIGIN_PROTOCOL_POLICY_HTTPS_ONLY,
+                 origin_ssl_protocols: [str] = None,
+                 origin_keepalive_timeout: int = 60,
+                 origin_read_timeout: int = 30,
+                 connection_attempts: int = 3,
+                 connection_timeout: int = 10,
+                 custom_headers: Dict[str, pulumi.Input[str]] = None,
+                 origin_shield_region: str = None):
+        """
+        HTTP origin such as an API or SSR backend, served by the same distribution as the buckets.
+            https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/distribution-web-values-specify.html
+        :param path_patterns: Ordered cache behaviors path patterns routed to the origin, for example ['/api/*']
+        :param cache_behavior: Cache behavior of the path patterns, dynamic_cache_behavior() by default
+        :param origin_protocol_policy: < http-only | https-only | match-viewer >
+        :param origin_ssl_protocols: TLS versions CloudFront may use with the origin, ['TLSv1.2'] by default
+        :param origin_keepalive_timeout: Seconds CloudFront keeps an idle connection to the origin open for reuse,
+            1-60 (up to 180 with a quota increase). Longer timeouts save TCP and TLS handshakes.
+        :param origin_read_timeout: Seconds CloudFront waits for a response, 1-60 (up to 180 with a quota increase)
+        :param connection_attempts: Attempts to connect to the origin, 1-3
+        :param connection_timeout: Seconds to wait for a connection, 1-10
+        :param custom_headers: Headers added to every origin request, for example a shared secret
+        """
+        self._init(origin_id=origin_id,
+                   domain_name=domain_name,
+                   path_patterns=path_patterns,
+                   cache_behavior=cache_behavior if cache_behavior is not None else dynamic_cache_behavior(),
+                   origin_path=origin_path,
+                   http_port=http_port,
+                   https_port=https_port,
+                   origin_protocol_policy=origin_protocol_policy,
+                   origin_ssl_protocols=(origin_ssl_protocols if origin_ssl_protocols is not None
+                                         else [ORIGIN_SSL_PROTOCOL_TLSV1_2]),
+                   origin_keepalive_timeout=origin_keepalive_timeout,
+                   origin_read_timeout=origin_read_timeout,
+                   connection_attempts=connection_attempts,
+                   connection_timeout=connection_timeout,
+                   custom_headers=dict(custom_headers or {}),
+                   origin_shield_region=origin_shield_region)
+
+    def _check(self):
+        if self.origin_protocol_policy not in [ORIGIN_PROTOCOL_POLICY_HTTP_ONLY, ORIGIN_PROTOCOL_POLICY_HTTPS_ONLY,
+                                               ORIGIN_PROTOCOL_POLICY_MATCH_VIEWER]:
+            raise Exception(f'Origin protocol policy must be < http-only | https-only | match-viewer >, '
+                            f'not {self.origin_protocol_policy}')
+        if not self.path_patterns:
+            raise Exception(f'Custom origin {self.origin_id} needs at least one path pattern')
+        _check_range('origin_keepalive_timeout', self.origin_keepalive_timeout, 1, 180)
+        _check_range('origin_read_timeout', self.origin_read_timeout, 1, 180)
+        _check_range('connection_attempts', self.connection_attempts, 1, 3)
+        _check_range('connection_timeout', self.connection_timeout, 1, 10)
+
+    def cache_behaviors(self) -> [CacheBehavior]:
+        """
+        Ordered cache behaviors, one copy of cache_behavior per path pattern
+        """
+        return [self.cache_behavior.with_path(path, self.origin_id) for path in self.path_patterns]
+
+    def _to_dict(self) -> Dict:
+        output = {
+            'domain_name': self.domain_name,
+            'originId': self.origin_id,
+            'connectionAttempts': self.connection_attempts,
+            'connectionTimeout': self.connection_timeout,
+            'customOriginConfig': {
+                'httpPort': self.http_port,
+                'httpsPort': self.https_port,
+                'originProtocolPolicy': self.origin_protocol_policy,
+                'originSslProtocols': list(self.origin_ssl_protocols),
+                'originKeepaliveTimeout': self.origin_keepalive_timeout,
+                'originReadTimeout': self.origin_read_timeout,
+            },
+        }
+        if self.origin_path is not None:
+            output['originPath'] = self.origin_path
+        if self.custom_headers:
+            output['customHeaders'] = [{'name': k, 'value': v} for k, v in sorted(self.custom_headers.items())]
+        if self.origin_shield_region is not None:
+            output['originShield'] = {
+                'enabled': True,
+                'originShieldRegion': self.origin_shield_region,
+            }
+        return output
+
+
 MIN_PROTOCOL_VERSION_SSLV3 = 'SSLv3'
 MIN_PROTOCOL_VERSION_TLSV1 = 'TLSv1'
 MIN_PROTOCOL_VERSION_TLSV1_2016 = 'TLSv1_2016'
@@ -133,7 +638,9 @@ SSL_SUPPORT_METHOD_SNI_ONLY = 'sni-only'
 SSL_SUPPORT_METHOD_VIP = 'vip'
 
 
-class ViewerCertificate:
+class ViewerCertificate(_Frozen):
+    __slots__ = ('acm_certificate_arn', 'cloudfront_default_certificate', 'iam_certificate_id',
+                 'minimum_protocol_version', 'ssl_support_method')
     acm_certificate_arn: pulumi.Input[str]
     cloudfront_default_certificate: bool
     iam_certificate_id: pulumi.Input[str]
@@ -171,13 +678,13 @@ class ViewerCertificate:
             must be specified.
         :param ssl_support_method
         """
-        self.acm_certificate_arn = acm_certificate_arn
-        self.cloudfront_default_certificate = cloudfront_default_certificate
-        self.iam_certificate_id = iam_certificate_id
-        self.minimum_protocol_version = minimum_protocol_version
-        self.ssl_support_method = ssl_support_method
+        self._init(acm_certificate_arn=acm_certificate_arn,
+                   cloudfront_default_certificate=cloudfront_default_certificate,
+                   iam_certificate_id=iam_certificate_id,
+                   minimum_protocol_version=minimum_protocol_version,
+                   ssl_support_method=ssl_support_method)
 
-    def to_dict(self) -> Dict:
+    def _to_dict(self) -> Dict:
         output = {}
         if self.acm_certificate_arn is not None:
             output['acmCertificateArn'] = self.acm_certificate_arn
@@ -192,17 +699,16 @@ class ViewerCertificate:
         return output
 
 
-class CustomErrorResponse:
+class CustomErrorResponse(_Frozen):
+    __slots__ = ('error_code', 'response_code', 'response_page_path')
     error_code: int
     response_code: int
     response_page_path: str
 
     def __init__(self, error_code: int, response_code: int, response_page_path: str):
-        self.error_code = error_code
-        self.response_code = response_code
-        self.response_page_path = response_page_path
+        self._init(error_code=error_code, response_code=response_code, response_page_path=response_page_path)
 
-    def to_dict(self) -> Dict:
+    def _to_dict(self) -> Dict:
         return {
             'errorCode': self.error_code,
             'responseCode': self.response_code,
@@ -0,0 +1,118 @@
+"""
+Route53 alias records of a distribution. The records are generated by a pure function, so the records of
+thousands of domains can be checked without Pulumi.
+
+    records = alias_records({'12345ABCDE': ['example.com', 'www.example.com']})
+    [r.resource_name for r in records]  # example.com-A-12345ABCDE, example.com-AAAA-12345ABCDE, ...
+"""
+from typing import Dict, List, Optional
+
+RECORD_TYPES = ('A', 'AAAA')
+
+
+def normalize_domain(domain: str) -> str:
+    """
+    Route53 and CloudFront compare names case-insensitively and without the trailing dot
+    """
+    return domain.strip().rstrip('.').lower()
+
+
+def unique_domains(zones: Dict[str, List[str]]) -> List[str]:
+    """
+    Domains of every zone in order, each domain once, for the aliases of the distribution
+    """
+    return list(dict.fromkeys(normalize_domain(d) for domains in zones.values() for d in domains))
+
+
+class LatencyRouting:
+    region: str
+    set_identifier: str
+    health_check_id: Optional[str]
+
+    def __init__(self, region: str, set_identifier: str = None, health_check_id: str = None):
+        """
+        Latency-based routing between this distribution and other records of the same names,
+        for example the distributions of two WebSites or a regional endpoint.
+        :param region: AWS region Route53 measures the latency to
+        :param set_identifier: Differentiates the records of the same name, region by default
+        :param health_check_id: Route53 health check, an unhealthy record is left out of the answers.
+            Alias records of CloudFront distributions can't evaluate the target health themselves.
+        """
+        self.region = region
+        self.set_identifier = set_identifier or region
+        self.health_check_id = health_check_id
+
+
+class AliasRecord:
+    resource_name: str
+    zone_id: str
+    name: str
+    type: str
+    latency_routing: Optional[LatencyRouting]
+    previous_name: Optional[str]
+
+    def __init__(self, resource_name: str, zone_id: str, name: str, type: str,
+                 latency_routing: LatencyRouting = None, previous_name: str = None):
+        """
+        :param previous_name: Resource name the record had when records were numbered, kept as an alias so
+            existing stacks don't replace their records
+        """
+        self.resource_name = resource_name
+        self.zone_id = zone_id
+        self.name = name
+        self.type = type
+        self.latency_routing = latency_routing
+        self.previous_name = previous_name
+
+    def record_args(self, target_domain_name, target_zone_id) -> Dict:
+        """
+        Arguments of route53.Record aliasing the record to a CloudFront distribution
+        """
+        args = {
+            'zone_id': self.zone_id,
+            'name': self.name,
+            'type': self.type,
+            'aliases': [{
+                'evaluateTargetHealth': False,
+                'name': target_domain_name,
+                'zone_id': target_zone_id,
+            }],
+        }
+        if self.latency_routing is not None:
+            args['set_identifier'] = self.latency_routing.set_identifier
+            args['latency_routing_policies'] = [{'region': self.latency_routing.region}]
+            if self.latency_routing.health_check_id is not None:
+                args['health_check_id'] = self.latency_routing.health_check_id
+        return args
+
+    def __repr__(self):
+        return f'AliasRecord({self.resource_name!r})'
+
+
+def alias_records(zones: Dict[str, List[str]], ipv6: bool = True,
+                  latency_routing: LatencyRouting = None) -> List[AliasRecord]:
+    """
+    Alias records of every domain in its zone, sorted by zone, domain and type. Resource names are derived
+    from the domain, type and zone, so reordering zones or domains doesn't replace records.
+    A domain listed twice in a zone gets one record, a domain listed in several zones (public and private
+    hosted zones for example) gets a record in each of them.
+    :param zones: Map of zone_id to domain names, see WebSite
+    :param ipv6: Creates AAAA records next to the A records
+    :param latency_routing: Routing settings of every record
+    """
+    types = RECORD_TYPES if ipv6 else RECORD_TYPES[:1]
+    suffix = '' if latency_routing is None else f'-{latency_routing.set_identifier}'
+    previous_names = {}
+    i = 0
+    for zone_id, domains in zones.items():
+        for domain in domains:
+            previous_names.setdefault((zone_id, normalize_domain(domain)), f'{domain}-record-{i}')
+            i += 1
+
+    records = []
+    for zone_id, domain in sorted(previous_names):
+        for record_type in types:
+            records.append(AliasRecord(f'{domain}-{record_type}-{zone_id}{suffix}', zone_id, domain, record_type,
+                                       latency_routing=latency_routing,
+                                       previous_name=previous_names[(zone_id, domain)] if record_type == 'A' else None))
+    return records
@@ -0,0 +1,393 @@
+"""
+Local edge emulator: serves local directories through the cache behaviors of a WebSite configuration
+with an in-memory TTL/LRU edge cache, so routing and caching can be load-tested without a deploy.
+
+    python -m pulumi_aws_website.emulator --default ./build --behavior '/docs/*=./docs-build' --port 8080
+"""
+import argparse
+import asyncio
+import json
+import os
+import posixpath
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode
+
+from pulumi_aws_website import config
+from pulumi_aws_website import functions
+from pulumi_aws_website.routing import BehaviorIndex
+from pulumi_aws_website.sync import guess_content_type
+
+STATS_PATH = '/__emulator/stats'
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# CloudFront caches origin errors for 10 seconds unless error_caching_min_ttl says otherwise
+ERROR_CACHING_MIN_TTL = 10
+
+X_CACHE_HIT = 'Hit from cloudfront'
+X_CACHE_MISS = 'Miss from cloudfront'
+X_CACHE_ERROR = 'Error from cloudfront'
+
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error', 502: 'Bad Gateway'}
+
+
+class CachedResponse:
+    __slots__ = ('status', 'headers', 'body', 'stored', 'expires')
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, stored: float, expires: float):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored = stored
+        self.expires = expires
+
+
+class EdgeCache:
+    """
+    In-memory cache with per-entry TTL and LRU eviction by entry count and total body size
+    """
+    max_entries: int
+    max_bytes: int
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str, now: float) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= now:
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CachedResponse):
+        if key in self.entries:
+            self._remove(key)
+        if len(entry.body) > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.bytes += len(entry.body)
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key)
+        self.bytes -= len(entry.body)
+
+
+class EmulatorStats:
+    def __init__(self, clock: Callable[[], float]):
+        self.clock = clock
+        self.started = clock()
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.origin_fetches = 0
+        self.bytes = 0
+        self.per_behavior = {}
+
+    def to_dict(self, cache: EdgeCache) -> Dict:
+        elapsed = max(self.clock() - self.started, 1e-9)
+        return {
+            'requests': self.requests,
+            'requests_per_second': self.requests / elapsed,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': self.hits / self.requests if self.requests else 0.0,
+            'origin_fetches': self.origin_fetches,
+            'bytes': self.bytes,
+            'cache_entries': len(cache.entries),
+            'cache_bytes': cache.bytes,
+            'cache_evictions': cache.evictions,
+            'behaviors': dict(self.per_behavior),
+        }
+
+
+def cache_key(behavior: config.CacheBehavior, cache_policy: Optional[config.CachePolicy], path: str, query: str,
+              headers: Dict[str, str]) -> str:
+    """
+    Cache key CloudFront would compute: the path plus the query strings and headers of the cache policy,
+    or of the legacy forwarded values
+    """
+    parts = [path]
+    params = parse_qsl(query, keep_blank_values=True)
+    if behavior.cache_policy_id is not None and cache_policy is not None:
+        qs_behavior = cache_policy.query_strings_config()['queryStringBehavior']
+        allowed = set(cache_policy.query_strings or [])
+        if qs_behavior == config.CACHE_KEY_BEHAVIOR_WHITELIST:
+            params = [p for p in params if p[0] in allowed]
+        elif qs_behavior == config.CACHE_KEY_BEHAVIOR_ALL_EXCEPT:
+            params = [p for p in params if p[0] not in allowed]
+        elif qs_behavior == config.CACHE_KEY_BEHAVIOR_NONE:
+            params = []
+        key_headers = cache_policy.headers or []
+        if cache_policy.enable_accept_encoding_brotli or cache_policy.enable_accept_encoding_gzip:
+            encodings = [e.strip().split(';')[0] for e in headers.get('accept-encoding', '').split(',')]
+            normalized = [e for e, enabled in (('br', cache_policy.enable_accept_encoding_brotli),
+                                               ('gzip', cache_policy.enable_accept_encoding_gzip))
+                          if enabled and e in encodings]
+            parts.append('ae=' + ','.join(normalized))
+    else:
+        if not behavior.forwarded_values_query_string:
+            params = []
+        key_headers = behavior.forwarded_values_headers or []
+    if params:
+        parts.append(urlencode(sorted(params)))
+    for name in sorted(h.lower() for h in key_headers):
+        parts.append(f'{name}={headers.get(name, "")}')
+    return '\n'.join(parts)
+
+
+class EdgeEmulator:
+    """
+    asyncio HTTP/1.1 server emulating one CloudFront edge in front of local directories.
+    Responses carry X-Cache and Age headers, GET /__emulator/stats returns throughput, hit ratio and origin fetches.
+    """
+    index: BehaviorIndex
+    origin_dirs: Dict[Optional[int], str]
+
+    def __init__(self, index: BehaviorIndex, origin_dirs: Dict[Optional[int], str],
+                 custom_error_responses: List[config.CustomErrorResponse] = None,
+                 default_root_object: str = config.DEFAULT_ROOT_OBJECT,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 clock: Callable[[], float] = time.monotonic, request_rules: functions.RequestRules = None):
+        """
+        :param index: Cache behaviors to emulate
+        :param origin_dirs: Local directory served by each behavior, by behavior index, None for the default behavior.
+            Behaviors without a directory respond with 502.
+        :param custom_error_responses: Error pages, as configured on the distribution
+        :param default_root_object: Served for '/' only, like S3 REST origins subdirectories need an IndexRewrite
+        :param request_rules: Viewer-request rules of the distribution, applied before the cache lookup
+        :param clock: Time source of the TTLs, for tests
+        """
+        self.index = index
+        self.origin_dirs = origin_dirs
+        self.custom_error_responses = {r.error_code: r for r in custom_error_responses or []}
+        self.default_root_object = default_root_object
+        self.request_rules = request_rules
+        self.cache = EdgeCache(max_entries, max_bytes)
+        self.clock = clock
+        self.stats = EmulatorStats(clock)
+        self.server = None
+        self._connections = {}
+
+    @staticmethod
+    def from_website(website, bucket_dirs: Dict[str, str], **kwargs) -> 'EdgeEmulator':
+        """
+        :param bucket_dirs: Map of bucket ('default' or a key of additional_buckets_mapping) to local directory
+        """
+        index = website.behavior_index()
+        pattern_buckets = {pattern: bucket for bucket, pattern in website.bucket_path_patterns.items()}
+        origin_dirs = {}
+        if 'default' in bucket_dirs:
+            origin_dirs[None] = bucket_dirs['default']
+        for i, cb in enumerate(index.behaviors):
+            bucket = pattern_buckets.get(cb.path_pattern)
+            if bucket in bucket_dirs:
+                origin_dirs[i] = bucket_dirs[bucket]
+        return EdgeEmulator(index, origin_dirs, custom_error_responses=website.custom_error_responses, **kwargs)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> Tuple[str, int]:
+        self.server = await asyncio.start_server(self._serve_connection, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        self.server.close()
+        for writer in list(self._connections):
+            writer.close()
+        if self._connections:
+            await asyncio.wait(list(self._connections.values()))
+        await self.server.wait_closed()
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[writer] = asyncio.get_event_loop().create_future()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._write(writer, 400, {}, b'', close=True)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0) or 0)
+                if length:
+                    await reader.readexactly(length)
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                status, response_headers, body = await self.handle(method, target, headers)
+                await self._write(writer, status, response_headers, b'' if method == 'HEAD' else body,
+                                  close=close, content_length=len(body))
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            self._connections.pop(writer).set_result(None)
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, status: int, headers: Dict[str, str], body: bytes,
+                     close: bool = False, content_length: int = None):
+        lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}']
+        headers = dict(headers)
+        headers['Content-Length'] = str(len(body) if content_length is None else content_length)
+        if close:
+            headers['Connection'] = 'close'
+        lines += [f'{k}: {v}' for k, v in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def handle(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        path, _, query = target.partition('?')
+        path = unquote(path)
+        if not path.startswith('/'):
+            return 400, {}, b''
+        if path == STATS_PATH:
+            body = json.dumps(self.stats.to_dict(self.cache)).encode()
+            return 200, {'Content-Type': 'application/json'}, body
+        if self.request_rules is not None:
+            result = self.request_rules.evaluate(functions.request(path, dict(parse_qsl(query)), headers))
+            if 'statusCode' in result:
+                return result['statusCode'], {k: v['value'] for k, v in result['headers'].items()}, b''
+            path = result['uri']
+            query = urlencode([(k, v['value']) for k, v in result['querystring'].items()])
+            headers = {k: v['value'] for k, v in result['headers'].items()}
+        if path == '/' and self.default_root_object:
+            path = '/' + self.default_root_object
+
+        resolution = self.index.resolve(path)
+        behavior = resolution.behavior
+        name = behavior.path_pattern or 'default'
+        self.stats.requests += 1
+        self.stats.per_behavior[name] = self.stats.per_behavior.get(name, 0) + 1
+        if method not in behavior.allowed_methods:
+            self.stats.errors += 1
+            return 403, {'X-Cache': X_CACHE_ERROR}, b''
+
+        now = self.clock()
+        key = cache_key(behavior, self.index.cache_policy, path, query, headers)
+        cacheable = method in behavior.cached_methods
+        cached = self.cache.get(key, now) if cacheable else None
+        if cached is not None:
+            self.stats.hits += 1
+            self.stats.bytes += len(cached.body)
+            response_headers = dict(cached.headers)
+            response_headers['X-Cache'] = X_CACHE_HIT if cached.status < 400 else X_CACHE_ERROR
+            response_headers['Age'] = str(int(now - cached.stored))
+            return cached.status, response_headers, cached.body
+
+        status, response_headers, body = await self._fetch(resolution.index, path)
+        if status >= 400:
+            status, response_headers, body = await self._error_response(status, response_headers, body)
+            ttl = ERROR_CACHING_MIN_TTL
+            self.stats.errors += 1
+        else:
+            ttl = resolution.ttl
+            self.stats.misses += 1
+        if cacheable and ttl > 0:
+            self.cache.put(key, CachedResponse(status, response_headers, body, now, now + ttl))
+        self.stats.bytes += len(body)
+        response_headers = dict(response_headers)
+        response_headers['X-Cache'] = X_CACHE_MISS if status < 400 else X_CACHE_ERROR
+        return status, response_headers, body
+
+    async def _fetch(self, behavior_index: Optional[int], path: str) -> Tuple[int, Dict[str, str], bytes]:
+        directory = self.origin_dirs.get(behavior_index)
+        if directory is None:
+            return 502, {}, b''
+        self.stats.origin_fetches += 1
+        file_path = os.path.join(directory, *[p for p in posixpath.normpath(path).split('/') if p])
+        root = os.path.realpath(directory)
+        if os.path.commonpath([root, os.path.realpath(file_path)]) != root or not os.path.isfile(file_path):
+            return 404, {}, b''
+        loop = asyncio.get_event_loop()
+        body = await loop.run_in_executor(None, _read_file, file_path)
+        return 200, {'Content-Type': guess_content_type(file_path)}, body
+
+    async def _error_response(self, status: int, headers: Dict[str, str],
+                              body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        error_response = self.custom_error_responses.get(status)
+        if error_response is None:
+            return status, headers, body
+        page = self.index.resolve(error_response.response_page_path)
+        page_status, page_headers, page_body = await self._fetch(page.index, error_response.response_page_path)
+        if page_status >= 400:
+            return status, headers, body
+        return error_response.response_code, page_headers, page_body
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Local CloudFront edge emulator')
+    parser.add_argument('--default', required=True, help='Directory served by the default cache behavior')
+    parser.add_argument('--behavior', action='append', default=[], metavar='PATTERN=DIRECTORY',
+                        help='Ordered cache behavior and its directory, can be repeated')
+    parser.add_argument('--default-ttl', type=int, default=3600)
+    parser.add_argument('--error', action='append', default=[], metavar='CODE=PAGE',
+                        help='Custom error response, for example 404=/404.html')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args(argv)
+
+    behaviors = []
+    origin_dirs = {None: args.default}
+    for i, spec in enumerate(args.behavior):
+        pattern, _, directory = spec.partition('=')
+        behaviors.append(_behavior(pattern, args.default_ttl))
+        origin_dirs[i] = directory
+    errors = []
+    for spec in args.error:
+        code, _, page = spec.partition('=')
+        errors.append(config.CustomErrorResponse(error_code=int(code), response_code=int(code),
+                                                 response_page_path=page))
+    index = BehaviorIndex(_behavior(None, args.default_ttl), behaviors)
+    for issue in index.issues:
+        print(f'warning: {issue}', file=sys.stderr)
+
+    emulator = EdgeEmulator(index, origin_dirs, custom_error_responses=errors)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    host, port = loop.run_until_complete(emulator.start(args.host, args.port))
+    print(f'Serving on http://{host}:{port}, stats at {STATS_PATH}', file=sys.stderr)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(emulator.stats.to_dict(emulator.cache), indent=2))
+
+
+def _behavior(path_pattern: Optional[str], default_ttl: int) -> config.CacheBehavior:
+    return config.CacheBehavior(path_pattern=path_pattern,
+                                target_origin_id=path_pattern or 'default',
+                                forwarded_values_query_string=False,
+                                default_ttl=default_ttl,
+                                max_ttl=max(default_ttl, 86400))
+
+
+if __name__ == '__main__':
+    main()
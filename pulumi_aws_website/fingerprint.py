@@ -0,0 +1,260 @@
+import hashlib
+import posixpath
+import re
+from fnmatch import fnmatchcase
+from typing import Dict, List, Optional
+
+from pulumi_aws_website.sync import Stage, SyncObject
+
+HASH_LENGTH = 10
+
+# source maps keep their names: the sourceMappingURL comments of bundles are relative to the bundle
+# and stay valid after the bundle is renamed, but JS isn't rewritten
+DEFAULT_PATTERNS = [
+    '*.js', '*.mjs', '*.css',
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+]
+DEFAULT_REWRITE_PATTERNS = ['*.html', '*.htm', '*.css']
+
+# names like app.3f2a1b9c0d.js in the format of fingerprinted_key, names like report-20240101.pdf are not hashed
+FINGERPRINTED_NAME = re.compile(r'\.[0-9a-f]{%d}\.[^./]+$' % HASH_LENGTH)
+
+# candidate references in HTML attributes, srcset lists and CSS url()/@import
+REFERENCE = re.compile(r'''(?<=["'(=,\s])([^"'()<>\s,]+?)(?=[?#"')\s,>])''')
+
+# browsers keep hashed assets for a year, edges for the max_ttl of the default CacheBehavior,
+# raise s-maxage together with max_ttl
+CACHE_CONTROL_IMMUTABLE = 'public, max-age=31536000, s-maxage=86400, immutable'
+CACHE_CONTROL_HTML = 'public, max-age=60, must-revalidate'
+CACHE_CONTROL_DEFAULT = 'public, max-age=3600'
+
+
+def is_fingerprinted(key: str) -> bool:
+    return FINGERPRINTED_NAME.search(key) is not None
+
+
+def fingerprinted_key(key: str, md5: str) -> str:
+    """
+    'static/app.js' gives 'static/app.<hash>.js'
+    """
+    directory, name = posixpath.split(key)
+    stem, dot, extension = name.rpartition('.')
+    if not dot:
+        stem, extension = name, ''
+    hashed = f'{stem}.{md5[:HASH_LENGTH]}' + (f'.{extension}' if dot else '')
+    return posixpath.join(directory, hashed)
+
+
+def _resolve(reference: str, referrer_key: str, prefix: str) -> Optional[str]:
+    if '://' in reference or reference.startswith('//') or reference.startswith('data:'):
+        return None
+    if reference.startswith('/'):
+        return prefix + reference.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(referrer_key), reference))
+
+
+def rewrite_references(text: str, referrer_key: str, renames: Dict[str, str], prefix: str = '') -> str:
+    """
+    Replaces references to renamed keys, absolute ('/static/app.js') or relative to the referrer ('../app.js'),
+    keeping the style of the reference: only the file name changes.
+    """
+    def replace(match):
+        reference = match.group(1)
+        key = _resolve(reference, referrer_key, prefix)
+        if key is None or key not in renames:
+            return reference
+        return reference[:reference.rfind('/') + 1] + posixpath.basename(renames[key])
+
+    return REFERENCE.sub(replace, text)
+
+
+class Fingerprint(Stage):
+    """
+    Sync pipeline stage which renames static assets to content-hashed names and rewrites references
+    to them in HTML and CSS. Assets referenced by CSS are renamed first, so a CSS hash covers
+    the names it references. Text objects which don't decode are neither rewritten nor renamed,
+    they are listed in skipped.
+    """
+    patterns: List[str]
+    rewrite_patterns: List[str]
+    prefix: str
+    renames: Dict[str, str]
+    skipped: List[str]
+
+    def __init__(self, patterns: List[str] = None, rewrite_patterns: List[str] = None, prefix: str = '',
+                 encoding: str = 'utf-8'):
+        """
+        :param patterns: fnmatch patterns of keys to fingerprint
+        :param rewrite_patterns: fnmatch patterns of text objects in which references are rewritten
+        :param prefix: Key prefix used by the sync, absolute references '/x' resolve to prefix + 'x'
+        """
+        self.patterns = patterns if patterns is not None else DEFAULT_PATTERNS
+        self.rewrite_patterns = rewrite_patterns if rewrite_patterns is not None else DEFAULT_REWRITE_PATTERNS
+        self.prefix = prefix
+        self.encoding = encoding
+        self.renames = {}
+        self.skipped = []
+
+    def _matches(self, key: str, patterns: List[str]) -> bool:
+        name = posixpath.basename(key)
+        return any(fnmatchcase(name, p) for p in patterns)
+
+    def process(self, objects: List[SyncObject]) -> List[SyncObject]:
+        by_key = {o.key: o for o in objects}
+        self.renames = {}
+        self.skipped = []
+        rewritten = {}
+
+        def text(o: SyncObject) -> Optional[str]:
+            data = o.data
+            if data is None:
+                with open(o.path, 'rb') as f:
+                    data = f.read()
+            try:
+                return data.decode(self.encoding)
+            except UnicodeDecodeError:
+                return None
+
+        texts = {}
+        for k in sorted(by_key):
+            if self._matches(k, self.rewrite_patterns):
+                texts[k] = text(by_key[k])
+                if texts[k] is None:
+                    self.skipped.append(k)
+        rewritable = {k for k, t in texts.items() if t is not None}
+        hashable = {k for k in by_key if self._matches(k, self.patterns) and not is_fingerprinted(k)
+                    and k not in self.skipped}
+
+        # plain assets first, then rewritable assets (CSS) depth first, so every hash covers final content
+        for key in sorted(hashable - rewritable):
+            self.renames[key] = fingerprinted_key(key, by_key[key].md5)
+
+        in_progress = set()
+
+        def finish(key: str):
+            if key in self.renames or key in in_progress:
+                return
+            in_progress.add(key)
+            source = texts[key]
+            for match in REFERENCE.finditer(source):
+                dependency = _resolve(match.group(1), key, self.prefix)
+                if dependency in hashable and dependency in rewritable:
+                    finish(dependency)
+            data = rewrite_references(source, key, self.renames, self.prefix).encode(self.encoding)
+            rewritten[key] = data
+            self.renames[key] = fingerprinted_key(key, hashlib.md5(data).hexdigest())
+
+        for key in sorted(hashable & rewritable):
+            finish(key)
+
+        output = []
+        for o in objects:
+            if o.key in rewritable and o.key not in rewritten:
+                source = texts[o.key]
+                data = rewrite_references(source, o.key, self.renames, self.prefix)
+                if data != source:
+                    rewritten[o.key] = data.encode(self.encoding)
+            key = self.renames.get(o.key, o.key)
+            fingerprinted = o.fingerprinted or key != o.key or is_fingerprinted(key)
+            if o.key in rewritten:
+                output.append(SyncObject(key=key, data=rewritten[o.key], headers=o.headers,
+                                         fingerprinted=fingerprinted))
+            elif key != o.key or fingerprinted != o.fingerprinted:
+                output.append(SyncObject(key=key, path=o.path, data=o.data, md5=o.md5, size=o.size,
+                                         headers=o.headers, fingerprinted=fingerprinted))
+            else:
+                output.append(o)
+        return output
+
+
+class CacheControlRule:
+    pattern: str
+    cache_control: str
+    fingerprinted_only: bool
+
+    def __init__(self, pattern: str, cache_control: str, fingerprinted_only: bool = False):
+        """
+        :param pattern: fnmatch pattern of keys
+        :param cache_control: Cache-Control header of matching objects
+        :param fingerprinted_only: Match only content-hashed names, see is_fingerprinted
+        """
+        self.pattern = pattern
+        self.cache_control = cache_control
+        self.fingerprinted_only = fingerprinted_only
+
+    def matches(self, key: str, fingerprinted: bool = None) -> bool:
+        """
+        :param fingerprinted: SyncObject.fingerprinted, by default the name decides, see is_fingerprinted
+        """
+        if fingerprinted is None:
+            fingerprinted = is_fingerprinted(key)
+        if self.fingerprinted_only and not fingerprinted:
+            return False
+        return fnmatchcase(key, self.pattern)
+
+
+DEFAULT_RULES = [
+    CacheControlRule('*', CACHE_CONTROL_IMMUTABLE, fingerprinted_only=True),
+    CacheControlRule('*.html', CACHE_CONTROL_HTML),
+    CacheControlRule('*', CACHE_CONTROL_DEFAULT),
+]
+
+
+class CacheControl(Stage):
+    """
+    Sync pipeline stage which sets Cache-Control from the first matching rule,
+    objects which already have a Cache-Control header keep it
+    """
+    rules: List[CacheControlRule]
+
+    def __init__(self, rules: List[CacheControlRule] = None):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+
+    def cache_control(self, key: str, fingerprinted: bool = None) -> Optional[str]:
+        for rule in self.rules:
+            if rule.matches(key, fingerprinted):
+                return rule.cache_control
+        return None
+
+    def process(self, objects: List[SyncObject]) -> List[SyncObject]:
+        for o in objects:
+            value = self.cache_control(o.key, o.fingerprinted or None)
+            if value is not None and 'Cache-Control' not in o.headers:
+                o.headers['Cache-Control'] = value
+        return objects
+
+
+def parse_max_age(cache_control: str) -> Optional[int]:
+    """
+    Lifetime of a response in a shared cache: s-maxage if present, then max-age, 0 for no-cache/no-store
+    """
+    directives = {}
+    for part in cache_control.split(','):
+        name, _, value = part.strip().partition('=')
+        directives[name.lower()] = value.strip('"')
+    for name in ('s-maxage', 'max-age'):
+        if name in directives and directives[name].isdigit():
+            return int(directives[name])
+    if 'no-cache' in directives or 'no-store' in directives or 'private' in directives:
+        return 0
+    return None
+
+
+def check_ttls(rules: List[CacheControlRule], min_ttl: int, max_ttl: int, name: str = 'cache behavior') -> List[str]:
+    """
+    Problems of Cache-Control rules which CloudFront TTLs would override:
+    a max-age above max_ttl is cut to max_ttl, a max-age below min_ttl is raised to min_ttl.
+    """
+    problems = []
+    for rule in rules:
+        max_age = parse_max_age(rule.cache_control)
+        if max_age is None:
+            continue
+        if max_ttl is not None and max_age > max_ttl:
+            problems.append(f'{name}: max_ttl={max_ttl} cuts max-age={max_age} of {rule.pattern!r}, '
+                            f'objects are revalidated every {max_ttl}s')
+        if min_ttl is not None and max_age < min_ttl:
+            problems.append(f'{name}: min_ttl={min_ttl} overrides max-age={max_age} of {rule.pattern!r}, '
+                            f'objects stay cached for {min_ttl}s')
+    return problems
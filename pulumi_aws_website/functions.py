@@ -0,0 +1,445 @@
+"""
+Viewer-request CloudFront Functions generated from declarative rules, with a Python evaluator
+of the same rules for tests and local tools.
+
+    rules = RequestRules([RedirectMap({'/old/': '/new/'}), TrailingSlashRedirect(), IndexRewrite()])
+    rules.evaluate(request('/docs'))  # 301 to /docs/
+    function = rules.create_function('my-site-rules')
+
+Rules above the CloudFront Functions size quota, like large redirect maps, run as Lambda@Edge, see create_association.
+"""
+import copy
+import json
+from typing import Dict, List, Optional, Union
+
+import pulumi
+from pulumi_aws import cloudfront
+from pulumi_aws import iam
+from pulumi_aws import lambda_
+
+from pulumi_aws_website import config
+
+RUNTIME = 'cloudfront-js-1.0'
+# CloudFront Functions code size quota
+MAX_CODE_SIZE = 10 * 1024
+LAMBDA_RUNTIME = 'nodejs20.x'
+
+STATUS_DESCRIPTIONS = {
+    301: 'Moved Permanently',
+    302: 'Found',
+    307: 'Temporary Redirect',
+    308: 'Permanent Redirect',
+}
+
+HELPERS = '''
+var STATUS_DESCRIPTIONS = %s;
+
+function querystring(request) {
+    var parts = [];
+    var qs = request.querystring || {};
+    Object.keys(qs).forEach(function (name) {
+        var values = qs[name].multiValue ? qs[name].multiValue : [qs[name]];
+        values.forEach(function (v) {
+            parts.push(name + '=' + v.value);
+        });
+    });
+    return parts.length ? '?' + parts.join('&') : '';
+}
+
+function redirect(status, location) {
+    return {
+        statusCode: status,
+        statusDescription: STATUS_DESCRIPTIONS[status],
+        headers: {location: {value: location}}
+    };
+}
+
+function hasExtension(uri) {
+    return uri.substring(uri.lastIndexOf('/') + 1).indexOf('.') !== -1;
+}
+''' % json.dumps({str(k): v for k, v in STATUS_DESCRIPTIONS.items()})
+
+
+# Lambda@Edge viewer-request handler running the rules of the CloudFront Function,
+# the request is converted to the CloudFront Functions event shape and back
+LAMBDA_EDGE_HANDLER = '''
+function toFunctionRequest(request) {
+    var querystring = {};
+    (request.querystring ? request.querystring.split('&') : []).forEach(function (part) {
+        var i = part.indexOf('=');
+        var name = i === -1 ? part : part.substring(0, i);
+        var value = {value: i === -1 ? '' : part.substring(i + 1)};
+        if (!querystring[name]) {
+            querystring[name] = value;
+        } else {
+            querystring[name].multiValue = (querystring[name].multiValue || [{value: querystring[name].value}])
+                .concat([value]);
+        }
+    });
+    var headers = {};
+    Object.keys(request.headers).forEach(function (name) {
+        headers[name] = {value: request.headers[name][0].value};
+    });
+    return {method: request.method, uri: request.uri, querystring: querystring, headers: headers, cookies: {}};
+}
+
+exports.handler = async function (event) {
+    var request = event.Records[0].cf.request;
+    var result = handler({request: toFunctionRequest(request)});
+    if (result.statusCode) {
+        var headers = {};
+        Object.keys(result.headers).forEach(function (name) {
+            headers[name] = [{key: name, value: result.headers[name].value}];
+        });
+        return {status: String(result.statusCode), statusDescription: result.statusDescription, headers: headers};
+    }
+    request.uri = result.uri;
+    Object.keys(request.headers).forEach(function (name) {
+        if (!result.headers[name]) {
+            delete request.headers[name];
+        }
+    });
+    Object.keys(result.headers).forEach(function (name) {
+        var original = request.headers[name];
+        if (!original || original[0].value !== result.headers[name].value) {
+            request.headers[name] = [{key: original ? original[0].key : name, value: result.headers[name].value}];
+        }
+    });
+    return request;
+};
+'''
+
+LAMBDA_ASSUME_ROLE_POLICY = json.dumps({
+    'Version': '2012-10-17',
+    'Statement': [{
+        'Effect': 'Allow',
+        'Principal': {'Service': ['lambda.amazonaws.com', 'edgelambda.amazonaws.com']},
+        'Action': 'sts:AssumeRole',
+    }],
+})
+LAMBDA_BASIC_EXECUTION_POLICY = 'arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole'
+
+
+def request(uri: str, querystring: Dict[str, str] = None, headers: Dict[str, str] = None) -> Dict:
+    """
+    Viewer request in the shape of the CloudFront Functions event, header names are lower case
+    """
+    return {
+        'method': 'GET',
+        'uri': uri,
+        'querystring': {k: {'value': v} for k, v in (querystring or {}).items()},
+        'headers': {k.lower(): {'value': v} for k, v in (headers or {}).items()},
+        'cookies': {},
+    }
+
+
+def _querystring(request: Dict) -> str:
+    parts = []
+    for name, entry in request.get('querystring', {}).items():
+        for v in entry.get('multiValue') or [entry]:
+            parts.append(f'{name}={v["value"]}')
+    return '?' + '&'.join(parts) if parts else ''
+
+
+def _redirect(status: int, location: str) -> Dict:
+    return {
+        'statusCode': status,
+        'statusDescription': STATUS_DESCRIPTIONS[status],
+        'headers': {'location': {'value': location}},
+    }
+
+
+def _has_extension(uri: str) -> bool:
+    return '.' in uri[uri.rfind('/') + 1:]
+
+
+def _check_status(status: int):
+    if status not in STATUS_DESCRIPTIONS:
+        raise Exception(f'Redirect status must be one of {sorted(STATUS_DESCRIPTIONS)}, not {status}')
+
+
+class RequestRule:
+    """
+    A rule either changes the request and lets the next rule run, or returns a response which ends the evaluation.
+    js() and apply() implement the same behavior.
+    """
+
+    def js(self, name: str) -> str:
+        """
+        JavaScript function called name, taking the request and returning a response or nothing
+        """
+        raise NotImplementedError
+
+    def apply(self, request: Dict) -> Optional[Dict]:
+        raise NotImplementedError
+
+
+class RedirectMap(RequestRule):
+    redirects: Dict[str, str]
+    status: int
+    preserve_query: bool
+
+    def __init__(self, redirects: Dict[str, str], status: int = 301, preserve_query: bool = True):
+        """
+        :param redirects: Map of exact URI to location, for example {'/old/': '/new/'}
+        :param preserve_query: Appends the query string of the request to the location
+        """
+        _check_status(status)
+        self.redirects = redirects
+        self.status = status
+        self.preserve_query = preserve_query
+
+    def js(self, name: str) -> str:
+        query = ' + querystring(request)' if self.preserve_query else ''
+        return f'''
+var {name}_REDIRECTS = {json.dumps(self.redirects, sort_keys=True)};
+
+function {name}(request) {{
+    if (Object.prototype.hasOwnProperty.call({name}_REDIRECTS, request.uri)) {{
+        return redirect({self.status}, {name}_REDIRECTS[request.uri]{query});
+    }}
+}}
+'''
+
+    def apply(self, request: Dict) -> Optional[Dict]:
+        location = self.redirects.get(request['uri'])
+        if location is None:
+            return None
+        return _redirect(self.status, location + (_querystring(request) if self.preserve_query else ''))
+
+
+class TrailingSlashRedirect(RequestRule):
+    status: int
+
+    def __init__(self, status: int = 301):
+        """
+        Redirects '/docs' to '/docs/', URIs whose last segment has an extension are left alone
+        """
+        _check_status(status)
+        self.status = status
+
+    def js(self, name: str) -> str:
+        return f'''
+function {name}(request) {{
+    var uri = request.uri;
+    if (uri.charAt(uri.length - 1) !== '/' && !hasExtension(uri)) {{
+        return redirect({self.status}, uri + '/' + querystring(request));
+    }}
+}}
+'''
+
+    def apply(self, request: Dict) -> Optional[Dict]:
+        uri = request['uri']
+        if not uri.endswith('/') and not _has_extension(uri):
+            return _redirect(self.status, uri + '/' + _querystring(request))
+        return None
+
+
+class IndexRewrite(RequestRule):
+    index_document: str
+    extensionless: bool
+
+    def __init__(self, index_document: str = 'index.html', extensionless: bool = True):
+        """
+        Serves '/docs/' from 'docs/index.html', S3 REST origins only serve the root index document.
+        :param extensionless: Also rewrites '/docs' to '/docs/index.html'
+        """
+        self.index_document = index_document
+        self.extensionless = extensionless
+
+    def js(self, name: str) -> str:
+        index = json.dumps(self.index_document)
+        extensionless = f''' else if (!hasExtension(uri)) {{
+        request.uri = uri + '/' + {index};
+    }}''' if self.extensionless else ''
+        return f'''
+function {name}(request) {{
+    var uri = request.uri;
+    if (uri.charAt(uri.length - 1) === '/') {{
+        request.uri = uri + {index};
+    }}{extensionless}
+}}
+'''
+
+    def apply(self, request: Dict) -> Optional[Dict]:
+        uri = request['uri']
+        if uri.endswith('/'):
+            request['uri'] = uri + self.index_document
+        elif self.extensionless and not _has_extension(uri):
+            request['uri'] = f'{uri}/{self.index_document}'
+        return None
+
+
+class NormalizeHeader(RequestRule):
+    name: str
+    values: List[str]
+    default: Optional[str]
+
+    def __init__(self, name: str, values: List[str], default: str = None):
+        """
+        Replaces a header with the first of values it contains, so the cache key varies by len(values) + 1
+        variants instead of every header value browsers send. For example
+        NormalizeHeader('accept-language', ['en', 'de'], default='en')
+        :param values: Accepted tokens in order of preference, compared case-insensitively without parameters
+        :param default: Value when the header contains none of values, the header is removed if None
+        """
+        self.name = name.lower()
+        self.values = values
+        self.default = default
+
+    def js(self, name: str) -> str:
+        header = json.dumps(self.name)
+        return f'''
+var {name}_VALUES = {json.dumps(self.values)};
+var {name}_DEFAULT = {json.dumps(self.default)};
+
+function {name}(request) {{
+    var header = request.headers[{header}];
+    var tokens = header ? header.value.split(',').map(function (t) {{
+        return t.split(';')[0].trim().toLowerCase();
+    }}) : [];
+    for (var i = 0; i < {name}_VALUES.length; i++) {{
+        if (tokens.indexOf({name}_VALUES[i].toLowerCase()) !== -1) {{
+            request.headers[{header}] = {{value: {name}_VALUES[i]}};
+            return;
+        }}
+    }}
+    if ({name}_DEFAULT === null) {{
+        delete request.headers[{header}];
+    }} else {{
+        request.headers[{header}] = {{value: {name}_DEFAULT}};
+    }}
+}}
+'''
+
+    def apply(self, request: Dict) -> Optional[Dict]:
+        header = request['headers'].get(self.name)
+        tokens = [t.split(';')[0].strip().lower() for t in header['value'].split(',')] if header else []
+        for value in self.values:
+            if value.lower() in tokens:
+                request['headers'][self.name] = {'value': value}
+                return None
+        if self.default is None:
+            request['headers'].pop(self.name, None)
+        else:
+            request['headers'][self.name] = {'value': self.default}
+        return None
+
+
+class RequestRules:
+    """
+    Ordered viewer-request rules, the first rule returning a response ends the evaluation
+    """
+    rules: List[RequestRule]
+
+    def __init__(self, rules: List[RequestRule], comment: str = None):
+        self.rules = rules
+        self.comment = comment
+
+    def _code(self) -> str:
+        parts = [HELPERS]
+        calls = []
+        for i, rule in enumerate(self.rules):
+            name = f'rule{i}'
+            parts.append(rule.js(name))
+            calls.append(f'''    response = {name}(request);
+    if (response) {{
+        return response;
+    }}''')
+        parts.append('''
+function handler(event) {
+    var request = event.request;
+    var response;
+%s
+    return request;
+}
+''' % '\n'.join(calls))
+        return ''.join(parts)
+
+    def fits_function(self) -> bool:
+        return len(self._code().encode()) <= MAX_CODE_SIZE
+
+    def code(self) -> str:
+        """
+        CloudFront Function source, raises above MAX_CODE_SIZE
+        """
+        code = self._code()
+        if len(code.encode()) > MAX_CODE_SIZE:
+            raise Exception(f'Function code is {len(code.encode())} bytes, CloudFront Functions allow {MAX_CODE_SIZE}, '
+                            f'use create_association which falls back to Lambda@Edge')
+        return code
+
+    def lambda_edge_code(self) -> str:
+        """
+        Lambda@Edge viewer-request handler source (index.js) running the same rules
+        """
+        return "'use strict';\n" + self._code() + LAMBDA_EDGE_HANDLER
+
+    def evaluate(self, request: Dict) -> Dict:
+        """
+        :param request: Viewer request, see request(), it is not modified
+        :return: The request as forwarded to the cache, or the response sent to the viewer
+        """
+        request = copy.deepcopy(request)
+        for rule in self.rules:
+            response = rule.apply(request)
+            if response is not None:
+                return response
+        return request
+
+    def create_function(self, resource_name: str, opts: pulumi.ResourceOptions = None) -> cloudfront.Function:
+        """
+        Creates and publishes the CloudFront function, associate its arn with
+        config.FunctionAssociation(config.FUNCTION_EVENT_TYPE_VIEWER_REQUEST, function.arn)
+        """
+        return cloudfront.Function(resource_name,
+                                   name=resource_name,
+                                   runtime=RUNTIME,
+                                   comment=self.comment,
+                                   code=self.code(),
+                                   publish=True,
+                                   opts=opts)
+
+    def create_lambda(self, resource_name: str, opts: pulumi.ResourceOptions = None) -> lambda_.Function:
+        """
+        Creates and publishes the rules as a Lambda@Edge function with its execution role,
+        opts must use a provider in us-east-1. Associate its qualified_arn with
+        config.LambdaFunctionAssociation(config.LAMBDA_EVENT_TYPE_VIEWER_REQUEST, function.qualified_arn)
+        """
+        role = iam.Role(f'{resource_name}-role',
+                        assume_role_policy=LAMBDA_ASSUME_ROLE_POLICY,
+                        opts=opts)
+        iam.RolePolicyAttachment(f'{resource_name}-logs',
+                                 role=role.name,
+                                 policy_arn=LAMBDA_BASIC_EXECUTION_POLICY,
+                                 opts=opts)
+        return lambda_.Function(resource_name,
+                                runtime=LAMBDA_RUNTIME,
+                                role=role.arn,
+                                handler='index.handler',
+                                code=pulumi.AssetArchive({'index.js': pulumi.StringAsset(self.lambda_edge_code())}),
+                                publish=True,
+                                opts=opts)
+
+    def create_association(self, resource_name: str, opts: pulumi.ResourceOptions = None,
+                           lambda_opts: pulumi.ResourceOptions = None
+                           ) -> Union[config.FunctionAssociation, config.LambdaFunctionAssociation]:
+        """
+        Viewer-request association of a CloudFront Function, or of a Lambda@Edge function when the code exceeds
+        MAX_CODE_SIZE, pass it to WebSite with association_args
+        :param lambda_opts: Options of the Lambda@Edge resources, with a provider in us-east-1, opts by default
+        """
+        if self.fits_function():
+            function = self.create_function(resource_name, opts)
+            return config.FunctionAssociation(config.FUNCTION_EVENT_TYPE_VIEWER_REQUEST, function.arn)
+        function = self.create_lambda(resource_name, lambda_opts if lambda_opts is not None else opts)
+        return config.LambdaFunctionAssociation(config.LAMBDA_EVENT_TYPE_VIEWER_REQUEST, function.qualified_arn)
+
+
+def association_args(association: Union[config.FunctionAssociation, config.LambdaFunctionAssociation]) -> Dict:
+    """
+    WebSite arguments attaching the association of RequestRules.create_association to every bucket behavior
+    """
+    if isinstance(association, config.LambdaFunctionAssociation):
+        return {'lambda_function_associations': [association]}
+    return {'function_associations': [association]}
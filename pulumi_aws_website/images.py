@@ -0,0 +1,388 @@
+"""
+AVIF and WebP variants and responsive widths of JPEG and PNG images, served per Accept header at the edge.
+
+    variants = images.ImageVariants(widths=[640, 1280])
+    website.sync_content('./build', stages=[variants])
+    print(variants.report.format())
+
+'photo.jpg' is stored as 'photo.jpg', 'photo.jpg.avif' and 'photo.jpg.webp', with widths also as
+'photo-640w.jpg' and its variants. ImageNegotiation, a viewer-request rule, rewrites '/photo.jpg' to the best
+variant the viewer accepts before the cache lookup, so the format is part of the cache key through the URI.
+"""
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pulumi
+from pulumi_aws import cloudfront
+
+from pulumi_aws_website import config
+from pulumi_aws_website.functions import RequestRule
+from pulumi_aws_website.sync import Stage, SyncObject
+
+FORMAT_AVIF = 'avif'
+FORMAT_WEBP = 'webp'
+
+# in order of preference, the first format the viewer accepts is served
+FORMAT_CONTENT_TYPES = {
+    FORMAT_AVIF: 'image/avif',
+    FORMAT_WEBP: 'image/webp',
+}
+DEFAULT_QUALITY = {
+    FORMAT_AVIF: 50,
+    FORMAT_WEBP: 80,
+}
+SOURCE_CONTENT_TYPES = {
+    'image/jpeg': 'JPEG',
+    'image/png': 'PNG',
+}
+SOURCE_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+
+DEFAULT_MIN_SIZE = 1024
+# a variant is only stored when it is at most this fraction of the original size, otherwise the variant
+# key holds the original so the edge rule never has to know which variants exist
+DEFAULT_MAX_RATIO = 0.9
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pulumi-aws-website', 'images')
+
+
+def _pillow():
+    try:
+        from PIL import Image, ImageOps, features
+    except ImportError:
+        raise Exception('Image variants require Pillow, install it with `pip install pulumi-aws-website[images]`')
+    return Image, ImageOps, features
+
+
+def avif_supported() -> bool:
+    """
+    AVIF encoding is built into Pillow 11.2 and newer, older versions only encode WebP
+    """
+    _, _, features = _pillow()
+    return bool(features.check('avif'))
+
+
+def is_source_image(o: SyncObject) -> bool:
+    if 'Content-Encoding' in o.headers:
+        return False
+    return o.headers.get('Content-Type', '').split(';')[0] in SOURCE_CONTENT_TYPES and \
+        os.path.splitext(o.key)[1].lower() in SOURCE_EXTENSIONS
+
+
+def width_key(key: str, width: int) -> str:
+    """
+    Key of a responsive width, 'img/photo.jpg' at 640 pixels is 'img/photo-640w.jpg'
+    """
+    root, ext = os.path.splitext(key)
+    return f'{root}-{width}w{ext}'
+
+
+def variant_key(key: str, image_format: str) -> str:
+    return f'{key}.{image_format}'
+
+
+def select_variant(uri: str, accept: str, formats: List[str]) -> str:
+    """
+    Python twin of ImageNegotiation, returns the URI the request is rewritten to
+    """
+    if os.path.splitext(uri)[1].lower() not in SOURCE_EXTENSIONS:
+        return uri
+    accepted = [t.strip().split(';')[0].lower() for t in accept.split(',')] if accept else []
+    for image_format in FORMAT_CONTENT_TYPES:
+        if image_format in formats and FORMAT_CONTENT_TYPES[image_format] in accepted:
+            return variant_key(uri, image_format)
+    return uri
+
+
+def encode(data: bytes, image_format: str, width: int = None, quality: int = None) -> bytes:
+    """
+    :param image_format: avif, webp, or the JPEG or PNG format of the source
+    :param width: Resizes to this width keeping the aspect ratio
+    """
+    Image, ImageOps, features = _pillow()
+    if image_format == FORMAT_AVIF and not features.check('avif'):
+        raise Exception('Pillow was built without AVIF support, install Pillow 11.2 or newer')
+    with Image.open(io.BytesIO(data)) as image:
+        source_format = image.format
+        image = ImageOps.exif_transpose(image)
+        if width is not None and width < image.width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        out = io.BytesIO()
+        if image_format in FORMAT_CONTENT_TYPES:
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+            image.save(out, format=image_format.upper(), quality=quality or DEFAULT_QUALITY[image_format])
+        elif source_format == 'JPEG':
+            image.convert('RGB').save(out, format='JPEG', quality=quality or 85, optimize=True, progressive=True)
+        else:
+            image.save(out, format=source_format, optimize=True)
+        return out.getvalue()
+
+
+def image_width(o: SyncObject) -> int:
+    Image, _, _ = _pillow()
+    # only the header is read
+    with Image.open(io.BytesIO(o.data) if o.data is not None else o.path) as image:
+        orientation = image.getexif().get(0x0112, 1)
+        # EXIF orientations 5 to 8 rotate by 90 degrees
+        return image.height if orientation in (5, 6, 7, 8) else image.width
+
+
+def _encode_to_cache(args: Tuple[str, bytes, str, Optional[int], Optional[int], str]) -> Tuple[str, int]:
+    """
+    Process pool worker, encodes a file or bytes into the cache and returns md5 and size of the variant
+    """
+    path, data, image_format, width, quality, cache_path = args
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    encoded = encode(data, image_format, width, quality)
+    md5 = hashlib.md5(encoded).hexdigest()
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(encoded)
+    with open(tmp + '.md5', 'w') as f:
+        f.write(md5)
+    os.replace(tmp + '.md5', cache_path + '.md5')
+    os.replace(tmp, cache_path)
+    return md5, len(encoded)
+
+
+class ImageReport:
+    """
+    Bytes of the source images and of the variants viewers accepting the preferred format get, full width only
+    """
+    images: int
+    variants: int
+    encoded: int
+    original_bytes: int
+    best_bytes: int
+
+    def __init__(self):
+        self.images = 0
+        self.variants = 0
+        self.encoded = 0
+        self.original_bytes = 0
+        self.best_bytes = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.best_bytes
+
+    @property
+    def saved_ratio(self) -> float:
+        return self.saved_bytes / self.original_bytes if self.original_bytes else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'images': self.images,
+            'variants': self.variants,
+            'encoded': self.encoded,
+            'original_bytes': self.original_bytes,
+            'best_bytes': self.best_bytes,
+            'saved_bytes': self.saved_bytes,
+            'saved_ratio': round(self.saved_ratio, 4),
+        }
+
+    def format(self) -> str:
+        return (f'{self.images} images, {self.variants} variants ({self.encoded} encoded, the rest cached), '
+                f'{self.original_bytes} bytes -> {self.best_bytes} bytes, '
+                f'{self.saved_bytes} bytes saved ({self.saved_ratio * 100:.1f}%)')
+
+
+class ImageVariants(Stage):
+    """
+    Sync pipeline stage which adds AVIF and WebP variants and smaller widths of JPEG and PNG images.
+    Variants are cached on disk by source hash, so unchanged images are never encoded twice.
+    """
+    formats: List[str]
+    widths: List[int]
+    quality: Dict[str, int]
+    cache_dir: str
+    min_size: int
+    max_ratio: float
+    max_workers: int
+    variants: List[str]
+    responsive: Dict[str, Dict[int, str]]
+    report: ImageReport
+
+    def __init__(self, formats: List[str] = None, widths: List[int] = None, quality: Dict[str, int] = None,
+                 cache_dir: str = DEFAULT_CACHE_DIR, min_size: int = DEFAULT_MIN_SIZE,
+                 max_ratio: float = DEFAULT_MAX_RATIO, max_workers: int = None):
+        """
+        :param formats: Subset of < avif | webp >, both by default, webp only when Pillow can't encode AVIF
+        :param widths: Responsive widths in pixels, only widths smaller than the image are generated
+        :param quality: Encoder quality per format, DEFAULT_QUALITY by default
+        :param cache_dir: Directory of the content-addressed variant cache
+        :param min_size: Variant keys of smaller images hold the original
+        :param max_ratio: Variants larger than this fraction of the original are replaced by the original
+        :param max_workers: Size of the encoding process pool, the number of CPUs by default
+        """
+        for f in formats or []:
+            if f not in FORMAT_CONTENT_TYPES:
+                raise Exception(f'Image format must be < avif | webp >, not {f}')
+        if formats is None:
+            formats = [f for f in FORMAT_CONTENT_TYPES if f != FORMAT_AVIF or avif_supported()]
+        # in order of preference
+        self.formats = [f for f in FORMAT_CONTENT_TYPES if f in formats]
+        self.widths = sorted(widths or [])
+        self.quality = dict(DEFAULT_QUALITY, **(quality or {}))
+        self.cache_dir = cache_dir
+        self.min_size = min_size
+        self.max_ratio = max_ratio
+        self.max_workers = max_workers
+        self.variants = []
+        self.responsive = {}
+        self.report = ImageReport()
+
+    def cache_path(self, o: SyncObject, image_format: str, width: Optional[int]) -> str:
+        size = 'full' if width is None else f'{width}w'
+        quality = self.quality.get(image_format, 'default')
+        return os.path.join(self.cache_dir, o.md5[:2], f'{o.md5}-{size}-q{quality}.{image_format}')
+
+    def rule(self) -> 'ImageNegotiation':
+        return ImageNegotiation(self.formats)
+
+    def process(self, objects: List[SyncObject]) -> List[SyncObject]:
+        sources = [o for o in objects if is_source_image(o)]
+        # (source, width or None, format) in the order the variants are added
+        jobs = []
+        for o in sources:
+            if o.size < self.min_size:
+                jobs += [(o, None, f) for f in self.formats]
+                continue
+            source_format = SOURCE_CONTENT_TYPES[o.headers['Content-Type'].split(';')[0]].lower()
+            width = image_width(o)
+            for w in [None] + [w for w in self.widths if w < width]:
+                if w is not None:
+                    jobs.append((o, w, source_format))
+                jobs += [(o, w, f) for f in self.formats]
+
+        encoded = {}
+        missing = []
+        for job in jobs:
+            o, w, f = job
+            if o.size < self.min_size:
+                continue
+            cache_path = self.cache_path(o, f, w)
+            if os.path.exists(cache_path) and os.path.exists(cache_path + '.md5'):
+                with open(cache_path + '.md5') as md5_file:
+                    encoded[job] = (md5_file.read(), os.path.getsize(cache_path))
+            else:
+                missing.append(job)
+        if missing:
+            # objects produced by earlier stages are sent to the workers as bytes
+            work = [(o.path if o.data is None else None, o.data, f, w, self.quality.get(f), self.cache_path(o, f, w))
+                    for o, w, f in missing]
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                for job, result in zip(missing, executor.map(_encode_to_cache, work)):
+                    encoded[job] = result
+
+        output = list(objects)
+        self.variants = []
+        self.responsive = {}
+        self.report = ImageReport()
+        self.report.images = len(sources)
+        self.report.encoded = len(missing)
+        originals = {}
+        for o, w, f in jobs:
+            md5, size = encoded.get((o, w, f), (o.md5, o.size))
+            if f not in FORMAT_CONTENT_TYPES:
+                # smaller width in the source format, the original of the variants of this width
+                key = width_key(o.key, w)
+                headers = dict(o.headers)
+                originals[(o.key, w)] = SyncObject(key=key, path=self.cache_path(o, f, w), md5=md5, size=size,
+                                                   headers=headers, fingerprinted=o.fingerprinted)
+                self.responsive.setdefault(o.key, {})[w] = key
+                output.append(originals[(o.key, w)])
+                self.variants.append(key)
+                continue
+            original = o if w is None else originals[(o.key, w)]
+            key = variant_key(original.key, f)
+            if (o, w, f) in encoded and size <= original.size * self.max_ratio:
+                headers = dict(original.headers)
+                headers['Content-Type'] = FORMAT_CONTENT_TYPES[f]
+                variant = SyncObject(key=key, path=self.cache_path(o, f, w), md5=md5, size=size, headers=headers,
+                                     fingerprinted=o.fingerprinted)
+            else:
+                variant = SyncObject(key=key, path=original.path, data=original.data, md5=original.md5,
+                                     size=original.size, headers=original.headers, fingerprinted=o.fingerprinted)
+            output.append(variant)
+            self.variants.append(key)
+            if w is None and f == self.formats[0]:
+                self.report.original_bytes += o.size
+                self.report.best_bytes += variant.size
+        self.report.variants = len(self.variants)
+        return output
+
+
+class ImageNegotiation(RequestRule):
+    formats: List[str]
+
+    def __init__(self, formats: List[str] = None):
+        """
+        Rewrites requests of JPEG and PNG images to the AVIF or WebP variant the Accept header allows.
+        ImageVariants stores a variant key for every image so no list of variants is needed, use the rule
+        only on behaviors of buckets synced with ImageVariants, see cache_behavior().
+        """
+        self.formats = [f for f in FORMAT_CONTENT_TYPES if f in (formats or list(FORMAT_CONTENT_TYPES))]
+
+    def js(self, name: str) -> str:
+        checks = ''.join(f'''
+    if (accepted.indexOf('{FORMAT_CONTENT_TYPES[f]}') !== -1) {{
+        request.uri = uri + '.{f}';
+        return;
+    }}''' for f in self.formats)
+        return f'''
+var {name}_EXTENSIONS = {json.dumps(SOURCE_EXTENSIONS)};
+
+function {name}(request) {{
+    var uri = request.uri;
+    var dot = uri.lastIndexOf('.');
+    if (dot === -1 || {name}_EXTENSIONS.indexOf(uri.substring(dot).toLowerCase()) === -1) {{
+        return;
+    }}
+    var header = request.headers.accept;
+    var accepted = header ? header.value.split(',').map(function (t) {{
+        return t.split(';')[0].trim().toLowerCase();
+    }}) : [];{checks}
+}}
+'''
+
+    def apply(self, request: Dict) -> Optional[Dict]:
+        header = request['headers'].get('accept')
+        request['uri'] = select_variant(request['uri'], header['value'] if header else None, self.formats)
+        return None
+
+
+def create_response_headers_policy(resource_name: str,
+                                   opts: pulumi.ResourceOptions = None) -> cloudfront.ResponseHeadersPolicy:
+    """
+    Policy adding Vary: Accept, so browser and shared caches don't serve a negotiated format to viewers
+    which didn't accept it
+    """
+    return cloudfront.ResponseHeadersPolicy(resource_name,
+                                            name=resource_name,
+                                            custom_headers_config={
+                                                'items': [{'header': 'Vary', 'value': 'Accept', 'override': True}],
+                                            },
+                                            opts=opts)
+
+
+def cache_behavior(behavior: config.CacheBehavior, function_arn: pulumi.Input[str],
+                   response_headers_policy_id: pulumi.Input[str]) -> config.CacheBehavior:
+    """
+    Copy of an image behavior negotiating the format. The rewritten URI is the cache key of the variant,
+    so neither Accept nor the query string have to be part of the key.
+    :param function_arn: Function with an ImageNegotiation rule, see functions.RequestRules.create_function
+    :param response_headers_policy_id: Policy adding Vary: Accept, see create_response_headers_policy
+    """
+    return behavior.replace(
+        function_associations=[a for a in behavior.function_associations
+                               if a.event_type != config.FUNCTION_EVENT_TYPE_VIEWER_REQUEST] +
+                              [config.FunctionAssociation(config.FUNCTION_EVENT_TYPE_VIEWER_REQUEST, function_arn)],
+        forwarded_values_query_string=False,
+        response_headers_policy_id=response_headers_policy_id)
@@ -0,0 +1,198 @@
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+from urllib.parse import quote
+
+from pulumi_aws_website.config import DEFAULT_ROOT_OBJECT
+from pulumi_aws_website.patterns import first_matching_pattern
+
+# https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/cloudfront-limits.html#limits-invalidations
+MAX_PATHS_IN_PROGRESS = 3000
+MAX_WILDCARDS_IN_PROGRESS = 15
+MAX_PATH_LENGTH = 4000
+
+# characters CloudFront accepts unencoded in invalidation paths, everything else is percent-encoded
+SAFE_PATH_CHARACTERS = "/~!$&'()+,;=:@-._"
+
+
+def key_to_paths(key: str, default_root_object: str = DEFAULT_ROOT_OBJECT) -> List[str]:
+    """
+    Cache key paths of an object key: the key itself and '/' for the default root object.
+    'docs/' is not served by S3 REST origins, and a viewer-request IndexRewrite makes 'docs/index.html'
+    the cache key, so 'docs/index.html' only gives '/docs/index.html'.
+    """
+    path = '/' + quote(key, safe=SAFE_PATH_CHARACTERS)
+    paths = [path]
+    if default_root_object and key == default_root_object:
+        paths.append('/')
+    return paths
+
+
+def is_wildcard(path: str) -> bool:
+    return path.endswith('*')
+
+
+def _parent_directories(path: str) -> Iterable[str]:
+    """
+    '/docs/api/x.html' gives '/docs/api/', '/docs/', '/'
+    """
+    i = path.rfind('/', 0, len(path) - 1 if path.endswith('/') else len(path))
+    while i >= 0:
+        yield path[:i + 1]
+        i = path.rfind('/', 0, i)
+
+
+class InvalidationPlan:
+    """
+    Invalidation requests to send one after another, each within the CloudFront in-progress limits
+    """
+    batches: List[List[str]]
+    wildcards: List[str]
+    requested_paths: int
+
+    def __init__(self, batches: List[List[str]], wildcards: List[str], requested_paths: int):
+        self.batches = batches
+        self.wildcards = wildcards
+        self.requested_paths = requested_paths
+
+    @property
+    def paths(self) -> List[str]:
+        return [p for batch in self.batches for p in batch]
+
+    def __len__(self):
+        return len(self.paths)
+
+
+def plan_invalidations(paths: Iterable[str],
+                       all_paths: Iterable[str] = None,
+                       max_paths: int = MAX_PATHS_IN_PROGRESS,
+                       max_wildcards: int = MAX_WILDCARDS_IN_PROGRESS) -> InvalidationPlan:
+    """
+    Computes a minimal set of invalidation paths.
+    Wildcards in paths count against max_wildcards first, paths they cover are dropped.
+    Sibling paths are merged into a '/dir/*' wildcard only while the number of wildcards stays within max_wildcards:
+    first directories in which every object changed (known only when all_paths is given, it costs nothing),
+    then, while there are more than max_paths paths, directories with the best ratio of saved paths
+    to needlessly invalidated objects. '/*' is only used when no other directory is left.
+    Whatever does not fit into max_paths or max_wildcards is split into several batches.
+    :param paths: Changed viewer paths, see key_to_paths
+    :param all_paths: Every viewer path of the site, used to avoid wildcards which invalidate unchanged objects
+    """
+    changed = set()
+    wildcards = set()
+    for p in paths:
+        if len(p) > MAX_PATH_LENGTH:
+            wildcards.add(next(_parent_directories(p[:MAX_PATH_LENGTH - 1])) + '*')
+        elif is_wildcard(p):
+            wildcards.add(p)
+        else:
+            changed.add(p)
+    requested = len(changed) + len(wildcards)
+    # requested wildcards use up the budget before any path is merged
+    wildcards = {w for w in wildcards if not any(w != o and w.startswith(o[:-1]) for o in wildcards)}
+    changed = {p for p in changed if not any(p.startswith(w[:-1]) for w in wildcards)}
+
+    changed_per_directory = _count_per_directory(changed)
+    total_per_directory = _count_per_directory(all_paths) if all_paths is not None else None
+
+    def waste(directory):
+        if total_per_directory is None:
+            return 0
+        return max(total_per_directory.get(directory, 0) - changed_per_directory[directory], 0)
+
+    def merge(directory):
+        covered = {p for p in changed if p.startswith(directory)}
+        changed.difference_update(covered)
+        for p in covered:
+            for d in _parent_directories(p):
+                changed_per_directory[d] -= 1
+        for w in [w for w in wildcards if w.startswith(directory)]:
+            wildcards.remove(w)
+        wildcards.add(directory + '*')
+
+    def candidates():
+        return [d for d, n in changed_per_directory.items()
+                if n > 1 and not any(d.startswith(w[:-1]) for w in wildcards)]
+
+    if total_per_directory is not None:
+        # '/*' throws away the whole edge cache, even when every known path changed
+        free = sorted((d for d in candidates() if d != '/' and waste(d) == 0),
+                      key=lambda d: (-changed_per_directory[d], d))
+        for d in free:
+            if len(wildcards) >= max_wildcards:
+                break
+            if changed_per_directory[d] > 1 and not any(d.startswith(w[:-1]) for w in wildcards):
+                merge(d)
+
+    while len(changed) + len(wildcards) > max_paths and len(wildcards) < max_wildcards:
+        options = candidates()
+        if not options:
+            break
+        best = max(options, key=lambda d: (d != '/', (changed_per_directory[d] - 1) / (1 + waste(d)), -len(d)))
+        merge(best)
+
+    # every batch holds at most max_wildcards wildcards and max_paths paths
+    per_batch = min(max_wildcards, max_paths)
+    batches = [sorted(wildcards)[i:i + per_batch] for i in range(0, len(wildcards), per_batch)] or [[]]
+    remaining = sorted(changed)
+    for batch in batches:
+        free_slots = max(max_paths - len(batch), 0)
+        batch.extend(remaining[:free_slots])
+        remaining = remaining[free_slots:]
+    batches += [remaining[i:i + max_paths] for i in range(0, len(remaining), max_paths)]
+    batches = [b for b in batches if b]
+    return InvalidationPlan(batches, sorted(wildcards), requested)
+
+
+def _count_per_directory(paths: Iterable[str]) -> Dict[str, int]:
+    counts = defaultdict(int)
+    for p in paths:
+        for d in _parent_directories(p):
+            counts[d] += 1
+    return counts
+
+
+def create_invalidations(client, distribution_id: str, plan: InvalidationPlan, wait: bool = True) -> List[str]:
+    """
+    Sends the batches of a plan with a boto3 CloudFront client. When there is more than one batch
+    every batch but the last is waited for, so the in-progress limits are never exceeded.
+    :return: Invalidation IDs
+    """
+    ids = []
+    for i, batch in enumerate(plan.batches):
+        response = client.create_invalidation(
+            DistributionId=distribution_id,
+            InvalidationBatch={
+                'Paths': {'Quantity': len(batch), 'Items': batch},
+                'CallerReference': f'{int(time.time())}-{uuid.uuid4()}',
+            })
+        invalidation_id = response['Invalidation']['Id']
+        ids.append(invalidation_id)
+        if wait and i < len(plan.batches) - 1:
+            client.get_waiter('invalidation_completed').wait(DistributionId=distribution_id, Id=invalidation_id)
+    return ids
+
+
+def reachable(path: str, behavior_patterns: List[str], own_pattern: str = None) -> bool:
+    """
+    Whether CloudFront routes path to the behavior with own_pattern (None for the default behavior)
+    given the ordered behavior patterns
+    """
+    i = first_matching_pattern(behavior_patterns, path)
+    if own_pattern is None:
+        return i is None
+    return i is not None and behavior_patterns[i] == own_pattern
+
+
+def paths_for_keys(keys: Iterable[str], behavior_patterns: List[str], own_pattern: str = None,
+                   default_root_object: str = DEFAULT_ROOT_OBJECT) -> Set[str]:
+    """
+    Viewer paths of the changed keys of one bucket, dropping paths CloudFront routes to another behavior
+    """
+    paths = set()
+    for key in keys:
+        for p in key_to_paths(key, default_root_object):
+            if reachable(p, behavior_patterns, own_pattern):
+                paths.add(p)
+    return paths
@@ -0,0 +1,370 @@
+"""
+Cache efficiency linter of WebSite configs. With a sample of access logs every finding gets an estimate of the
+cache keys and the hit ratio it costs.
+
+    findings = lint.lint_website(website, records=logs.iter_file_records('./logs/E2ABC.2026-10-17-10.gz'))
+    print(lint.format_findings(findings))
+
+    website-lint ./__main__.py --logs ./logs
+"""
+import argparse
+import json
+import runpy
+import sys
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from pulumi_aws_website import compression
+from pulumi_aws_website import config
+from pulumi_aws_website import fingerprint
+from pulumi_aws_website import logs
+
+RULE_QUERY_STRING = 'query-string'
+RULE_HEADERS = 'headers'
+RULE_COOKIES = 'cookies'
+RULE_TTL = 'ttl'
+RULE_DEFAULT_TTL = 'default-ttl'
+RULE_LAMBDA_COPIES = 'lambda-copies'
+RULE_COMPRESS = 'compress'
+
+SEVERITY_WARNING = 'warning'
+SEVERITY_INFO = 'info'
+
+# request headers CloudFront access logs record, a cache key with other headers can't be estimated
+LOGGED_HEADERS = {
+    'host': 'cs(Host)',
+    'referer': 'cs(Referer)',
+    'user-agent': 'cs(User-Agent)',
+}
+LAMBDA_VIEWER_EVENT_TYPES = [config.LAMBDA_EVENT_TYPE_VIEWER_REQUEST, config.LAMBDA_EVENT_TYPE_VIEWER_RESPONSE]
+
+
+class Impact:
+    """
+    Estimated from a log sample. Hit ratios count the first request of every cache key at every edge
+    as a miss, and for TTLs also requests after the key expired, so they are upper bounds.
+    """
+    requests: int
+    cache_keys: Optional[int]
+    fixed_cache_keys: Optional[int]
+    hit_ratio: Optional[float]
+    fixed_hit_ratio: Optional[float]
+    note: Optional[str]
+
+    def __init__(self, requests: int, cache_keys: int = None, fixed_cache_keys: int = None,
+                 hit_ratio: float = None, fixed_hit_ratio: float = None, note: str = None):
+        self.requests = requests
+        self.cache_keys = cache_keys
+        self.fixed_cache_keys = fixed_cache_keys
+        self.hit_ratio = hit_ratio
+        self.fixed_hit_ratio = fixed_hit_ratio
+        self.note = note
+
+    def to_dict(self) -> Dict:
+        return {name: value for name, value in (('requests', self.requests),
+                                                ('cache_keys', self.cache_keys),
+                                                ('fixed_cache_keys', self.fixed_cache_keys),
+                                                ('hit_ratio', self.hit_ratio),
+                                                ('fixed_hit_ratio', self.fixed_hit_ratio),
+                                                ('note', self.note)) if value is not None}
+
+    def format(self) -> str:
+        parts = [f'{self.requests} requests']
+        if self.cache_keys is not None:
+            parts.append(f'{self.cache_keys} cache keys, {self.fixed_cache_keys} when fixed')
+        if self.hit_ratio is not None:
+            parts.append(f'hit ratio {self.hit_ratio:.1%}, {self.fixed_hit_ratio:.1%} when fixed')
+        if self.note:
+            parts.append(self.note)
+        return ', '.join(parts)
+
+
+class Finding:
+    rule: str
+    behavior: str
+    message: str
+    severity: str
+    impact: Optional[Impact]
+
+    def __init__(self, rule: str, behavior: str, message: str, severity: str = SEVERITY_WARNING):
+        """
+        :param behavior: Path pattern of the cache behavior, logs.DEFAULT_BEHAVIOR for the default one
+        """
+        self.rule = rule
+        self.behavior = behavior
+        self.message = message
+        self.severity = severity
+        self.impact = None
+
+    def to_dict(self) -> Dict:
+        output = {
+            'rule': self.rule,
+            'behavior': self.behavior,
+            'severity': self.severity,
+            'message': self.message,
+        }
+        if self.impact is not None:
+            output['impact'] = self.impact.to_dict()
+        return output
+
+    def __repr__(self):
+        return f'Finding({self.rule!r}, {self.behavior!r})'
+
+
+def _cache_key_settings(behavior: config.CacheBehavior, cache_policy: Optional[config.CachePolicy]) -> Dict:
+    """
+    What the cache key of a behavior contains: query strings, headers, cookies and TTLs,
+    from the cache policy when the behavior uses one
+    """
+    if behavior.cache_policy_id is not None and cache_policy is not None:
+        # an allowlist, a cache busting ?v= for example, is deliberate
+        query_string = cache_policy.query_strings_config()['queryStringBehavior'] in (
+            config.CACHE_KEY_BEHAVIOR_ALL, config.CACHE_KEY_BEHAVIOR_ALL_EXCEPT)
+        return {'query_string': query_string,
+                'headers': cache_policy.headers or [],
+                'cookies': cache_policy.cookies_config()['cookieBehavior'] != config.CACHE_KEY_BEHAVIOR_NONE,
+                'ttls': cache_policy}
+    if behavior.cache_policy_id is not None:
+        # a policy managed elsewhere, nothing is known about the key
+        return {'query_string': False, 'headers': [], 'cookies': False, 'ttls': None}
+    return {'query_string': behavior.forwarded_values_query_string,
+            'headers': behavior.forwarded_values_headers or [],
+            'cookies': behavior.forwarded_values_cookies != 'none',
+            'ttls': behavior}
+
+
+def _asset_max_age(cache_control_rules: Optional[List[fingerprint.CacheControlRule]]) -> Optional[int]:
+    rules = cache_control_rules if cache_control_rules is not None else fingerprint.DEFAULT_RULES
+    max_ages = [a for a in (fingerprint.parse_max_age(r.cache_control) for r in rules) if a is not None]
+    return max(max_ages) if max_ages else None
+
+
+def lint_behaviors(behaviors: List[Tuple[str, config.CacheBehavior]], static_behaviors: List[str],
+                   cache_policy: config.CachePolicy = None,
+                   lambda_function_associations: List[config.LambdaFunctionAssociation] = None,
+                   cache_control_rules: List[fingerprint.CacheControlRule] = None) -> List[Finding]:
+    """
+    :param behaviors: Behavior name and cache behavior, in the order of the distribution
+    :param static_behaviors: Names of behaviors of bucket origins, which ignore query strings and cookies
+    :param cache_policy: Config of the cache policy the behaviors with a cache_policy_id use
+    :param lambda_function_associations: Associations the WebSite copies onto every bucket behavior
+    :param cache_control_rules: Cache-Control of the content, fingerprint.DEFAULT_RULES by default
+    """
+    asset_max_age = _asset_max_age(cache_control_rules)
+    findings = []
+    for name, behavior in behaviors:
+        static = name in static_behaviors
+        key = _cache_key_settings(behavior, cache_policy)
+        if static and key['query_string']:
+            findings.append(Finding(RULE_QUERY_STRING, name,
+                                    'query strings are part of the cache key, the bucket ignores them, so every '
+                                    'tracking parameter is a separate cache entry'))
+        # behaviors which cache nothing have no cache key to fragment
+        caching = key['ttls'] is None or key['ttls'].max_ttl > 0
+        if key['headers'] and caching:
+            headers = ', '.join(key['headers'])
+            message = f'headers {headers} are part of the cache key, every value is a separate cache entry'
+            if '*' in key['headers']:
+                message = 'all headers are forwarded, CloudFront does not cache the responses'
+            findings.append(Finding(RULE_HEADERS, name, message))
+        if static and key['cookies']:
+            findings.append(Finding(RULE_COOKIES, name, 'cookies are part of the cache key, the bucket ignores them'))
+        ttls = key['ttls']
+        if ttls is not None and static:
+            if ttls.default_ttl == 0:
+                findings.append(Finding(RULE_DEFAULT_TTL, name, 'default_ttl=0, objects without Cache-Control '
+                                                                'are not cached'))
+            if ttls.min_ttl == 0 and asset_max_age is not None and ttls.max_ttl < asset_max_age:
+                findings.append(Finding(RULE_TTL, name,
+                                        f'max_ttl={ttls.max_ttl} is lower than the max-age={asset_max_age} of '
+                                        f'the content, edges revalidate it every {ttls.max_ttl}s'))
+        if not behavior.compress:
+            findings.append(Finding(RULE_COMPRESS, name, 'compress=False, text responses are sent uncompressed '
+                                                         'unless the origin compresses them'))
+
+    copies = [name for name, behavior in behaviors if name in static_behaviors and name != logs.DEFAULT_BEHAVIOR
+              and behavior.lambda_function_associations]
+    if lambda_function_associations and copies:
+        event_types = ', '.join(sorted({a.event_type for a in lambda_function_associations}))
+        for name in copies:
+            finding = Finding(RULE_LAMBDA_COPIES, name,
+                              f'Lambda@Edge {event_types} associations are copied from lambda_function_associations, '
+                              f'check that this behavior needs them', SEVERITY_INFO)
+            findings.append(finding)
+    return findings
+
+
+def _field(name: str) -> int:
+    return logs.DEFAULT_FIELDS.index(name)
+
+
+def _hit_ratio(records: List[logs.LogRecord], key: Callable[[logs.LogRecord], Hashable]) -> Tuple[int, float]:
+    """
+    Distinct cache keys and hit ratio when only the first request of a key at an edge misses
+    """
+    keys = set()
+    per_edge = set()
+    for r in records:
+        k = key(r)
+        keys.add(k)
+        per_edge.add((logs.edge_pop(r.edge), k))
+    return len(keys), 1 - len(per_edge) / len(records) if records else 0.0
+
+
+def _ttl_hit_ratio(records: List[logs.LogRecord], ttl: float) -> float:
+    """
+    Hit ratio when a key is fetched on its first request at an edge and again once it is older than ttl
+    """
+    fetched = {}
+    hits = 0
+    days = {}
+    for timestamp, r in sorted(((logs.record_timestamp(r, days), r) for r in records), key=lambda x: x[0]):
+        k = (logs.edge_pop(r.edge), r.path)
+        last = fetched.get(k)
+        if last is not None and timestamp - last < ttl:
+            hits += 1
+        else:
+            fetched[k] = timestamp
+    return hits / len(records) if records else 0.0
+
+
+def _is_compressible(r: logs.LogRecord) -> bool:
+    content_type = r.fields[_field('sc-content-type')].split(';')[0] if len(r.fields) > _field('sc-content-type') \
+        else '-'
+    return any(content_type.startswith(t) for t in compression.COMPRESSIBLE_CONTENT_TYPES)
+
+
+def estimate_impact(findings: List[Finding], records: Iterable[logs.LogRecord], patterns: List[str],
+                    behaviors: Dict[str, config.CacheBehavior], cache_policy: config.CachePolicy = None,
+                    asset_max_age: int = None):
+    """
+    Sets the impact of every finding from a log sample
+    :param patterns: Path patterns of the ordered cache behaviors, to attribute requests
+    :param behaviors: Behavior name to cache behavior
+    """
+    matcher = logs.BehaviorMatcher(patterns)
+    by_behavior = defaultdict(list)
+    for record in records:
+        by_behavior[matcher.resolve(record.path)].append(record)
+
+    for finding in findings:
+        sample = by_behavior.get(finding.behavior, [])
+        requests = len(sample)
+        behavior = behaviors[finding.behavior]
+        key = _cache_key_settings(behavior, cache_policy)
+        if not sample:
+            finding.impact = Impact(0, note='no requests in the log sample')
+        elif finding.rule == RULE_QUERY_STRING:
+            keys, ratio = _hit_ratio(sample, lambda r: (r.path, r.query))
+            fixed_keys, fixed_ratio = _hit_ratio(sample, lambda r: r.path)
+            finding.impact = Impact(requests, keys, fixed_keys, ratio, fixed_ratio)
+        elif finding.rule in (RULE_HEADERS, RULE_COOKIES):
+            names = [h.lower() for h in key['headers']] if finding.rule == RULE_HEADERS else ['cookie']
+            unknown = [h for h in names if h not in LOGGED_HEADERS and h != 'cookie']
+            if unknown or '*' in names:
+                finding.impact = Impact(requests, note=f'{", ".join(unknown or names)} not in access logs')
+                continue
+            indexes = [_field(LOGGED_HEADERS.get(h, 'cs(Cookie)')) for h in names]
+            keys, ratio = _hit_ratio(sample, lambda r: (r.path,) + tuple(r.fields[i] for i in indexes))
+            fixed_keys, fixed_ratio = _hit_ratio(sample, lambda r: r.path)
+            finding.impact = Impact(requests, keys, fixed_keys, ratio, fixed_ratio)
+        elif finding.rule == RULE_TTL:
+            max_ttl = key['ttls'].max_ttl
+            finding.impact = Impact(requests, hit_ratio=_ttl_hit_ratio(sample, max_ttl),
+                                    fixed_hit_ratio=_ttl_hit_ratio(sample, asset_max_age or max_ttl))
+        elif finding.rule == RULE_DEFAULT_TTL:
+            finding.impact = Impact(requests, note='responses without Cache-Control miss on every request')
+        elif finding.rule == RULE_LAMBDA_COPIES:
+            finding.impact = Impact(requests, note=f'{requests} Lambda@Edge viewer invocations' if any(
+                a.event_type in LAMBDA_VIEWER_EVENT_TYPES for a in behavior.lambda_function_associations)
+                else f'{sum(r.result != logs.RESULT_HIT for r in sample)} Lambda@Edge origin invocations')
+        elif finding.rule == RULE_COMPRESS:
+            compressible = sum(r.bytes for r in sample if _is_compressible(r))
+            finding.impact = Impact(requests, note=f'{compressible} of {sum(r.bytes for r in sample)} bytes '
+                                                   f'had a compressible content type')
+
+
+def website_behaviors(website) -> List[Tuple[str, config.CacheBehavior]]:
+    """
+    Behavior name and cache behavior of a WebSite, the default behavior first
+    """
+    return [(logs.DEFAULT_BEHAVIOR, website.default_cache_behavior)] + \
+        [(cb.path_pattern, cb) for cb in website.cache_behaviors]
+
+
+def lint_website(website, records: Iterable[logs.LogRecord] = None,
+                 cache_control_rules: List[fingerprint.CacheControlRule] = None) -> List[Finding]:
+    """
+    Findings of the cache behaviors of a constructed WebSite
+    :param records: Access log sample of the distribution, adds the impact of every finding
+    :param cache_control_rules: Cache-Control of the content, fingerprint.DEFAULT_RULES by default
+    """
+    behaviors = website_behaviors(website)
+    static = [logs.DEFAULT_BEHAVIOR] + list(website.bucket_path_patterns.values())
+    findings = lint_behaviors(behaviors, static, website.cache_policy_config, website.lambda_function_associations,
+                              cache_control_rules)
+    if records is not None:
+        estimate_impact(findings, records, [cb.path_pattern for cb in website.cache_behaviors], dict(behaviors),
+                        website.cache_policy_config, _asset_max_age(cache_control_rules))
+    return findings
+
+
+def format_findings(findings: List[Finding]) -> str:
+    lines = []
+    for f in findings:
+        lines.append(f'{f.severity}: {f.behavior}: {f.rule}: {f.message}')
+        if f.impact is not None:
+            lines.append(f'    {f.impact.format()}')
+    return '\n'.join(lines)
+
+
+def load_websites(program: str) -> Dict[str, object]:
+    """
+    Runs a Pulumi program under mocks and returns its module level WebSites, the sites of WebSiteFleets included
+    """
+    import pulumi
+    from pulumi_aws_website import WebSite, WebSiteFleet
+
+    class ConfigMocks(pulumi.runtime.Mocks):
+        def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+            return args.name + '_id', args.inputs
+
+        def call(self, args: pulumi.runtime.MockCallArgs):
+            return {}
+
+    pulumi.runtime.set_mocks(ConfigMocks(), preview=True)
+    websites = {}
+    for name, value in runpy.run_path(program, run_name='__main__').items():
+        if isinstance(value, WebSite):
+            websites[name] = value
+        elif isinstance(value, WebSiteFleet):
+            for site, website in value.sites.items():
+                websites[f'{name}.{site}'] = website
+    return websites
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Cache efficiency findings of the WebSites of a Pulumi program')
+    parser.add_argument('program', help='Pulumi program, for example __main__.py, run with mocked resources')
+    parser.add_argument('--logs', action='append', default=[],
+                        help='Access log sample: directory, .gz file or s3://bucket/prefix, can be repeated')
+    parser.add_argument('--json', action='store_true', help='Print the findings as JSON')
+    args = parser.parse_args(argv)
+
+    sources = [f for s in args.logs for f in logs.list_sources(s)]
+    results = {}
+    for name, website in load_websites(args.program).items():
+        records = (r for source in sources for r in logs.iter_file_records(source)) if sources else None
+        results[name] = lint_website(website, records)
+    if args.json:
+        json.dump({name: [f.to_dict() for f in findings] for name, findings in results.items()}, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        for name, findings in results.items():
+            sys.stdout.write(f'{name}\n{format_findings(findings) or "no findings"}\n\n')
+    if any(f.severity == SEVERITY_WARNING for findings in results.values() for f in findings):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+"""
+Streaming analyzer of CloudFront standard access logs.
+
+    python -m pulumi_aws_website.logs ./logs --behavior '/docs/*' --behavior '/api/*'
+    python -m pulumi_aws_website.logs s3://my-log-bucket/cloudfront/ --workers 8
+"""
+import argparse
+import datetime
+import gzip
+import io
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+from pulumi_aws_website.routing import PatternIndex
+
+DEFAULT_BEHAVIOR = 'default'
+
+# https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/AccessLogs.html#LogFileFormat
+DEFAULT_FIELDS = [
+    'date', 'time', 'x-edge-location', 'sc-bytes', 'c-ip', 'cs-method', 'cs(Host)', 'cs-uri-stem', 'sc-status',
+    'cs(Referer)', 'cs(User-Agent)', 'cs-uri-query', 'cs(Cookie)', 'x-edge-result-type', 'x-edge-request-id',
+    'x-host-header', 'cs-protocol', 'cs-bytes', 'time-taken', 'x-forwarded-for', 'ssl-protocol', 'ssl-cipher',
+    'x-edge-response-result-type', 'cs-protocol-version', 'fle-status', 'fle-encrypted-fields', 'c-port',
+    'time-to-first-byte', 'x-edge-detailed-result-type', 'sc-content-type', 'sc-content-len', 'sc-range-start',
+    'sc-range-end',
+]
+
+RESULT_HIT = 'Hit'
+RESULT_REFRESH_HIT = 'RefreshHit'
+RESULT_MISS = 'Miss'
+RESULT_ERROR = 'Error'
+
+# latency histogram buckets grow by 5%, percentiles are exact to within that
+HISTOGRAM_GROWTH = 1.05
+HISTOGRAM_MIN_MS = 0.1
+
+
+class LogRecord:
+    __slots__ = ('edge', 'path', 'query', 'result', 'bytes', 'time_taken', 'status', 'fields')
+
+    def __init__(self, edge: str, path: str, query: str, result: str, sc_bytes: int, time_taken: float,
+                 status: str, fields: List[str]):
+        self.edge = edge
+        self.path = path
+        self.query = query
+        self.result = result
+        self.bytes = sc_bytes
+        self.time_taken = time_taken
+        self.status = status
+        # raw values, for analyses which need more than the common fields
+        self.fields = fields
+
+
+def iter_lines(fileobj) -> Iterator[str]:
+    """
+    Decompresses a gzipped log file lazily, line by line
+    """
+    with gzip.GzipFile(fileobj=fileobj) as f:
+        for line in io.TextIOWrapper(f, encoding='utf-8', errors='replace'):
+            yield line
+
+
+def parse_records(lines: Iterable[str]) -> Iterator[LogRecord]:
+    """
+    Parses log lines, the #Fields directive of a file overrides DEFAULT_FIELDS
+    """
+    index = {name: i for i, name in enumerate(DEFAULT_FIELDS)}
+    for line in lines:
+        if line.startswith('#'):
+            if line.startswith('#Fields:'):
+                index = {name: i for i, name in enumerate(line[len('#Fields:'):].split())}
+            continue
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < len(index):
+            continue
+        try:
+            yield LogRecord(edge=fields[index['x-edge-location']],
+                            path=unquote(fields[index['cs-uri-stem']]),
+                            query=fields[index['cs-uri-query']],
+                            result=fields[index['x-edge-result-type']],
+                            sc_bytes=int(fields[index['sc-bytes']]),
+                            time_taken=float(fields[index['time-taken']]),
+                            status=fields[index['sc-status']],
+                            fields=fields)
+        except (KeyError, ValueError):
+            continue
+
+
+def record_timestamp(record: LogRecord, days: Dict[str, float] = None) -> float:
+    """
+    Unix time of a record, date and time are the first fields of every log format version
+    :param days: Cache of parsed dates shared between calls
+    """
+    date, time = record.fields[0], record.fields[1]
+    day = days.get(date) if days is not None else None
+    if day is None:
+        day = datetime.datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc).timestamp()
+        if days is not None:
+            days[date] = day
+    h, m, s = time.split(':')
+    return day + int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def edge_pop(edge_location: str) -> str:
+    """
+    'IAD89-C1' gives 'IAD', the airport code of the point of presence
+    """
+    return edge_location[:3]
+
+
+class LatencyHistogram:
+    """
+    Log-scale histogram of time-taken in milliseconds, constant memory and mergeable across processes
+    """
+    buckets: Dict[int, int]
+    count: int
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+
+    @staticmethod
+    def bucket(ms: float) -> int:
+        if ms <= HISTOGRAM_MIN_MS:
+            return 0
+        return int(math.log(ms / HISTOGRAM_MIN_MS, HISTOGRAM_GROWTH)) + 1
+
+    @staticmethod
+    def upper_bound(bucket: int) -> float:
+        return HISTOGRAM_MIN_MS * HISTOGRAM_GROWTH ** bucket
+
+    def add(self, ms: float):
+        b = self.bucket(ms)
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+        self.count += 1
+
+    def merge(self, other: 'LatencyHistogram'):
+        for b, n in other.buckets.items():
+            self.buckets[b] = self.buckets.get(b, 0) + n
+        self.count += other.count
+
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= rank:
+                return self.upper_bound(b)
+        return self.upper_bound(max(self.buckets))
+
+
+class Stats:
+    requests: int
+    hits: int
+    refresh_hits: int
+    misses: int
+    errors: int
+    bytes: int
+    latency: LatencyHistogram
+
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.refresh_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = LatencyHistogram()
+
+    def add(self, record: LogRecord):
+        self.requests += 1
+        if record.result == RESULT_HIT:
+            self.hits += 1
+        elif record.result == RESULT_REFRESH_HIT:
+            self.refresh_hits += 1
+        elif record.result == RESULT_MISS:
+            self.misses += 1
+        elif record.result == RESULT_ERROR:
+            self.errors += 1
+        self.bytes += record.bytes
+        self.latency.add(record.time_taken * 1000)
+
+    def merge(self, other: 'Stats'):
+        self.requests += other.requests
+        self.hits += other.hits
+        self.refresh_hits += other.refresh_hits
+        self.misses += other.misses
+        self.errors += other.errors
+        self.bytes += other.bytes
+        self.latency.merge(other.latency)
+
+    def ratio(self, n: int) -> float:
+        return n / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'hit_ratio': self.ratio(self.hits),
+            'refresh_hit_ratio': self.ratio(self.refresh_hits),
+            'miss_ratio': self.ratio(self.misses),
+            'error_ratio': self.ratio(self.errors),
+            'bytes': self.bytes,
+            'time_taken_ms': {
+                'p50': self.latency.percentile(50),
+                'p90': self.latency.percentile(90),
+                'p99': self.latency.percentile(99),
+            },
+        }
+
+
+class Report:
+    behaviors: Dict[str, Stats]
+    edges: Dict[str, Stats]
+    total: Stats
+
+    def __init__(self):
+        self.behaviors = {}
+        self.edges = {}
+        self.total = Stats()
+
+    def add(self, behavior: str, record: LogRecord):
+        self.total.add(record)
+        stats = self.behaviors.get(behavior)
+        if stats is None:
+            stats = self.behaviors[behavior] = Stats()
+        stats.add(record)
+        pop = edge_pop(record.edge)
+        stats = self.edges.get(pop)
+        if stats is None:
+            stats = self.edges[pop] = Stats()
+        stats.add(record)
+
+    def merge(self, other: 'Report'):
+        self.total.merge(other.total)
+        for target, source in ((self.behaviors, other.behaviors), (self.edges, other.edges)):
+            for name, stats in source.items():
+                if name not in target:
+                    target[name] = Stats()
+                target[name].merge(stats)
+
+    def to_dict(self) -> Dict:
+        return {
+            'total': self.total.to_dict(),
+            'behaviors': {name: s.to_dict() for name, s in sorted(self.behaviors.items())},
+            'edges': {name: s.to_dict() for name, s in sorted(self.edges.items())},
+        }
+
+    def format(self) -> str:
+        lines = []
+        header = f'{"":<24} {"requests":>12} {"hit":>7} {"refresh":>7} {"miss":>7} {"error":>7} ' \
+                 f'{"bytes":>14} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9}'
+        for title, group in (('behavior', self.behaviors), ('edge', self.edges)):
+            lines.append(title)
+            lines.append(header)
+            for name, s in sorted(group.items(), key=lambda x: -x[1].requests):
+                lines.append(f'{name:<24} {s.requests:>12} {s.ratio(s.hits):>7.1%} {s.ratio(s.refresh_hits):>7.1%} '
+                             f'{s.ratio(s.misses):>7.1%} {s.ratio(s.errors):>7.1%} {s.bytes:>14} '
+                             f'{s.latency.percentile(50):>9.1f} {s.latency.percentile(90):>9.1f} '
+                             f'{s.latency.percentile(99):>9.1f}')
+            lines.append('')
+        return '\n'.join(lines)
+
+
+class BehaviorMatcher:
+    """
+    Attributes request paths to cache behaviors by path pattern, the way CloudFront does
+    """
+    patterns: List[str]
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = [p for p in patterns if p is not None]
+        self.index = PatternIndex(self.patterns, cache_size=65536)
+
+    def resolve(self, path: str) -> str:
+        i = self.index.first_match(path)
+        return DEFAULT_BEHAVIOR if i is None else self.patterns[i]
+
+
+def analyze_records(records: Iterable[LogRecord], patterns: List[str]) -> Report:
+    matcher = BehaviorMatcher(patterns)
+    report = Report()
+    for record in records:
+        report.add(matcher.resolve(record.path), record)
+    return report
+
+
+def list_sources(source: str, client=None) -> List[str]:
+    """
+    Log files of a local directory or of an s3://bucket/prefix location
+    """
+    if source.startswith('s3://'):
+        bucket, _, prefix = source[len('s3://'):].partition('/')
+        client = client if client is not None else _s3_client()
+        files = []
+        token = None
+        while True:
+            kwargs = {'Bucket': bucket, 'Prefix': prefix}
+            if token is not None:
+                kwargs['ContinuationToken'] = token
+            response = client.list_objects_v2(**kwargs)
+            files += [f's3://{bucket}/{o["Key"]}' for o in response.get('Contents', []) if o['Key'].endswith('.gz')]
+            if not response.get('IsTruncated'):
+                return files
+            token = response['NextContinuationToken']
+    if os.path.isfile(source):
+        return [source]
+    files = []
+    for root, dirs, names in os.walk(source):
+        dirs.sort()
+        files += [os.path.join(root, n) for n in sorted(names) if n.endswith('.gz')]
+    return files
+
+
+def open_source(source: str, client=None):
+    if source.startswith('s3://'):
+        bucket, _, key = source[len('s3://'):].partition('/')
+        client = client if client is not None else _s3_client()
+        return client.get_object(Bucket=bucket, Key=key)['Body']
+    return open(source, 'rb')
+
+
+# S3 clients by (process ID, profile_name, region_name), clients can't be pickled for pool workers
+# and forked workers must not reuse the connections of the parent
+_s3_clients = {}
+
+
+def _s3_client(profile_name: str = None, region_name: str = None):
+    key = (os.getpid(), profile_name, region_name)
+    if key not in _s3_clients:
+        from pulumi_aws_website.sync import make_s3_client
+
+        _s3_clients[key] = make_s3_client(region_name=region_name, profile_name=profile_name)
+    return _s3_clients[key]
+
+
+def iter_file_records(source: str, client=None) -> Iterator[LogRecord]:
+    body = open_source(source, client)
+    try:
+        yield from parse_records(iter_lines(body))
+    finally:
+        body.close()
+
+
+def _analyze_file(args: Tuple[str, List[str], Optional[str], Optional[str]]) -> Report:
+    source, patterns, profile_name, region_name = args
+    client = _s3_client(profile_name, region_name) if source.startswith('s3://') else None
+    return analyze_records(iter_file_records(source, client), patterns)
+
+
+def analyze(sources: List[str], patterns: List[str], max_workers: int = None, client=None,
+            profile_name: str = None, region_name: str = None) -> Report:
+    """
+    Analyzes log files in a process pool, one file per task, and merges the partial reports.
+    Memory use does not depend on the size of the logs.
+    :param sources: Log files, local paths or s3://bucket/key, see list_sources
+    :param patterns: Ordered cache behavior path patterns, for example [cb.path_pattern for cb in website.cache_behaviors]
+    :param client: S3 client, clients can't be shared with workers so the files are then analyzed serially
+        in this process, use profile_name and region_name to keep the process pool
+    :param profile_name: AWS profile of the S3 client every worker creates, the default credential chain by default
+    :param region_name: Region of the S3 client every worker creates
+    """
+    report = Report()
+    if client is not None or max_workers == 1:
+        for source in sources:
+            if client is None:
+                report.merge(_analyze_file((source, patterns, profile_name, region_name)))
+            else:
+                report.merge(analyze_records(iter_file_records(source, client), patterns))
+        return report
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for partial in executor.map(_analyze_file, [(s, patterns, profile_name, region_name) for s in sources]):
+            report.merge(partial)
+    return report
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Cache hit and latency report of CloudFront access logs')
+    parser.add_argument('source', nargs='+', help='Log directory, .gz file or s3://bucket/prefix')
+    parser.add_argument('--behavior', action='append', default=[],
+                        help='Cache behavior path pattern, in the order of the distribution, can be repeated')
+    parser.add_argument('--workers', type=int, default=None, help='Size of the process pool')
+    parser.add_argument('--profile', default=None, help='AWS profile of the S3 clients')
+    parser.add_argument('--region', default=None, help='Region of the S3 clients')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    client = _s3_client(args.profile, args.region) if any(s.startswith('s3://') for s in args.source) else None
+    sources = [f for s in args.source for f in list_sources(s, client)]
+    report = analyze(sources, args.behavior, max_workers=args.workers, profile_name=args.profile,
+                     region_name=args.region)
+    if args.json:
+        json.dump(report.to_dict(), sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        sys.stdout.write(report.format())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+MIB = 1024 * 1024
+# S3 limits: parts are at least 5 MiB except the last one, an upload has at most 10000 parts
+MIN_PART_SIZE = 5 * MIB
+MAX_PARTS = 10000
+DEFAULT_THRESHOLD = 64 * MIB
+DEFAULT_PART_SIZE = 16 * MIB
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pulumi-aws-website', 'multipart')
+
+
+def multipart_etag(digests: List[bytes]) -> str:
+    """
+    ETag S3 gives an object uploaded in parts: MD5 of the concatenated part MD5s and the number of parts
+    """
+    return f'{hashlib.md5(b"".join(digests)).hexdigest()}-{len(digests)}'
+
+
+def part_ranges(size: int, part_size: int) -> List[range]:
+    return [range(start, min(start + part_size, size)) for start in range(0, size, part_size)]
+
+
+class MultipartUpload:
+    """
+    Upload mode of large files. Files are memory-mapped and their part MD5s are computed in parallel,
+    which predicts the multipart ETag without reading the file twice. Only parts S3 doesn't have yet are
+    uploaded, concurrently, and an interrupted upload resumes from the parts which made it.
+    """
+    threshold: int
+    part_size: int
+    max_workers: int
+    state_dir: str
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD, part_size: int = DEFAULT_PART_SIZE,
+                 max_workers: int = DEFAULT_MAX_WORKERS, state_dir: str = DEFAULT_STATE_DIR):
+        """
+        :param threshold: Files of at least this size are uploaded in parts
+        :param part_size: Part size, raised for files which would need more than 10000 parts
+        :param max_workers: Threads hashing and uploading the parts of one file
+        :param state_dir: Directory of the upload ids of unfinished uploads
+        """
+        if part_size < MIN_PART_SIZE:
+            raise Exception(f'part_size must be at least {MIN_PART_SIZE} bytes, not {part_size}')
+        self.threshold = max(threshold, 1)
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.state_dir = state_dir
+        self._digests = {}
+
+    def applies(self, size: int) -> bool:
+        return size >= self.threshold
+
+    def part_size_for(self, size: int) -> int:
+        part_size = self.part_size
+        while size > part_size * MAX_PARTS:
+            part_size *= 2
+        return part_size
+
+    def digests(self, path: str) -> List[bytes]:
+        """
+        MD5 of every part, cached until the file changes
+        """
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._digests.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        digests = self._hash_parts(path, stat.st_size)
+        self._digests[path] = (signature, digests)
+        return digests
+
+    def _hash_parts(self, path: str, size: int) -> List[bytes]:
+        ranges = part_ranges(size, self.part_size_for(size))
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                # hashlib releases the GIL for large buffers, so threads hash parts in parallel
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    return list(executor.map(lambda r: hashlib.md5(view[r.start:r.stop]).digest(), ranges))
+            finally:
+                view.release()
+
+    def etag(self, path: str) -> str:
+        return multipart_etag(self.digests(path))
+
+    def _state_path(self, bucket: str, key: str, version: str) -> str:
+        name = hashlib.sha1(f'{bucket}\n{key}\n{version}'.encode()).hexdigest()
+        return os.path.join(self.state_dir, f'{name}.json')
+
+    def _load_state(self, bucket: str, key: str, version: str) -> Optional[Dict]:
+        try:
+            with open(self._state_path(bucket, key, version)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self, bucket: str, key: str, version: str, state: Dict):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(bucket, key, version)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+    def _clear_state(self, bucket: str, key: str, version: str):
+        try:
+            os.remove(self._state_path(bucket, key, version))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _uploaded_parts(client, bucket: str, key: str, upload_id: str) -> Optional[Dict[int, str]]:
+        """
+        Part number to ETag of the parts S3 already has, None if the upload no longer exists
+        """
+        parts = {}
+        marker = 0
+        while True:
+            try:
+                response = client.list_parts(Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+            except Exception as e:
+                code = (getattr(e, 'response', None) or {}).get('Error', {}).get('Code')
+                if code in ('NoSuchUpload', '404'):
+                    return None
+                raise
+            for part in response.get('Parts', []):
+                parts[part['PartNumber']] = part['ETag'].strip('"')
+            if not response.get('IsTruncated'):
+                return parts
+            marker = response['NextPartNumberMarker']
+
+    @staticmethod
+    def is_current(client, bucket: str, key: str, etag: str, put_args: Dict) -> bool:
+        """
+        Whether the object in the bucket has the predicted ETag and the same headers
+        """
+        try:
+            head = client.head_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            code = (getattr(e, 'response', None) or {}).get('Error', {}).get('Code')
+            if code in ('NoSuchKey', '404', 'NotFound'):
+                return False
+            raise
+        if head.get('ETag', '').strip('"') != etag:
+            return False
+        return all(head.get(name) == value for name, value in put_args.items())
+
+    def upload(self, client, bucket: str, key: str, path: str, put_args: Dict, etag: str = None) -> int:
+        """
+        Uploads the parts of path which S3 doesn't have, skips the file when the object is already current.
+        :param put_args: put_object arguments, see SyncObject.put_object_args
+        :param etag: Predicted ETag, computed if not given
+        :return: Bytes sent
+        """
+        digests = self.digests(path)
+        if etag is None:
+            etag = multipart_etag(digests)
+        if self.is_current(client, bucket, key, etag, put_args):
+            return 0
+
+        # an unfinished upload is resumed only for the same content and headers
+        version = f'{etag}\n{json.dumps(put_args, sort_keys=True, default=str)}'
+        state = self._load_state(bucket, key, version)
+        done = None
+        if state is not None:
+            done = self._uploaded_parts(client, bucket, key, state['upload_id'])
+        if done is None:
+            upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **put_args)['UploadId']
+            state = {'upload_id': upload_id}
+            self._save_state(bucket, key, version, state)
+            done = {}
+        upload_id = state['upload_id']
+
+        size = os.path.getsize(path)
+        ranges = part_ranges(size, self.part_size_for(size))
+        sent = 0
+        errors = []
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            def upload_part(number: int, r: range, digest: bytes):
+                client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                                   Body=mapped[r.start:r.stop],
+                                   ContentMD5=base64.b64encode(digest).decode())
+                return len(r)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(upload_part, n, r, d)
+                           for n, (r, d) in enumerate(zip(ranges, digests), start=1)
+                           if done.get(n) != d.hex()]
+                for future in as_completed(futures):
+                    try:
+                        sent += future.result()
+                    except Exception as e:
+                        errors.append(e)
+        if errors:
+            # the upload stays open, the next attempt only sends the missing parts
+            raise Exception(f'Failed to upload {len(errors)} part(s) of {key}: {errors[0]}')
+
+        client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={
+            'Parts': [{'PartNumber': n, 'ETag': f'"{d.hex()}"'} for n, d in enumerate(digests, start=1)],
+        })
+        self._clear_state(bucket, key, version)
+        return sent
@@ -0,0 +1,44 @@
+import re
+from functools import lru_cache
+from typing import List, Optional, Pattern
+
+
+def normalize_path_pattern(pattern: str) -> str:
+    """
+    CloudFront treats 'docs/*' and '/docs/*' the same, every request path starts with '/'
+    """
+    if pattern.startswith('/') or pattern.startswith('*'):
+        return pattern
+    return '/' + pattern
+
+
+@lru_cache(maxsize=4096)
+def compile_path_pattern(pattern: str) -> Pattern:
+    """
+    Compiles a CloudFront path pattern into a regular expression.
+    Patterns are case sensitive, '*' matches any sequence of characters including '/', '?' matches exactly one.
+    """
+    regex = []
+    for c in normalize_path_pattern(pattern):
+        if c == '*':
+            regex.append('.*')
+        elif c == '?':
+            regex.append('.')
+        else:
+            regex.append(re.escape(c))
+    return re.compile(''.join(regex) + r'\Z', re.DOTALL)
+
+
+def match_path_pattern(pattern: str, path: str) -> bool:
+    return compile_path_pattern(pattern).match(path) is not None
+
+
+def first_matching_pattern(patterns: List[str], path: str) -> Optional[int]:
+    """
+    Index of the first pattern matching path, the way CloudFront picks an ordered cache behavior,
+    None means the default cache behavior
+    """
+    for i, pattern in enumerate(patterns):
+        if compile_path_pattern(pattern).match(path) is not None:
+            return i
+    return None
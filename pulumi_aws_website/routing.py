@@ -0,0 +1,258 @@
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pulumi_aws_website import config
+from pulumi_aws_website.patterns import compile_path_pattern, normalize_path_pattern
+
+ISSUE_UNREACHABLE = 'unreachable'
+ISSUE_OVERLAP = 'overlap'
+
+DEFAULT_CACHE_SIZE = 1 << 20
+
+
+def literal_prefix(pattern: str) -> str:
+    """
+    Part of a normalized pattern before the first wildcard
+    """
+    for i, c in enumerate(pattern):
+        if c in '*?':
+            return pattern[:i]
+    return pattern
+
+
+def subsumes(a: str, b: str) -> bool:
+    """
+    Whether every path matching pattern b also matches pattern a, so b is unreachable behind a
+    """
+    a, b = normalize_path_pattern(a), normalize_path_pattern(b)
+
+    @lru_cache(maxsize=None)
+    def match(i: int, j: int) -> bool:
+        # a[i:] has to match every expansion of b[j:]
+        if i == len(a):
+            return j == len(b)
+        if a[i] == '*':
+            return match(i + 1, j) or (j < len(b) and match(i, j + 1))
+        if j == len(b) or b[j] == '*':
+            return False
+        if a[i] == '?' or a[i] == b[j]:
+            return match(i + 1, j + 1)
+        return False
+
+    return match(0, 0)
+
+
+def intersects(a: str, b: str) -> bool:
+    """
+    Whether some path matches both patterns
+    """
+    a, b = normalize_path_pattern(a), normalize_path_pattern(b)
+
+    @lru_cache(maxsize=None)
+    def match(i: int, j: int) -> bool:
+        if i == len(a) and j == len(b):
+            return True
+        if i < len(a) and a[i] == '*':
+            return match(i + 1, j) or (j < len(b) and match(i, j + 1))
+        if j < len(b) and b[j] == '*':
+            return match(i, j + 1) or (i < len(a) and match(i + 1, j))
+        if i == len(a) or j == len(b):
+            return False
+        if a[i] == '?' or b[j] == '?' or a[i] == b[j]:
+            return match(i + 1, j + 1)
+        return False
+
+    return match(0, 0)
+
+
+class PatternIssue:
+    kind: str
+    index: int
+    pattern: str
+    shadowed_by_index: int
+    shadowed_by: str
+
+    def __init__(self, kind: str, index: int, pattern: str, shadowed_by_index: int, shadowed_by: str):
+        self.kind = kind
+        self.index = index
+        self.pattern = pattern
+        self.shadowed_by_index = shadowed_by_index
+        self.shadowed_by = shadowed_by
+
+    def __str__(self):
+        if self.kind == ISSUE_UNREACHABLE:
+            return f'cache behavior {self.index} {self.pattern!r} is unreachable, ' \
+                   f'behavior {self.shadowed_by_index} {self.shadowed_by!r} matches every path first'
+        return f'cache behavior {self.index} {self.pattern!r} overlaps behavior {self.shadowed_by_index} ' \
+               f'{self.shadowed_by!r}, which gets the paths matching both'
+
+
+def find_pattern_issues(patterns: List[str]) -> List[PatternIssue]:
+    """
+    Unreachable patterns, which an earlier pattern fully shadows, and overlapping ones, which share paths
+    with an earlier reachable pattern
+    """
+    issues = []
+    unreachable = set()
+    prefixes = [literal_prefix(normalize_path_pattern(p)) for p in patterns]
+    by_prefix = {}
+    for i, prefix in enumerate(prefixes):
+        by_prefix.setdefault(prefix, []).append(i)
+    sorted_prefixes = sorted(by_prefix)
+
+    def candidates(j: int) -> List[int]:
+        # a path matching both patterns starts with both literal prefixes, so one prefix extends the other
+        prefix = prefixes[j]
+        found = []
+        for n in range(len(prefix)):
+            found += by_prefix.get(prefix[:n], [])
+        for k in range(bisect_left(sorted_prefixes, prefix), len(sorted_prefixes)):
+            if not sorted_prefixes[k].startswith(prefix):
+                break
+            found += by_prefix[sorted_prefixes[k]]
+        return sorted(i for i in found if i < j and i not in unreachable)
+
+    for j, b in enumerate(patterns):
+        earlier = candidates(j)
+        for i in earlier:
+            if subsumes(patterns[i], b):
+                issues.append(PatternIssue(ISSUE_UNREACHABLE, j, b, i, patterns[i]))
+                unreachable.add(j)
+                break
+        else:
+            for i in earlier:
+                if intersects(patterns[i], b):
+                    issues.append(PatternIssue(ISSUE_OVERLAP, j, b, i, patterns[i]))
+    return issues
+
+
+class PatternIndex:
+    """
+    Finds the first of ordered path patterns matching a path.
+    Patterns are bucketed by their literal prefix: a lookup probes path[:n] for every distinct prefix length n,
+    only patterns without a literal prefix are tried on every path.
+    """
+    patterns: List[str]
+
+    def __init__(self, patterns: List[str], cache_size: int = DEFAULT_CACHE_SIZE):
+        self.patterns = list(patterns)
+        self._exact = {}
+        self._by_prefix = {}
+        self._fallback = []
+        for i, pattern in enumerate(self.patterns):
+            normalized = normalize_path_pattern(pattern)
+            prefix = literal_prefix(normalized)
+            regex = compile_path_pattern(pattern)
+            if prefix == normalized:
+                self._exact.setdefault(normalized, i)
+            elif len(prefix) > 1:
+                self._by_prefix.setdefault(prefix, []).append((i, regex))
+            else:
+                self._fallback.append((i, regex))
+        self._prefix_lengths = sorted({len(p) for p in self._by_prefix})
+        self.first_match = lru_cache(maxsize=cache_size)(self._first_match)
+
+    def _first_match(self, path: str) -> Optional[int]:
+        best = self._exact.get(path)
+        for n in self._prefix_lengths:
+            if n > len(path):
+                break
+            candidates = self._by_prefix.get(path[:n])
+            if candidates is None:
+                continue
+            for i, regex in candidates:
+                if best is not None and i >= best:
+                    break
+                if regex.match(path) is not None:
+                    best = i
+                    break
+        for i, regex in self._fallback:
+            if best is not None and i >= best:
+                break
+            if regex.match(path) is not None:
+                best = i
+                break
+        return best
+
+
+class Resolution:
+    path: str
+    behavior: config.CacheBehavior
+    index: Optional[int]
+    path_pattern: Optional[str]
+    origin_id: object
+    ttl: int
+
+    def __init__(self, path: str, behavior: config.CacheBehavior, index: Optional[int], ttl: int):
+        self.path = path
+        self.behavior = behavior
+        self.index = index
+        self.path_pattern = behavior.path_pattern
+        self.origin_id = behavior.target_origin_id
+        self.ttl = ttl
+
+
+class BehaviorIndex:
+    """
+    Resolves URLs to the cache behavior, origin and TTL CloudFront would use.
+    Unreachable and overlapping path patterns are reported at construction time.
+    """
+    default_behavior: config.CacheBehavior
+    behaviors: List[config.CacheBehavior]
+    issues: List[PatternIssue]
+
+    def __init__(self, default_behavior: config.CacheBehavior, behaviors: List[config.CacheBehavior],
+                 cache_policy: config.CachePolicy = None, strict: bool = False,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        :param default_behavior: Default cache behavior
+        :param behaviors: Ordered cache behaviors
+        :param cache_policy: TTLs of behaviors which use a cache policy
+        :param strict: Raise on unreachable behaviors
+        :param cache_size: Number of resolved paths kept in the LRU cache
+        """
+        self.default_behavior = default_behavior
+        self.behaviors = list(behaviors)
+        self.cache_policy = cache_policy
+        patterns = [cb.path_pattern for cb in self.behaviors]
+        self.issues = find_pattern_issues(patterns)
+        unreachable = [i for i in self.issues if i.kind == ISSUE_UNREACHABLE]
+        if strict and unreachable:
+            raise Exception('; '.join(str(i) for i in unreachable))
+        self.index = PatternIndex(patterns, cache_size)
+        self._ttls = [self._ttl(cb) for cb in self.behaviors]
+        self._default_ttl = self._ttl(default_behavior)
+
+    @staticmethod
+    def from_website(website, strict: bool = False) -> 'BehaviorIndex':
+        return BehaviorIndex(website.default_cache_behavior, website.cache_behaviors,
+                             cache_policy=website.cache_policy_config, strict=strict)
+
+    def _ttl(self, behavior: config.CacheBehavior) -> int:
+        if behavior.cache_policy_id is not None and self.cache_policy is not None:
+            return self.cache_policy.default_ttl
+        return behavior.default_ttl
+
+    def resolve(self, path: str) -> Resolution:
+        i = self.index.first_match(path)
+        if i is None:
+            return Resolution(path, self.default_behavior, None, self._default_ttl)
+        return Resolution(path, self.behaviors[i], i, self._ttls[i])
+
+    def resolve_many(self, paths: Iterable[str]) -> Iterator[Resolution]:
+        for path in paths:
+            yield self.resolve(path)
+
+    def counts(self, paths: Iterable[str]) -> Dict[Optional[str], int]:
+        """
+        Number of paths per behavior path pattern, None for the default behavior
+        """
+        first_match = self.index.first_match
+        counts = [0] * (len(self.behaviors) + 1)
+        for path in paths:
+            i = first_match(path)
+            counts[-1 if i is None else i] += 1
+        output = {cb.path_pattern: counts[i] for i, cb in enumerate(self.behaviors)}
+        output[None] = counts[-1]
+        return output
@@ -0,0 +1,410 @@
+"""
+Origin load simulator: replays a request trace, from access logs or a generated Zipf workload, against the cache
+behaviors of a WebSite with a TTL cache per edge and invalidations. Vectorized with NumPy, a trace of 100M
+requests takes minutes.
+
+    trace = simulate.zipf_trace(10_000_000, objects=100_000, duration=86400)
+    simulator = simulate.Simulator(routing.BehaviorIndex.from_website(website), fingerprint.DEFAULT_RULES)
+    result = simulator.run(trace, [simulate.Invalidation(3600, ['/docs/*'])])
+    print(result.format())
+
+NumPy is an optional dependency: pip install pulumi-aws-website[simulate]
+"""
+from typing import Dict, Iterable, List, Optional
+
+from pulumi_aws_website import fingerprint
+from pulumi_aws_website import logs
+from pulumi_aws_website.routing import BehaviorIndex
+
+DEFAULT_INTERVAL = 60
+# requests simulated at once, bounds the memory to about 100 bytes per request of a shard
+DEFAULT_SHARD_SIZE = 20_000_000
+DEFAULT_EDGES = 40
+# S3 Standard GET requests, USD per 1000 in us-east-1
+S3_GET_PRICE_PER_1000 = 0.0004
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise Exception('The simulator requires numpy, install it with `pip install pulumi-aws-website[simulate]`')
+    return numpy
+
+
+class Trace:
+    """
+    Requests sorted by time. Every request refers to an object by index into paths and sizes,
+    and to an edge by index into edges.
+    """
+    times: 'numpy.ndarray'
+    keys: 'numpy.ndarray'
+    edge_ids: 'numpy.ndarray'
+    paths: List[str]
+    sizes: 'numpy.ndarray'
+    edges: List[str]
+
+    def __init__(self, times, keys, edge_ids, paths: List[str], sizes, edges: List[str]):
+        """
+        :param times: Milliseconds since the start of the trace, int64, ascending
+        :param keys: Object of every request, int32 index into paths
+        :param edge_ids: Edge of every request, index into edges
+        :param sizes: Response bytes of every object
+        """
+        self.times = times
+        self.keys = keys
+        self.edge_ids = edge_ids
+        self.paths = paths
+        self.sizes = sizes
+        self.edges = edges
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration(self) -> float:
+        return float(self.times[-1]) / 1000 if len(self.times) else 0.0
+
+    @staticmethod
+    def from_records(records: Iterable[logs.LogRecord]) -> 'Trace':
+        """
+        Trace of access log records, edges are points of presence and the size of an object is its largest response
+        """
+        np = _numpy()
+        paths, path_ids, edges, edge_ids = [], {}, [], {}
+        times, keys, pops, sizes = [], [], [], {}
+        days = {}
+        for r in records:
+            key = path_ids.get(r.path)
+            if key is None:
+                key = path_ids[r.path] = len(paths)
+                paths.append(r.path)
+            pop = logs.edge_pop(r.edge)
+            edge = edge_ids.get(pop)
+            if edge is None:
+                edge = edge_ids[pop] = len(edges)
+                edges.append(pop)
+            times.append(logs.record_timestamp(r, days))
+            keys.append(key)
+            pops.append(edge)
+            sizes[key] = max(sizes.get(key, 0), r.bytes)
+        seconds = np.array(times, dtype=np.float64)
+        order = np.argsort(seconds, kind='stable')
+        start = seconds[order[0]] if len(order) else 0.0
+        return Trace(times=np.round((seconds[order] - start) * 1000).astype(np.int64),
+                     keys=np.array(keys, dtype=np.int32)[order],
+                     edge_ids=np.array(pops, dtype=np.int32)[order],
+                     paths=paths,
+                     sizes=np.array([sizes[i] for i in range(len(paths))], dtype=np.int64),
+                     edges=edges)
+
+
+def zipf_trace(requests: int, objects: int, alpha: float = 1.0, duration: float = 3600, edges: int = DEFAULT_EDGES,
+               mean_size: int = 50_000, paths: List[str] = None, seed: int = 0,
+               chunk_size: int = 10_000_000) -> Trace:
+    """
+    Requests arriving as a Poisson process at a constant rate, the object of a request follows a Zipf distribution
+    and the edge a Zipf distribution with exponent 1. Object sizes are log-normal.
+    :param objects: Number of distinct objects, object i has the i-th highest popularity
+    :param alpha: Zipf exponent, about 0.6 to 1.0 for web content
+    :param duration: Seconds the requests are spread over
+    :param paths: Path of every object, '/objects/<i>' by default
+    """
+    np = _numpy()
+    rng = np.random.default_rng(seed)
+    popularity = np.arange(1, objects + 1, dtype=np.float64) ** -alpha
+    object_cdf = np.cumsum(popularity / popularity.sum())
+    edge_popularity = 1 / np.arange(1, edges + 1, dtype=np.float64)
+    edge_cdf = np.cumsum(edge_popularity / edge_popularity.sum())
+
+    times = np.empty(requests, dtype=np.int64)
+    keys = np.empty(requests, dtype=np.int32)
+    edge_ids = np.empty(requests, dtype=np.int16 if edges < 2 ** 15 else np.int32)
+    mean_gap = duration * 1000 / max(requests, 1)
+    now = 0.0
+    for start in range(0, requests, chunk_size):
+        n = min(chunk_size, requests - start)
+        arrivals = now + np.cumsum(rng.exponential(mean_gap, n))
+        now = arrivals[-1]
+        times[start:start + n] = arrivals
+        # searchsorted keeps float rounding of the last cdf value from producing index == objects
+        keys[start:start + n] = np.minimum(np.searchsorted(object_cdf, rng.random(n)), objects - 1)
+        edge_ids[start:start + n] = np.minimum(np.searchsorted(edge_cdf, rng.random(n)), edges - 1)
+    sizes = np.maximum(rng.lognormal(np.log(mean_size) - 0.5, 1.0, objects), 1).astype(np.int64)
+    return Trace(times=times,
+                 keys=keys,
+                 edge_ids=edge_ids,
+                 paths=paths if paths is not None else [f'/objects/{i}' for i in range(objects)],
+                 sizes=sizes,
+                 edges=[f'edge-{i}' for i in range(edges)])
+
+
+class Invalidation:
+    time: float
+    paths: List[str]
+
+    def __init__(self, time: float, paths: List[str]):
+        """
+        :param time: Seconds since the start of the trace
+        :param paths: Invalidation paths, '*' is only a wildcard at the end like in CloudFront
+        """
+        self.time = time
+        self.paths = paths
+
+    def matches(self, path: str) -> bool:
+        for p in self.paths:
+            if p.endswith('*') and path.startswith(p[:-1]) or path == p:
+                return True
+        return False
+
+    @property
+    def is_global(self) -> bool:
+        return '/*' in self.paths
+
+
+class SimulationResult:
+    """
+    Per interval of the trace: requests, origin requests (misses), bytes sent to viewers and fetched from origins
+    """
+    interval: float
+    requests: 'numpy.ndarray'
+    origin_requests: 'numpy.ndarray'
+    bytes: 'numpy.ndarray'
+    origin_bytes: 'numpy.ndarray'
+    behaviors: Dict[str, Dict[str, int]]
+
+    def __init__(self, interval: float, requests, origin_requests, bytes, origin_bytes,
+                 behaviors: Dict[str, Dict[str, int]]):
+        self.interval = interval
+        self.requests = requests
+        self.origin_requests = origin_requests
+        self.bytes = bytes
+        self.origin_bytes = origin_bytes
+        self.behaviors = behaviors
+
+    @property
+    def hit_ratio(self) -> float:
+        total = int(self.requests.sum())
+        return 1 - int(self.origin_requests.sum()) / total if total else 0.0
+
+    @property
+    def hit_ratios(self) -> 'numpy.ndarray':
+        np = _numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.requests > 0, 1 - self.origin_requests / np.maximum(self.requests, 1), np.nan)
+
+    @property
+    def origin_requests_per_second(self) -> 'numpy.ndarray':
+        return self.origin_requests / self.interval
+
+    def s3_request_cost(self, price_per_1000: float = S3_GET_PRICE_PER_1000) -> float:
+        """
+        Cost of the origin requests, assuming every origin is an S3 bucket
+        """
+        return int(self.origin_requests.sum()) / 1000 * price_per_1000
+
+    def to_dict(self) -> Dict:
+        return {
+            'interval': self.interval,
+            'requests': int(self.requests.sum()),
+            'origin_requests': int(self.origin_requests.sum()),
+            'hit_ratio': self.hit_ratio,
+            'peak_origin_requests_per_second': float(self.origin_requests_per_second.max(initial=0)),
+            'bytes': int(self.bytes.sum()),
+            'origin_bytes': int(self.origin_bytes.sum()),
+            's3_request_cost': self.s3_request_cost(),
+            'behaviors': self.behaviors,
+            'timeline': {
+                'requests': self.requests.tolist(),
+                'origin_requests': self.origin_requests.tolist(),
+                'bytes': self.bytes.tolist(),
+                'origin_bytes': self.origin_bytes.tolist(),
+            },
+        }
+
+    def format(self) -> str:
+        summary = self.to_dict()
+        lines = [f'{summary["requests"]} requests, hit ratio {summary["hit_ratio"]:.2%}, '
+                 f'{summary["origin_requests"]} origin requests (peak '
+                 f'{summary["peak_origin_requests_per_second"]:.1f}/s, ${summary["s3_request_cost"]:.2f} S3 GET), '
+                 f'{summary["bytes"]} bytes to viewers, {summary["origin_bytes"]} bytes from origins',
+                 '',
+                 f'{"behavior":<24} {"requests":>12} {"origin":>12} {"hit":>7} {"origin bytes":>14}']
+        for name, b in sorted(self.behaviors.items(), key=lambda x: -x[1]['requests']):
+            hit = 1 - b['origin_requests'] / b['requests'] if b['requests'] else 0.0
+            lines.append(f'{name:<24} {b["requests"]:>12} {b["origin_requests"]:>12} {hit:>7.1%} '
+                         f'{b["origin_bytes"]:>14}')
+        return '\n'.join(lines)
+
+
+class Simulator:
+    """
+    A request misses when its edge has no copy of the object or the copy is older than the TTL or an invalidation.
+    Edge caches have no capacity limit and expired objects are fetched again instead of revalidated.
+    """
+    index: BehaviorIndex
+    cache_control_rules: Optional[List[fingerprint.CacheControlRule]]
+
+    def __init__(self, index: BehaviorIndex, cache_control_rules: List[fingerprint.CacheControlRule] = None,
+                 shard_size: int = DEFAULT_SHARD_SIZE):
+        """
+        :param index: Behaviors of the distribution, see BehaviorIndex.from_website
+        :param cache_control_rules: Cache-Control of the content, objects get default_ttl of their behavior if None
+        :param shard_size: Requests simulated at once, shards are split by object
+        """
+        self.index = index
+        self.cache_control_rules = cache_control_rules
+        self.shard_size = shard_size
+
+    def _ttls(self, behavior) -> tuple:
+        cache_policy = self.index.cache_policy
+        if behavior.cache_policy_id is not None and cache_policy is not None:
+            return cache_policy.min_ttl, cache_policy.default_ttl, cache_policy.max_ttl
+        return behavior.min_ttl, behavior.default_ttl, behavior.max_ttl
+
+    def object_ttl(self, path: str, behavior) -> int:
+        """
+        Seconds an edge keeps the object: max-age of its Cache-Control limited to min_ttl and max_ttl,
+        default_ttl without Cache-Control
+        """
+        min_ttl, default_ttl, max_ttl = self._ttls(behavior)
+        key = path.lstrip('/')
+        for rule in self.cache_control_rules or []:
+            if rule.matches(key):
+                max_age = fingerprint.parse_max_age(rule.cache_control)
+                if max_age is None:
+                    break
+                return min(max(max_age, min_ttl), max_ttl)
+        return default_ttl
+
+    def resolve(self, paths: List[str]):
+        """
+        :return: Behavior number of every path, 0 for the default behavior and i + 1 for behaviors[i],
+            and the TTL of every path in milliseconds
+        """
+        np = _numpy()
+        behavior_ids = np.empty(len(paths), dtype=np.int32)
+        ttls = np.empty(len(paths), dtype=np.int64)
+        for i, path in enumerate(paths):
+            resolution = self.index.resolve(path)
+            behavior_ids[i] = 0 if resolution.index is None else resolution.index + 1
+            ttls[i] = self.object_ttl(path, resolution.behavior) * 1000
+        return behavior_ids, ttls
+
+    @staticmethod
+    def _invalidation_times(trace: Trace, invalidations: List[Invalidation]):
+        """
+        Times of invalidations of every path, global ones separately
+        :return: Sorted global times in ms, and sorted (object, time) pairs encoded as object * span + time
+        """
+        np = _numpy()
+        span = int(trace.times[-1]) + 2 if len(trace) else 2
+        global_times = sorted(int(inv.time * 1000) for inv in invalidations if inv.is_global)
+        pairs = []
+        for inv in invalidations:
+            # nothing is cached before the trace starts
+            if inv.is_global or not 0 <= inv.time * 1000 < span:
+                continue
+            matched = [i for i, path in enumerate(trace.paths) if inv.matches(path)]
+            pairs.append(np.array(matched, dtype=np.int64) * span + int(inv.time * 1000))
+        partial = np.sort(np.concatenate(pairs)) if pairs else np.empty(0, dtype=np.int64)
+        return np.array(global_times, dtype=np.int64), partial, span
+
+    def _misses(self, times, keys, edge_ids, ttls, n_edges: int, global_times, partial, span: int):
+        """
+        Miss flag of every request of a shard, in the order of the shard
+        """
+        np = _numpy()
+        n = len(times)
+        # requests grouped by edge and object, by time within a group
+        group = keys.astype(np.int64) * n_edges + edge_ids
+        order = np.argsort(group, kind='stable')
+        group = group[order]
+        t = times[order]
+        k = keys[order].astype(np.int64)
+        starts = np.empty(n, dtype=bool)
+        starts[:1] = True
+        np.not_equal(group[1:], group[:-1], out=starts[1:])
+        frontier = np.flatnonzero(starts)
+        group = np.cumsum(starts) - 1
+        del starts
+
+        expiry = t + ttls[k]
+        if len(global_times):
+            i = np.searchsorted(global_times, t, side='right')
+            has_next = i < len(global_times)
+            expiry[has_next] = np.minimum(expiry[has_next], global_times[i[has_next]])
+        if len(partial):
+            encoded = k * span + t
+            i = np.searchsorted(partial, encoded, side='right')
+            i_valid = i < len(partial)
+            same = np.zeros(n, dtype=bool)
+            same[i_valid] = partial[i[i_valid]] // span == k[i_valid]
+            expiry[same] = np.minimum(expiry[same], partial[i[same]] % span)
+            del encoded, i, i_valid, same
+        del k
+
+        # the copy fetched by request i serves the group until the first request at or after its expiry
+        position = group * span + t
+        nxt = np.searchsorted(position, group * span + np.minimum(expiry, span - 1), side='left')
+        del position, expiry
+        # with a TTL of 0 the next request of the group misses even at the same millisecond
+        np.maximum(nxt, np.arange(1, n + 1), out=nxt)
+
+        miss = np.zeros(n, dtype=bool)
+        while len(frontier):
+            miss[frontier] = True
+            following = nxt[frontier]
+            in_range = following < n
+            following, frontier = following[in_range], frontier[in_range]
+            frontier = following[group[following] == group[frontier]]
+        result = np.empty(n, dtype=bool)
+        result[order] = miss
+        return result
+
+    def run(self, trace: Trace, invalidations: List[Invalidation] = None,
+            interval: float = DEFAULT_INTERVAL) -> SimulationResult:
+        """
+        :param invalidations: Invalidations during the trace
+        :param interval: Seconds per value of the timeline
+        """
+        np = _numpy()
+        behavior_ids, ttls = self.resolve(trace.paths)
+        global_times, partial, span = self._invalidation_times(trace, invalidations or [])
+        interval_ms = int(interval * 1000)
+        buckets = int(trace.times[-1]) // interval_ms + 1 if len(trace) else 0
+        n_behaviors = len(self.index.behaviors) + 1
+
+        requests = np.zeros(buckets, dtype=np.int64)
+        origin_requests = np.zeros(buckets, dtype=np.int64)
+        sent = np.zeros(buckets, dtype=np.int64)
+        fetched = np.zeros(buckets, dtype=np.int64)
+        per_behavior = np.zeros((3, n_behaviors), dtype=np.int64)
+
+        shards = max(1, -(-len(trace) // self.shard_size))
+        n_edges = len(trace.edges)
+        for shard in range(shards):
+            if shards == 1:
+                times, keys, edge_ids = trace.times, trace.keys, trace.edge_ids
+            else:
+                selected = np.flatnonzero(trace.keys % shards == shard)
+                times, keys, edge_ids = trace.times[selected], trace.keys[selected], trace.edge_ids[selected]
+            if not len(times):
+                continue
+            miss = self._misses(times, keys, edge_ids, ttls, n_edges, global_times, partial, span)
+            bucket = times // interval_ms
+            size = trace.sizes[keys]
+            requests += np.bincount(bucket, minlength=buckets)
+            origin_requests += np.bincount(bucket[miss], minlength=buckets)
+            sent += np.bincount(bucket, weights=size, minlength=buckets).astype(np.int64)
+            fetched += np.bincount(bucket[miss], weights=size[miss], minlength=buckets).astype(np.int64)
+            behavior = behavior_ids[keys]
+            per_behavior[0] += np.bincount(behavior, minlength=n_behaviors)
+            per_behavior[1] += np.bincount(behavior[miss], minlength=n_behaviors)
+            per_behavior[2] += np.bincount(behavior[miss], weights=size[miss], minlength=n_behaviors).astype(np.int64)
+
+        names = [logs.DEFAULT_BEHAVIOR] + [cb.path_pattern for cb in self.index.behaviors]
+        behaviors = {name: {'requests': int(per_behavior[0][i]), 'origin_requests': int(per_behavior[1][i]),
+                            'origin_bytes': int(per_behavior[2][i])}
+                     for i, name in enumerate(names) if per_behavior[0][i]}
+        return SimulationResult(interval, requests, origin_requests, sent, fetched, behaviors)
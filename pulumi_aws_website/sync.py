@@ -0,0 +1,417 @@
+import hashlib
+import json
+import mimetypes
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pulumi_aws_website.multipart import MultipartUpload
+
+# manifests are kept under their own prefix, which WebSite buckets deny to CloudFront
+MANIFEST_PREFIX = '.website-sync/'
+MANIFEST_VERSION = 1
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+HASH_CHUNK_SIZE = 1024 * 1024
+DELETE_BATCH_SIZE = 1000
+# seconds orphaned fingerprinted objects are kept, the default max_ttl: edges may serve HTML referencing them as long
+DEFAULT_RETENTION = 86400
+
+# HTTP headers which S3 stores as system metadata, mapped to put_object arguments
+PUT_OBJECT_HEADERS = {
+    'Cache-Control': 'CacheControl',
+    'Content-Disposition': 'ContentDisposition',
+    'Content-Encoding': 'ContentEncoding',
+    'Content-Language': 'ContentLanguage',
+    'Content-Type': 'ContentType',
+    'Expires': 'Expires',
+}
+
+
+def manifest_key_for(prefix: str = '') -> str:
+    """
+    Key of the manifest of a sync into prefix, every prefix has its own so syncs into one bucket don't delete
+    each other's objects
+    """
+    return f'{MANIFEST_PREFIX}{prefix}manifest.json'
+
+
+MANIFEST_KEY = manifest_key_for()
+
+
+def make_s3_client(max_workers: int = DEFAULT_MAX_WORKERS, region_name: str = None, profile_name: str = None):
+    """
+    Creates a boto3 S3 client whose connection pool is large enough for max_workers concurrent requests.
+    boto3 is an optional dependency: pip install pulumi-aws-website[sync]
+    :param profile_name: AWS profile of the client, the default credential chain by default
+    """
+    try:
+        import boto3
+        from botocore.config import Config
+    except ImportError:
+        raise Exception('Content sync requires boto3, install it with `pip install pulumi-aws-website[sync]`')
+    return boto3.Session(profile_name=profile_name).client(
+        's3',
+        region_name=region_name,
+        config=Config(max_pool_connections=max_workers, retries={'max_attempts': 10, 'mode': 'adaptive'}))
+
+
+def file_md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def guess_content_type(key: str) -> str:
+    content_type, _ = mimetypes.guess_type(key)
+    return content_type or DEFAULT_CONTENT_TYPE
+
+
+class SyncObject:
+    """
+    One object which should exist in the bucket. The body is either a local file (path) or
+    bytes produced by a pipeline stage (data).
+    """
+    key: str
+    path: Optional[str]
+    data: Optional[bytes]
+    md5: str
+    size: int
+    headers: Dict[str, str]
+    fingerprinted: bool
+    variant_of: Optional[str]
+
+    def __init__(self, key: str, path: str = None, data: bytes = None, md5: str = None, size: int = None,
+                 headers: Dict[str, str] = None, fingerprinted: bool = False, variant_of: str = None):
+        """
+        :param fingerprinted: The key contains a hash of the content, set by fingerprint.Fingerprint
+        :param variant_of: Key viewers request when the edge serves this object instead,
+            set by compression.Precompress
+        """
+        if path is None and data is None:
+            raise Exception(f'SyncObject {key} needs either path or data')
+        self.key = key
+        self.path = path
+        self.data = data
+        if md5 is None:
+            md5 = hashlib.md5(data).hexdigest() if data is not None else file_md5(path)
+        if size is None:
+            size = len(data) if data is not None else os.path.getsize(path)
+        self.md5 = md5
+        self.size = size
+        self.headers = dict(headers or {})
+        self.headers.setdefault('Content-Type', guess_content_type(key))
+        self.fingerprinted = fingerprinted
+        self.variant_of = variant_of
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Hash of the body and the headers, so changing only Cache-Control still re-uploads the object
+        """
+        headers = json.dumps(self.headers, sort_keys=True)
+        return hashlib.md5(f'{self.md5}\n{headers}'.encode()).hexdigest()
+
+    def put_object_args(self) -> Dict:
+        args = {}
+        metadata = {}
+        for name, value in self.headers.items():
+            if name in PUT_OBJECT_HEADERS:
+                args[PUT_OBJECT_HEADERS[name]] = value
+            else:
+                metadata[name.lower()] = value
+        if metadata:
+            args['Metadata'] = metadata
+        return args
+
+    def to_manifest(self) -> Dict:
+        entry = {
+            'md5': self.md5,
+            'size': self.size,
+            'fingerprint': self.fingerprint,
+        }
+        if self.fingerprinted:
+            entry['fingerprinted'] = True
+        if self.variant_of is not None:
+            entry['variant_of'] = self.variant_of
+        return entry
+
+
+class Stage:
+    """
+    Pipeline stage which transforms the list of objects between scanning and uploading,
+    for example to add precompressed variants or Cache-Control headers.
+    """
+
+    def process(self, objects: List[SyncObject]) -> List[SyncObject]:
+        raise NotImplementedError
+
+
+def scan_directory(source_dir: str, prefix: str = '', exclude: List[str] = None,
+                   max_workers: int = DEFAULT_MAX_WORKERS, multipart: MultipartUpload = None) -> List[SyncObject]:
+    """
+    Hashes every file under source_dir in a thread pool and returns objects sorted by key.
+    :param prefix: Key prefix inside the bucket, for example 'docs/' for a bucket mapped to '/docs/*'
+    :param exclude: fnmatch patterns of keys (without prefix) which should not be uploaded
+    :param multipart: Large files get the multipart ETag instead of their MD5, see MultipartUpload
+    """
+    exclude = exclude or []
+    files = []
+    for root, dirs, names in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, source_dir).replace(os.sep, '/')
+            if any(fnmatchcase(relative, pattern) for pattern in exclude):
+                continue
+            files.append((prefix + relative, path))
+
+    def scan(f):
+        key, path = f
+        if multipart is not None and multipart.applies(os.path.getsize(path)):
+            return SyncObject(key=key, path=path, md5=multipart.etag(path))
+        return SyncObject(key=key, path=path)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(scan, files))
+
+
+class Manifest:
+    """
+    Record of what the last sync uploaded, stored in the bucket itself so a sync never has to list the bucket
+    """
+    entries: Dict[str, Dict]
+
+    def __init__(self, entries: Dict[str, Dict] = None):
+        self.entries = entries or {}
+
+    @staticmethod
+    def load(client, bucket: str, key: str = MANIFEST_KEY) -> 'Manifest':
+        try:
+            response = client.get_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            if _is_missing(e):
+                return Manifest()
+            raise
+        document = json.loads(response['Body'].read())
+        if document.get('version') != MANIFEST_VERSION:
+            return Manifest()
+        return Manifest(document['objects'])
+
+    def save(self, client, bucket: str, key: str = MANIFEST_KEY):
+        body = json.dumps({'version': MANIFEST_VERSION, 'objects': self.entries}, sort_keys=True).encode()
+        client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json',
+                          CacheControl='no-store')
+
+
+def _is_missing(e: Exception) -> bool:
+    response = getattr(e, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in ('NoSuchKey', '404', 'NotFound')
+
+
+def viewer_keys(keys: Iterable[str], variant_of: Dict[str, str]) -> List[str]:
+    """
+    Keys viewers request, variants are replaced by the key they are a variant of
+    """
+    return sorted({variant_of.get(k, k) for k in keys})
+
+
+class SyncPlan:
+    uploads: List[SyncObject]
+    deletes: List[str]
+    unchanged: List[str]
+    retained: List[str]
+    variant_of: Dict[str, str]
+
+    def __init__(self, uploads: List[SyncObject], deletes: List[str], unchanged: List[str],
+                 retained: List[str] = None, variant_of: Dict[str, str] = None):
+        """
+        :param retained: Orphaned fingerprinted objects kept until their retention ends
+        :param variant_of: Map of uploaded and deleted variants to the key viewers request, see SyncObject
+        """
+        self.uploads = uploads
+        self.deletes = deletes
+        self.unchanged = unchanged
+        self.retained = retained or []
+        self.variant_of = variant_of or {}
+
+    @property
+    def changed_keys(self) -> List[str]:
+        return viewer_keys([o.key for o in self.uploads] + self.deletes, self.variant_of)
+
+
+def plan_sync(objects: List[SyncObject], manifest: Manifest, delete: bool = True, prefix: str = '',
+              retention: float = 0, now: float = None) -> SyncPlan:
+    """
+    :param prefix: Only objects under prefix are deleted
+    :param retention: Seconds an orphaned fingerprinted object is kept after the sync which orphaned it
+    :param now: Current time in seconds since the epoch, time.time() by default
+    """
+    now = time.time() if now is None else now
+    uploads = []
+    unchanged = []
+    local_keys = set()
+    for o in objects:
+        local_keys.add(o.key)
+        entry = manifest.entries.get(o.key)
+        if entry is not None and entry.get('fingerprint') == o.fingerprint:
+            unchanged.append(o.key)
+        else:
+            uploads.append(o)
+    deletes = []
+    retained = []
+    orphans = sorted(k for k in manifest.entries if k not in local_keys and k.startswith(prefix)) if delete else []
+    for k in orphans:
+        entry = manifest.entries[k]
+        if entry.get('fingerprinted') and now - entry.get('orphaned', now) < retention:
+            retained.append(k)
+        else:
+            deletes.append(k)
+    variant_of = {o.key: o.variant_of for o in uploads if o.variant_of is not None}
+    variant_of.update((k, manifest.entries[k]['variant_of']) for k in deletes if 'variant_of' in manifest.entries[k])
+    return SyncPlan(uploads, deletes, unchanged, retained, variant_of)
+
+
+class SyncResult:
+    uploaded: List[str]
+    deleted: List[str]
+    unchanged: List[str]
+    bytes_uploaded: int
+    variant_of: Dict[str, str]
+
+    def __init__(self, uploaded: List[str], deleted: List[str], unchanged: List[str], bytes_uploaded: int,
+                 variant_of: Dict[str, str] = None):
+        self.uploaded = uploaded
+        self.deleted = deleted
+        self.unchanged = unchanged
+        self.bytes_uploaded = bytes_uploaded
+        self.variant_of = variant_of or {}
+
+    @property
+    def changed_keys(self) -> List[str]:
+        """
+        Keys viewers request whose content changed, a changed variant reports the key it is a variant of
+        """
+        return viewer_keys(self.uploaded + self.deleted, self.variant_of)
+
+
+class ContentSync:
+    """
+    Synchronises a local build directory with a bucket: uploads new and changed files
+    and deletes objects which were uploaded before but no longer exist locally.
+    """
+    bucket: str
+    source_dir: str
+    prefix: str
+    delete: bool
+    max_workers: int
+    manifest_key: str
+
+    def __init__(self, bucket: str, source_dir: str, client=None, prefix: str = '', delete: bool = True,
+                 exclude: List[str] = None, stages: List[Stage] = None, max_workers: int = DEFAULT_MAX_WORKERS,
+                 manifest_key: str = None, multipart: MultipartUpload = None, retention: float = DEFAULT_RETENTION,
+                 clock: Callable[[], float] = time.time):
+        """
+        :param bucket: Bucket name, for example WebSite.default_bucket.id once it is resolved
+        :param source_dir: Local build directory
+        :param client: boto3 compatible S3 client, by default one is created with make_s3_client
+        :param prefix: Key prefix inside the bucket
+        :param delete: Delete objects uploaded by the previous sync which no longer exist locally
+        :param exclude: fnmatch patterns of local files to skip
+        :param stages: Pipeline stages applied to the scanned objects before they are compared with the manifest
+        :param max_workers: Size of the hashing and upload thread pools and of the client connection pool
+        :param manifest_key: Key of the manifest, by default derived from prefix, see manifest_key_for
+        :param multipart: Uploads large files in parts, see MultipartUpload. Its threads share the client
+            connection pool, so keep max_workers above multipart.max_workers.
+        :param retention: Seconds orphaned fingerprinted objects are kept, so cached HTML referencing
+            the previous names keeps working
+        """
+        self.bucket = bucket
+        self.source_dir = source_dir
+        self.client = client if client is not None else make_s3_client(max_workers)
+        self.prefix = prefix
+        self.delete = delete
+        self.exclude = exclude or []
+        self.stages = stages or []
+        self.max_workers = max_workers
+        self.manifest_key = manifest_key if manifest_key is not None else manifest_key_for(prefix)
+        self.multipart = multipart
+        self.retention = retention
+        self.clock = clock
+
+    def scan(self) -> List[SyncObject]:
+        objects = scan_directory(self.source_dir, self.prefix, self.exclude, self.max_workers, self.multipart)
+        for stage in self.stages:
+            objects = stage.process(objects)
+        return objects
+
+    def load_manifest(self) -> Manifest:
+        return Manifest.load(self.client, self.bucket, self.manifest_key)
+
+    def plan(self) -> SyncPlan:
+        return plan_sync(self.scan(), self.load_manifest(), self.delete, self.prefix, self.retention, self.clock())
+
+    def run(self, plan: SyncPlan = None) -> SyncResult:
+        manifest = self.load_manifest()
+        now = self.clock()
+        if plan is None:
+            plan = plan_sync(self.scan(), manifest, self.delete, self.prefix, self.retention, now)
+        for k in plan.retained:
+            manifest.entries.get(k, {}).setdefault('orphaned', now)
+        for k in plan.unchanged:
+            manifest.entries.get(k, {}).pop('orphaned', None)
+
+        uploaded = []
+        errors = []
+        bytes_uploaded = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.upload, o): o for o in plan.uploads}
+            for future in as_completed(futures):
+                o = futures[future]
+                try:
+                    bytes_uploaded += future.result()
+                except Exception as e:
+                    errors.append((o.key, e))
+                    continue
+                manifest.entries[o.key] = o.to_manifest()
+                uploaded.append(o.key)
+
+        deleted = []
+        if not errors:
+            for i in range(0, len(plan.deletes), DELETE_BATCH_SIZE):
+                batch = plan.deletes[i:i + DELETE_BATCH_SIZE]
+                self.client.delete_objects(Bucket=self.bucket,
+                                           Delete={'Objects': [{'Key': k} for k in batch], 'Quiet': True})
+                for k in batch:
+                    manifest.entries.pop(k, None)
+                deleted += batch
+
+        # the manifest is saved even after a partial failure so the next run only retries what is missing
+        manifest.save(self.client, self.bucket, self.manifest_key)
+        if errors:
+            key, error = errors[0]
+            raise Exception(f'Failed to upload {len(errors)} object(s) to {self.bucket}, first was {key}: {error}')
+
+        return SyncResult(uploaded=sorted(uploaded),
+                          deleted=deleted,
+                          unchanged=plan.unchanged,
+                          bytes_uploaded=bytes_uploaded,
+                          variant_of=plan.variant_of)
+
+    def upload(self, o: SyncObject) -> int:
+        """
+        :return: Bytes sent
+        """
+        args = o.put_object_args()
+        if o.data is not None:
+            self.client.put_object(Bucket=self.bucket, Key=o.key, Body=o.data, **args)
+            return o.size
+        if self.multipart is not None and self.multipart.applies(o.size):
+            return self.multipart.upload(self.client, self.bucket, o.key, o.path, args, etag=o.md5)
+        with open(o.path, 'rb') as body:
+            self.client.put_object(Bucket=self.bucket, Key=o.key, Body=body, **args)
+        return o.size
@@ -1,19 +1,46 @@
+import asyncio
+import base64
+import copy
+import gzip
+import hashlib
+import io
+import json
+import os
+import pickle
+import posixpath
+import re
+import shutil
+import subprocess
+import tempfile
+import time
 import unittest
+import unittest.mock
 from typing import Optional, Tuple
 
 from pulumi_aws_website import *
+from pulumi_aws_website import compression
+from pulumi_aws_website import dns
+from pulumi_aws_website import emulator
+from pulumi_aws_website import fingerprint
+from pulumi_aws_website import functions
+from pulumi_aws_website import images
+from pulumi_aws_website import invalidation
+from pulumi_aws_website import lint
+from pulumi_aws_website import logs
+from pulumi_aws_website import multipart
+from pulumi_aws_website import patterns as patterns_module
+from pulumi_aws_website import routing
+from pulumi_aws_website import simulate
+from pulumi_aws_website import sync
+from pulumi_aws_website import tracing
+from pulumi_aws_website import warm
 
 
 class MyMocks(pulumi.runtime.Mocks):
-    def new_resource(self,
-                     type_: str,
-                     name: str,
-                     inputs: dict,
-                     provider: Optional[str],
-                     id_: Optional[str]) -> Tuple[str, dict]:
-        return name + '_id', inputs
-
-    def call(self, token, args, provider):
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs) -> Tuple[Optional[str], dict]:
+        return args.name + '_id', args.inputs
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
         return {}
 
 
@@ -73,9 +100,9 @@ class TestingWithMocks(unittest.TestCase):
     def test_check_default_behavior(self):
         def check_default_behavior(args: List[WebSite]):
             for ws in args:
-                self.assertEqual(ws.default_cache_behavior.lambda_function_associations, [])
-                self.assertEqual(ws.default_cache_behavior.allowed_methods, ['GET', 'HEAD'])
-                self.assertEqual(ws.default_cache_behavior.cached_methods, ['GET', 'HEAD'])
+                self.assertEqual(ws.default_cache_behavior.lambda_function_associations, ())
+                self.assertEqual(ws.default_cache_behavior.allowed_methods, ('GET', 'HEAD'))
+                self.assertEqual(ws.default_cache_behavior.cached_methods, ('GET', 'HEAD'))
                 self.assertEqual(ws.default_cache_behavior.forwarded_values_cookies, 'none')
                 self.assertEqual(ws.default_cache_behavior.forwarded_values_headers, None)
                 self.assertEqual(ws.default_cache_behavior.forwarded_values_query_string, True)
@@ -86,7 +113,7 @@ class TestingWithMocks(unittest.TestCase):
                 self.assertEqual(ws.default_cache_behavior.target_origin_id, DEFAULT_ORIGIN_ID)
                 self.assertEqual(ws.default_cache_behavior.viewer_protocol_policy,
                                  config.VIEWER_PROTOCOL_POLICY_REDIRECT_TO_HTTPS)
-                self.assertEqual(ws.default_cache_behavior.lambda_function_associations, [])
+                self.assertEqual(ws.default_cache_behavior.lambda_function_associations, ())
                 self.assertTrue(ws.default_cache_behavior.compress)
 
         return pulumi.Output.all(website, default_website).apply(check_default_behavior)
@@ -103,3 +130,1517 @@ class TestingWithMocks(unittest.TestCase):
             self.assertEqual(ws.custom_error_responses[0].response_page_path, '/404-custom.html')
 
         return pulumi.Output.all(website, default_website).apply(check_custom_error_response)
+
+
+class FakeS3Error(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class FakeS3:
+    """
+    In-memory stand-in for the subset of the boto3 S3 client used by the package
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.etags = {}
+        self.uploads = {}
+        self.failing_parts = set()
+        self.calls = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append(('put_object', Key))
+        data = Body if isinstance(Body, bytes) else Body.read()
+        self.objects[(Bucket, Key)] = (data, kwargs)
+        self.etags[(Bucket, Key)] = hashlib.md5(data).hexdigest()
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error('404')
+        data, kwargs = self.objects[(Bucket, Key)]
+        return dict(kwargs, ETag=f'"{self.etags[(Bucket, Key)]}"', ContentLength=len(data))
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f'upload-{len(self.uploads)}'
+        self.uploads[upload_id] = (Bucket, Key, kwargs, {})
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        self.calls.append(('upload_part', PartNumber))
+        if PartNumber in self.failing_parts:
+            self.failing_parts.remove(PartNumber)
+            raise FakeS3Error('InternalError')
+        digest = hashlib.md5(Body).digest()
+        assert base64.b64encode(digest).decode() == ContentMD5
+        self.uploads[UploadId][3][PartNumber] = (Body, digest.hex())
+
+    def list_parts(self, Bucket, Key, UploadId, PartNumberMarker=0):
+        if UploadId not in self.uploads:
+            raise FakeS3Error('NoSuchUpload')
+        numbers = sorted(n for n in self.uploads[UploadId][3] if n > PartNumberMarker)
+        page = numbers[:2]
+        response = {'Parts': [{'PartNumber': n, 'ETag': f'"{self.uploads[UploadId][3][n][1]}"'} for n in page],
+                    'IsTruncated': len(numbers) > 2}
+        if response['IsTruncated']:
+            response['NextPartNumberMarker'] = page[-1]
+        return response
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        _, _, kwargs, parts = self.uploads.pop(UploadId)
+        numbers = [p['PartNumber'] for p in MultipartUpload['Parts']]
+        assert [f'"{parts[n][1]}"' for n in numbers] == [p['ETag'] for p in MultipartUpload['Parts']]
+        self.objects[(Bucket, Key)] = (b''.join(parts[n][0] for n in numbers), kwargs)
+        self.etags[(Bucket, Key)] = multipart.multipart_etag([bytes.fromhex(parts[n][1]) for n in numbers])
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error('NoSuchKey')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + 2]
+        response = {'Contents': [{'Key': k, 'Size': len(self.objects[(Bucket, k)][0])} for k in page],
+                    'IsTruncated': start + 2 < len(keys)}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + 2)
+        return response
+
+    def delete_objects(self, Bucket, Delete):
+        self.calls.append(('delete_objects', len(Delete['Objects'])))
+        for o in Delete['Objects']:
+            self.objects.pop((Bucket, o['Key']), None)
+
+    def keys(self, bucket):
+        return sorted(k for b, k in self.objects
+                      if b == bucket and not k.startswith(sync.MANIFEST_PREFIX))
+
+
+def write_files(root, files):
+    for name, content in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+
+class TestContentSync(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.s3 = FakeS3()
+        write_files(self.dir.name, {
+            'index.html': b'<html></html>',
+            'docs/index.html': b'<html>docs</html>',
+            'static/app.js': b'console.log(1)',
+        })
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def sync(self, **kwargs):
+        return sync.ContentSync('bucket', self.dir.name, client=self.s3, max_workers=4, **kwargs).run()
+
+    def test_first_sync_uploads_everything(self):
+        result = self.sync()
+        self.assertEqual(result.uploaded, ['docs/index.html', 'index.html', 'static/app.js'])
+        self.assertEqual(self.s3.keys('bucket'), result.uploaded)
+        self.assertEqual(self.s3.objects[('bucket', 'static/app.js')][1]['ContentType'],
+                         sync.guess_content_type('app.js'))
+
+    def test_unchanged_tree_uploads_nothing(self):
+        self.sync()
+        self.s3.calls = []
+        result = self.sync()
+        self.assertEqual(result.uploaded, [])
+        self.assertEqual(len(result.unchanged), 3)
+        self.assertEqual(self.s3.calls, [('put_object', sync.MANIFEST_KEY)])
+
+    def test_changed_and_orphaned_objects(self):
+        self.sync()
+        write_files(self.dir.name, {'static/app.js': b'console.log(2)'})
+        os.remove(os.path.join(self.dir.name, 'docs/index.html'))
+        result = self.sync()
+        self.assertEqual(result.uploaded, ['static/app.js'])
+        self.assertEqual(result.deleted, ['docs/index.html'])
+        self.assertEqual(result.changed_keys, ['docs/index.html', 'static/app.js'])
+        self.assertEqual(self.s3.keys('bucket'), ['index.html', 'static/app.js'])
+
+    def test_prefix_and_exclude(self):
+        result = self.sync(prefix='docs/', exclude=['static/*'])
+        self.assertEqual(result.uploaded, ['docs/docs/index.html', 'docs/index.html'])
+
+    def test_prefixes_keep_separate_manifests(self):
+        self.sync()
+        self.sync(prefix='v2/')
+        self.assertIn(('bucket', '.website-sync/v2/manifest.json'), self.s3.objects)
+        os.remove(os.path.join(self.dir.name, 'index.html'))
+        result = self.sync(prefix='v2/')
+        self.assertEqual(result.deleted, ['v2/index.html'])
+        self.assertIn('index.html', self.s3.keys('bucket'))
+        self.assertEqual(sync.plan_sync([], sync.Manifest({'a': {}, 'v2/a': {}}), prefix='v2/').deletes, ['v2/a'])
+
+    def test_manifests_are_denied_to_cloudfront(self):
+        policy = json.loads(WebSite._get_s3_policy(['oai', 'arn:aws:s3:::bucket']))
+        deny = [s for s in policy['Statement'] if s['Effect'] == 'Deny']
+        self.assertEqual(deny[0]['Resource'], 'arn:aws:s3:::bucket/.website-sync/*')
+
+
+class TestInvalidationPlanner(unittest.TestCase):
+    def test_index_documents(self):
+        self.assertEqual(invalidation.key_to_paths('index.html'), ['/index.html', '/'])
+        self.assertEqual(invalidation.key_to_paths('docs/index.html'), ['/docs/index.html'])
+        self.assertEqual(invalidation.key_to_paths('a b.html'), ['/a%20b.html'])
+
+    def test_paths_routed_to_other_behaviors_are_skipped(self):
+        patterns = ['/docs/*']
+        self.assertEqual(invalidation.paths_for_keys(['index.html', 'docs/x.html'], patterns),
+                         {'/', '/index.html'})
+        self.assertEqual(invalidation.paths_for_keys(['docs/index.html', 'x.html'], patterns, '/docs/*'),
+                         {'/docs/index.html'})
+
+    def test_small_diff_is_not_coalesced(self):
+        plan = invalidation.plan_invalidations(['/docs/a.html', '/docs/b.html'])
+        self.assertEqual(plan.batches, [['/docs/a.html', '/docs/b.html']])
+        self.assertEqual(plan.wildcards, [])
+
+    def test_fully_changed_directory_is_coalesced(self):
+        all_paths = ['/docs/a.html', '/docs/b.html', '/index.html']
+        plan = invalidation.plan_invalidations(['/docs/a.html', '/docs/b.html'], all_paths)
+        self.assertEqual(plan.paths, ['/docs/*'])
+        # a fully changed site is not a reason to drop the whole edge cache
+        plan = invalidation.plan_invalidations(all_paths, all_paths)
+        self.assertEqual(plan.paths, ['/docs/*', '/index.html'])
+
+    def test_requested_wildcards_count_against_the_limit(self):
+        requested = [f'/d{d}/*' for d in range(4)] + ['/d0/a/*', '/d0/x.html', '/e/a.html', '/e/b.html']
+        plan = invalidation.plan_invalidations(requested, max_paths=10, max_wildcards=2)
+        self.assertEqual(plan.requested_paths, 8)
+        self.assertEqual(plan.batches, [['/d0/*', '/d1/*', '/e/a.html', '/e/b.html'], ['/d2/*', '/d3/*']])
+
+    def test_large_diff_stays_within_limits(self):
+        changed = [f'/section-{s}/page-{p}.html' for s in range(32) for p in range(500)]
+        unchanged = [f'/section-{s}/old-{p}.html' for s in range(20) for p in range(500)]
+        plan = invalidation.plan_invalidations(changed, changed + unchanged)
+        self.assertEqual(plan.requested_paths, 16000)
+        self.assertEqual(len(plan.wildcards), invalidation.MAX_WILDCARDS_IN_PROGRESS)
+        # sections without unchanged objects are merged first
+        for s in range(20, 32):
+            self.assertIn(f'/section-{s}/*', plan.wildcards)
+        self.assertNotIn('/*', plan.wildcards)
+        self.assertEqual(len(plan), 15 + 17 * 500)
+        self.assertEqual(len(plan.batches), 3)
+        self.assertTrue(all(len(b) <= invalidation.MAX_PATHS_IN_PROGRESS for b in plan.batches))
+
+    def test_batches_when_wildcards_run_out(self):
+        changed = [f'/d{d}/p{p}.html' for d in range(5) for p in range(10)]
+        plan = invalidation.plan_invalidations(changed, max_paths=10, max_wildcards=2)
+        self.assertEqual(len(plan.wildcards), 2)
+        self.assertTrue(all(len(b) <= 10 for b in plan.batches))
+        self.assertEqual(len(plan), 2 + 30)
+
+    def test_website_invalidation_plan(self):
+        plan = website.invalidation_plan({'default': ['index.html', 'app.js']})
+        self.assertEqual(plan.paths, ['/', '/app.js', '/index.html'])
+
+
+policy_website = WebSite('policy',
+                         issue='sre-123',
+                         stack='staging',
+                         zones={
+                             'ABCDEF123': ['policy.jetbrains.com']
+                         },
+                         viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                         additional_buckets_mapping={'docs': '/docs/*', 'blog': '/blog/*'},
+                         cache_policy=config.CachePolicy(query_strings=['v']),
+                         origin_request_policy=config.OriginRequestPolicy())
+
+
+class TestCachePolicies(unittest.TestCase):
+    def test_cache_policy_to_dict(self):
+        output = config.CachePolicy(query_strings=['v', 'lang'], headers=['Origin']).to_dict()
+        self.assertEqual(output['queryStringsConfig'], {'queryStringBehavior': 'whitelist',
+                                                        'queryStrings': {'items': ['lang', 'v']}})
+        self.assertEqual(output['headersConfig'], {'headerBehavior': 'whitelist', 'headers': {'items': ['Origin']}})
+        self.assertEqual(output['cookiesConfig'], {'cookieBehavior': 'none'})
+        self.assertTrue(output['enableAcceptEncodingBrotli'])
+        self.assertTrue(output['enableAcceptEncodingGzip'])
+
+    def test_behavior_with_policy_has_no_forwarded_values(self):
+        output = policy_website.default_cache_behavior.to_dict()
+        self.assertNotIn('forwardedValues', output)
+        self.assertNotIn('defaultTtl', output)
+        self.assertIn('cachePolicyId', output)
+        self.assertIn('originRequestPolicyId', output)
+        self.assertIn('forwardedValues', website.default_cache_behavior.to_dict())
+
+    @pulumi.runtime.test
+    def test_policies_are_shared(self):
+        behaviors = [policy_website.default_cache_behavior] + policy_website.cache_behaviors
+
+        def check_policies(args):
+            cache_policy_id, origin_request_policy_id = args[:2]
+            self.assertEqual(args[2:2 + len(behaviors)], [cache_policy_id] * len(behaviors))
+            self.assertEqual(args[2 + len(behaviors):], [origin_request_policy_id] * len(behaviors))
+
+        return pulumi.Output.all(policy_website.cache_policy.id, policy_website.origin_request_policy.id,
+                                 *[cb.cache_policy_id for cb in behaviors],
+                                 *[cb.origin_request_policy_id for cb in behaviors]).apply(check_policies)
+
+
+class TestPrecompress(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        write_files(self.dir.name, {
+            'src/app.js': b'function hello() { return "hello world"; }\n' * 200,
+            'src/logo.png': b'\x89PNG' + bytes(range(256)) * 20,
+            'src/tiny.css': b'a{}',
+        })
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def process(self):
+        stage = compression.Precompress(encodings=['gzip'], cache_dir=os.path.join(self.dir.name, 'cache'),
+                                        max_workers=2)
+        objects = sync.scan_directory(os.path.join(self.dir.name, 'src'))
+        return stage, {o.key: o for o in stage.process(objects)}
+
+    def test_variants(self):
+        stage, objects = self.process()
+        self.assertEqual(sorted(objects), ['app.js', 'app.js.gz', 'logo.png', 'tiny.css', 'tiny.css.gz'])
+        self.assertEqual(stage.variants, ['app.js.gz', 'tiny.css.gz'])
+        self.assertEqual(objects['tiny.css.gz'].md5, objects['tiny.css'].md5)
+        self.assertNotIn('Content-Encoding', objects['tiny.css.gz'].headers)
+        variant = objects['app.js.gz']
+        self.assertEqual(variant.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(variant.headers['Content-Type'], objects['app.js'].headers['Content-Type'])
+        self.assertLess(variant.size, objects['app.js'].size)
+        with gzip.open(variant.path) as f:
+            self.assertEqual(f.read(), b'function hello() { return "hello world"; }\n' * 200)
+
+    def test_cache_is_reused(self):
+        _, first = self.process()
+        mtime = os.path.getmtime(first['app.js.gz'].path)
+        _, second = self.process()
+        self.assertEqual(os.path.getmtime(second['app.js.gz'].path), mtime)
+        self.assertEqual(second['app.js.gz'].fingerprint, first['app.js.gz'].fingerprint)
+
+    def test_changed_keys_report_originals(self):
+        def run():
+            stage = compression.Precompress(encodings=['gzip'], cache_dir=os.path.join(self.dir.name, 'cache'),
+                                            max_workers=1)
+            return sync.ContentSync('bucket', os.path.join(self.dir.name, 'src'), client=s3, max_workers=1,
+                                    stages=[stage], retention=0).run()
+
+        s3 = FakeS3()
+        result = run()
+        self.assertIn('app.js.gz', result.uploaded)
+        self.assertEqual(result.changed_keys, ['app.js', 'logo.png', 'tiny.css'])
+        os.remove(os.path.join(self.dir.name, 'src/app.js'))
+        write_files(self.dir.name, {'src/tiny.css': b'b{}'})
+        result = run()
+        self.assertEqual(result.deleted, ['app.js', 'app.js.gz'])
+        self.assertEqual(result.changed_keys, ['app.js', 'tiny.css'])
+
+    def test_select_variant(self):
+        self.assertEqual(compression.select_variant('/app.js', 'gzip, deflate, br'), '/app.js.br')
+        self.assertEqual(compression.select_variant('/style.css', 'gzip, br', ['gzip']), '/style.css.gz')
+        self.assertEqual(compression.select_variant('/app.js', ''), '/app.js')
+        self.assertEqual(compression.select_variant('/logo.png', 'br'), '/logo.png')
+        self.assertEqual(compression.select_variant('/v1.2/data', 'br'), '/v1.2/data')
+        code = compression.origin_request_handler_code(['gzip'])
+        self.assertIn('[["gzip", ".gz"]]', code)
+
+    @unittest.skipUnless(shutil.which('node'), 'needs node')
+    def test_handler_parity(self):
+        code = compression.origin_request_handler_code()
+        cases = [('/app.js', 'gzip, br'), ('/App.CSS', 'gzip'), ('/logo.png', 'br'), ('/v1.2/data', 'br'),
+                 ('/docs/', 'gzip'), ('/index.html', None)]
+        script = code + '''
+const cases = %s;
+(async () => {
+    const uris = [];
+    for (const [uri, encoding] of cases) {
+        const headers = encoding === null ? {} : {'accept-encoding': [{key: 'Accept-Encoding', value: encoding}]};
+        const request = await exports.handler({Records: [{cf: {request: {uri, headers}}}]});
+        uris.push(request.uri);
+    }
+    console.log(JSON.stringify(uris));
+})();
+''' % json.dumps(cases)
+        output = subprocess.run(['node', '-e', 'const exports = {};' + script], check=True,
+                                stdout=subprocess.PIPE).stdout
+        self.assertEqual(json.loads(output), [compression.select_variant(u, e) for u, e in cases])
+
+    def test_precompressed_requires_cache_policy(self):
+        with self.assertRaises(Exception):
+            WebSite('precompressed', issue='sre-123', stack='staging', zones={},
+                    viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                    precompressed=True)
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        write_files(self.dir.name, {
+            'index.html': b'<link href="/static/site.css"><script src="static/app.js?v=1"></script>'
+                          b'<img srcset="img/a.png 1x, img/b.png 2x"><a href="https://example.com/app.js">',
+            'about.html': b'<p>no assets</p>',
+            'static/site.css': b'body { background: url(../img/a.png); }',
+            'static/app.js': b'console.log(1)',
+            'img/a.png': b'a',
+            'img/b.png': b'b',
+            'vendor/lib.0123abcd99.js': b'lib',
+        })
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_fingerprint_and_rewrite(self):
+        stage = fingerprint.Fingerprint()
+        objects = {o.key: o for o in stage.process(sync.scan_directory(self.dir.name))}
+        a = stage.renames['img/a.png']
+        css = stage.renames['static/site.css']
+        js = stage.renames['static/app.js']
+        self.assertRegex(a, r'^img/a\.[0-9a-f]{10}\.png$')
+        self.assertNotIn('vendor/lib.0123abcd99.js', stage.renames)
+        self.assertIn('vendor/lib.0123abcd99.js', objects)
+        self.assertEqual(objects[css].data.decode(), f'body {{ background: url(../img/{a[4:]}); }}')
+        self.assertEqual(objects['index.html'].data.decode(),
+                         f'<link href="/{css}"><script src="{js}?v=1"></script>'
+                         f'<img srcset="{a} 1x, {stage.renames["img/b.png"]} 2x">'
+                         f'<a href="https://example.com/app.js">')
+        self.assertIsNone(objects['about.html'].data)
+        self.assertEqual(len(objects), 7)
+
+    def test_css_hash_covers_referenced_names(self):
+        first = fingerprint.Fingerprint()
+        first.process(sync.scan_directory(self.dir.name))
+        write_files(self.dir.name, {'img/a.png': b'changed'})
+        second = fingerprint.Fingerprint()
+        second.process(sync.scan_directory(self.dir.name))
+        self.assertNotEqual(first.renames['static/site.css'], second.renames['static/site.css'])
+        self.assertEqual(first.renames['static/app.js'], second.renames['static/app.js'])
+
+    def test_source_maps_stay_reachable(self):
+        write_files(self.dir.name, {
+            'static/bundle.js': b'console.log(1);\n//# sourceMappingURL=bundle.js.map\n',
+            'static/bundle.js.map': b'{"version":3,"file":"bundle.js","sources":["../src/index.js"],'
+                                    b'"names":[],"mappings":"AAAA"}',
+            'static/site.css': b'body { color: red; }\n/*# sourceMappingURL=site.css.map */\n',
+            'static/site.css.map': b'{"version":3,"file":"site.css","sources":["../src/site.scss"],"mappings":"AAAA"}',
+        })
+        stage = fingerprint.Fingerprint()
+        objects = {o.key: o for o in stage.process(sync.scan_directory(self.dir.name))}
+        for bundle in ['static/bundle.js', 'static/site.css']:
+            key = stage.renames[bundle]
+            data = objects[key].data
+            if data is None:
+                with open(objects[key].path, 'rb') as f:
+                    data = f.read()
+            url = re.search(r'sourceMappingURL=(\S+)', data.decode()).group(1)
+            self.assertIn(posixpath.join(posixpath.dirname(key), url), objects)
+
+    def test_undecodable_text_is_skipped(self):
+        write_files(self.dir.name, {'latin1.html': '<img src="img/a.png"> caf\xe9'.encode('latin-1'),
+                                    'static/legacy.css': b'\xff\xfe'})
+        stage = fingerprint.Fingerprint()
+        objects = {o.key: o for o in stage.process(sync.scan_directory(self.dir.name))}
+        self.assertEqual(stage.skipped, ['latin1.html', 'static/legacy.css'])
+        self.assertIsNone(objects['latin1.html'].data)
+        self.assertIn('static/legacy.css', objects)
+
+    def test_cache_control_rules(self):
+        stage = fingerprint.CacheControl()
+        self.assertEqual(stage.cache_control('static/app.0123456789.js'), fingerprint.CACHE_CONTROL_IMMUTABLE)
+        self.assertEqual(stage.cache_control('docs/index.html'), fingerprint.CACHE_CONTROL_HTML)
+        self.assertEqual(stage.cache_control('robots.txt'), fingerprint.CACHE_CONTROL_DEFAULT)
+        self.assertEqual(stage.cache_control('report-20240101.pdf'), fingerprint.CACHE_CONTROL_DEFAULT)
+        self.assertEqual(stage.cache_control('app-3f2a1b9c.js'), fingerprint.CACHE_CONTROL_DEFAULT)
+        self.assertEqual(stage.cache_control('app-3f2a1b9c.js', fingerprinted=True),
+                         fingerprint.CACHE_CONTROL_IMMUTABLE)
+        objects = fingerprint.Fingerprint().process(sync.scan_directory(self.dir.name))
+        by_key = {o.key: o for o in stage.process(objects)}
+        a = [k for k in by_key if k.startswith('img/a.')][0]
+        self.assertTrue(by_key[a].fingerprinted)
+        self.assertTrue(by_key[a].to_manifest()['fingerprinted'])
+        self.assertEqual(by_key[a].headers['Cache-Control'], fingerprint.CACHE_CONTROL_IMMUTABLE)
+        self.assertEqual(by_key['about.html'].headers['Cache-Control'], fingerprint.CACHE_CONTROL_HTML)
+
+    def test_previous_generation_is_retained(self):
+        s3 = FakeS3()
+        clock = FakeClock()
+
+        def run():
+            return sync.ContentSync('bucket', self.dir.name, client=s3, max_workers=2, clock=clock,
+                                    stages=[fingerprint.Fingerprint()]).run()
+
+        first = run()
+        old_js = [k for k in first.uploaded if k.startswith('static/app.')][0]
+        write_files(self.dir.name, {'static/app.js': b'console.log(2)'})
+        os.remove(os.path.join(self.dir.name, 'about.html'))
+        self.assertEqual(run().deleted, ['about.html'])
+        self.assertIn(old_js, s3.keys('bucket'))
+        clock.now = sync.DEFAULT_RETENTION - 1
+        self.assertEqual(run().deleted, [])
+        clock.now = sync.DEFAULT_RETENTION
+        self.assertEqual(run().deleted, [old_js])
+        self.assertNotIn(old_js, s3.keys('bucket'))
+
+    def test_ttl_consistency(self):
+        self.assertEqual(fingerprint.parse_max_age('public, max-age=60, s-maxage=600'), 600)
+        self.assertEqual(fingerprint.parse_max_age('no-store'), 0)
+        with unittest.mock.patch('pulumi.log.warn') as warn:
+            self.assertEqual(website.check_cache_control(fingerprint.DEFAULT_RULES), [])
+            problems = website.check_cache_control([fingerprint.CacheControlRule('*.js', 'max-age=31536000')])
+        self.assertEqual(len(problems), 1)
+        self.assertIn('max_ttl=86400 cuts max-age=31536000', problems[0])
+        warn.assert_called_once_with(problems[0], resource=website)
+        rules = [fingerprint.CacheControlRule('*.html', 'max-age=60')]
+        self.assertEqual(len(fingerprint.check_ttls(rules, min_ttl=300, max_ttl=86400)), 1)
+
+
+replicated_website = WebSite('replicated',
+                             issue='sre-123',
+                             stack='staging',
+                             zones={
+                                 'ABCDEF123': ['replicated.jetbrains.com']
+                             },
+                             viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                             additional_buckets_mapping={'docs': '/docs/*'},
+                             origin_shield_region='eu-west-1',
+                             replica_region='us-east-1')
+
+
+class TestOriginFailover(unittest.TestCase):
+    def test_origin_shield(self):
+        origin = config.Origin(domain_name='d', origin_id='o', s3_origin_access_identity='i',
+                               origin_shield_region='eu-west-1')
+        self.assertEqual(origin.to_dict()['originShield'], {'enabled': True, 'originShieldRegion': 'eu-west-1'})
+        self.assertNotIn('originShield', config.Origin(domain_name='d', origin_id='o',
+                                                       s3_origin_access_identity='i').to_dict())
+
+    def test_replica_origins(self):
+        ws = replicated_website
+        self.assertEqual(sorted(ws.replica_buckets), ['default', 'docs'])
+        self.assertEqual(len(ws.origins), 4)
+        self.assertEqual([o.origin_shield_region for o in ws.origins],
+                         ['eu-west-1', 'us-east-1', 'eu-west-1', 'us-east-1'])
+        self.assertEqual(len(ws.origin_groups), 2)
+        self.assertEqual(ws.default_cache_behavior.target_origin_id, DEFAULT_ORIGIN_GROUP_ID)
+        self.assertEqual(ws.origin_groups[0].to_dict()['failoverCriteria']['statusCodes'], [500, 502, 503, 504])
+
+    @pulumi.runtime.test
+    def test_behaviors_target_origin_groups(self):
+        def check_targets(args):
+            group_id, target, bucket_id = args
+            self.assertEqual(group_id, target)
+            self.assertEqual(target, f'{bucket_id}-group')
+
+        ws = replicated_website
+        return pulumi.Output.all(ws.origin_groups[1].origin_id, ws.cache_behaviors[0].target_origin_id,
+                                 ws.buckets['docs'].id).apply(check_targets)
+
+
+api_origin = config.CustomOrigin(origin_id='api',
+                                 domain_name='api.internal.jetbrains.com',
+                                 path_patterns=['/api/*', '/graphql'],
+                                 origin_keepalive_timeout=60,
+                                 origin_read_timeout=45)
+custom_origin_website = WebSite('custom',
+                                issue='sre-123',
+                                stack='staging',
+                                zones={
+                                    'ABCDEF123': ['custom.jetbrains.com']
+                                },
+                                viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                                additional_buckets_mapping={'docs': '/docs/*'},
+                                custom_origins=[api_origin])
+
+
+class TestCustomOrigins(unittest.TestCase):
+    def test_to_dict(self):
+        output = api_origin.to_dict()
+        self.assertEqual(output['originId'], 'api')
+        self.assertEqual(output['connectionAttempts'], 3)
+        self.assertEqual(output['customOriginConfig'], {
+            'httpPort': 80,
+            'httpsPort': 443,
+            'originProtocolPolicy': config.ORIGIN_PROTOCOL_POLICY_HTTPS_ONLY,
+            'originSslProtocols': ['TLSv1.2'],
+            'originKeepaliveTimeout': 60,
+            'originReadTimeout': 45,
+        })
+
+    def test_validation(self):
+        with self.assertRaises(Exception):
+            config.CustomOrigin(origin_id='api', domain_name='api', path_patterns=['/api/*'], connection_timeout=30)
+        with self.assertRaises(Exception):
+            config.CustomOrigin(origin_id='api', domain_name='api', path_patterns=['/api/*'],
+                                origin_protocol_policy='ftp')
+
+    def test_behaviors(self):
+        behaviors = custom_origin_website.cache_behaviors
+        self.assertEqual([cb.path_pattern for cb in behaviors], ['/docs/*', '/api/*', '/graphql'])
+        self.assertEqual([cb.target_origin_id for cb in behaviors[1:]], ['api', 'api'])
+        self.assertEqual(behaviors[1].max_ttl, 0)
+        self.assertIn('POST', behaviors[1].allowed_methods)
+        self.assertIs(custom_origin_website.origins[-1], api_origin)
+        with unittest.mock.patch('pulumi.log.warn') as warn:
+            problems = custom_origin_website.check_cache_control(fingerprint.DEFAULT_RULES)
+        self.assertEqual(warn.call_count, len(problems))
+
+
+def log_line(path, result='Hit', edge='IAD89-C1', sc_bytes=100, time_taken=0.010, query='-', **extra):
+    fields = dict.fromkeys(logs.DEFAULT_FIELDS, '-')
+    fields.update({'date': '2026-10-17', 'time': '10:00:00', 'x-edge-location': edge, 'sc-bytes': str(sc_bytes),
+                   'cs-method': 'GET', 'cs-uri-stem': path, 'sc-status': '200', 'cs-uri-query': query,
+                   'x-edge-result-type': result, 'time-taken': str(time_taken)})
+    fields.update(extra)
+    return '\t'.join(fields[f] for f in logs.DEFAULT_FIELDS) + '\n'
+
+
+def gzip_log(lines):
+    header = '#Version: 1.0\n#Fields: ' + ' '.join(logs.DEFAULT_FIELDS) + '\n'
+    return gzip.compress((header + ''.join(lines)).encode())
+
+
+class TestLogAnalyzer(unittest.TestCase):
+    patterns = ['/docs/*', '*.js']
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        write_files(self.dir.name, {
+            'a/E1.2026-10-17-10.1.gz': gzip_log([log_line('/docs/index.html'),
+                                                 log_line('/docs/a.html', result='Miss', time_taken=0.200),
+                                                 log_line('/app.js', edge='NRT57-P2', sc_bytes=1000)]),
+            'b/E1.2026-10-17-11.2.gz': gzip_log([log_line('/', result='RefreshHit'),
+                                                 log_line('/docs/main.js', result='Error')]),
+        })
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def check(self, report):
+        self.assertEqual(report.total.requests, 5)
+        docs = report.behaviors['/docs/*']
+        self.assertEqual((docs.requests, docs.hits, docs.misses, docs.errors), (3, 1, 1, 1))
+        self.assertEqual(report.behaviors['*.js'].bytes, 1000)
+        self.assertEqual(report.behaviors[logs.DEFAULT_BEHAVIOR].refresh_hits, 1)
+        self.assertEqual(sorted(report.edges), ['IAD', 'NRT'])
+        self.assertAlmostEqual(docs.latency.percentile(99), 200, delta=200 * (logs.HISTOGRAM_GROWTH - 1))
+
+    def test_local_directory_in_process_pool(self):
+        sources = logs.list_sources(self.dir.name)
+        self.assertEqual(len(sources), 2)
+        self.check(logs.analyze(sources, self.patterns, max_workers=2))
+
+    def test_s3(self):
+        s3 = FakeS3()
+        for i, source in enumerate(logs.list_sources(self.dir.name)):
+            with open(source, 'rb') as f:
+                s3.put_object(Bucket='logs', Key=f'cf/{i}.gz', Body=f.read())
+        s3.put_object(Bucket='logs', Key='cf/readme.txt', Body=b'')
+        sources = logs.list_sources('s3://logs/cf/', client=s3)
+        self.assertEqual(sources, ['s3://logs/cf/0.gz', 's3://logs/cf/1.gz'])
+        self.check(logs.analyze(sources, self.patterns, client=s3))
+        # without a client, every worker creates and reuses its own from the profile
+        with unittest.mock.patch('pulumi_aws_website.sync.make_s3_client', return_value=s3) as make_s3_client, \
+                unittest.mock.patch.dict(logs._s3_clients, clear=True):
+            self.check(logs.analyze(sources, self.patterns, max_workers=1, profile_name='logs'))
+        make_s3_client.assert_called_once_with(region_name=None, profile_name='logs')
+
+    def test_forked_workers_get_their_own_s3_client(self):
+        with unittest.mock.patch('pulumi_aws_website.sync.make_s3_client', side_effect=lambda **_: object()), \
+                unittest.mock.patch.dict(logs._s3_clients, clear=True):
+            parent = logs._s3_client('logs')
+            self.assertIs(logs._s3_client('logs'), parent)
+            with unittest.mock.patch('os.getpid', return_value=os.getpid() + 1):
+                self.assertIsNot(logs._s3_client('logs'), parent)
+
+    def test_histogram(self):
+        histogram = logs.LatencyHistogram()
+        for ms in range(1, 1001):
+            histogram.add(ms)
+        self.assertAlmostEqual(histogram.percentile(50), 500, delta=500 * 0.05)
+        self.assertAlmostEqual(histogram.percentile(99), 990, delta=990 * 0.05)
+        self.assertLess(len(histogram.buckets), 200)
+
+    def test_cli(self):
+        out = io.StringIO()
+        with unittest.mock.patch('sys.stdout', out):
+            logs.main([self.dir.name, '--behavior', '/docs/*', '--workers', '1', '--json'])
+        self.assertEqual(json.loads(out.getvalue())['total']['requests'], 5)
+
+
+class TestBehaviorIndex(unittest.TestCase):
+    def test_pattern_relations(self):
+        self.assertTrue(routing.subsumes('/docs/*', '/docs/api/*'))
+        self.assertTrue(routing.subsumes('*.js', '/static/*.js'))
+        self.assertTrue(routing.subsumes('/a?', '/ab'))
+        self.assertFalse(routing.subsumes('/a?', '/a*'))
+        self.assertFalse(routing.subsumes('/docs/api/*', '/docs/*'))
+        self.assertTrue(routing.intersects('/docs/*', '*.js'))
+        self.assertFalse(routing.intersects('/docs/*', '/blog/*'))
+
+    def test_issues(self):
+        issues = routing.find_pattern_issues(['/docs/*', '/docs/api/*', '*.js', '/blog/*'])
+        self.assertEqual([(i.kind, i.index, i.shadowed_by_index) for i in issues],
+                         [(routing.ISSUE_UNREACHABLE, 1, 0), (routing.ISSUE_OVERLAP, 2, 0), (routing.ISSUE_OVERLAP, 3, 2)])
+        with self.assertRaises(Exception):
+            routing.BehaviorIndex(website.default_cache_behavior, config.CustomOrigin(
+                origin_id='api', domain_name='api', path_patterns=['/api/*', '/api/v1/*']).cache_behaviors(),
+                strict=True)
+
+    def test_matches_naive_resolution(self):
+        patterns = ['/exact.html', '/docs/*', '/docs/api/v?/*', '*.js', '/static/*', 'img/*.png']
+        index = routing.PatternIndex(patterns)
+        paths = ['/exact.html', '/exact.htm', '/docs/a.js', '/docs/api/v1/x', '/app.js', '/static/a.css',
+                 '/img/a.png', '/img/a.jpg', '/', '/docs']
+        for path in paths:
+            self.assertEqual(index.first_match(path), patterns_module.first_matching_pattern(patterns, path), path)
+
+    def test_resolve_website(self):
+        index = custom_origin_website.behavior_index()
+        api = index.resolve('/api/users')
+        self.assertEqual((api.path_pattern, api.origin_id, api.ttl), ('/api/*', 'api', 0))
+        default = index.resolve('/index.html')
+        self.assertEqual((default.index, default.origin_id, default.ttl), (None, DEFAULT_ORIGIN_ID, 3600))
+        self.assertEqual(index.counts(['/docs/a', '/docs/b', '/graphql', '/']),
+                         {'/docs/*': 2, '/api/*': 0, '/graphql': 1, None: 1})
+        self.assertEqual(policy_website.behavior_index().resolve('/docs/x').ttl, 3600)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEdgeEmulator(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        write_files(os.path.join(self.dir.name, 'default'), {'index.html': b'home', '404-custom.html': b'not here'})
+        write_files(os.path.join(self.dir.name, 'docs'), {'docs/a.html': b'docs'})
+        self.clock = FakeClock()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.dir.cleanup()
+
+    def serve(self, ws, requests, **kwargs):
+        edge = emulator.EdgeEmulator.from_website(ws, {'default': os.path.join(self.dir.name, 'default'),
+                                                       'docs': os.path.join(self.dir.name, 'docs')},
+                                                  clock=self.clock, **kwargs)
+
+        async def run():
+            host, port = await edge.start()
+            reader, writer = await asyncio.open_connection(host, port)
+            responses = []
+            for target in requests:
+                writer.write(f'GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+                status = int((await reader.readline()).split()[1])
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.lower()] = value.strip()
+                body = await reader.readexactly(int(headers['content-length']))
+                responses.append((status, headers.get('x-cache'), body))
+            writer.close()
+            await edge.stop()
+            await asyncio.sleep(0)
+            return responses
+
+        return edge, self.loop.run_until_complete(run())
+
+    def test_cache_and_routing(self):
+        edge, responses = self.serve(policy_website, ['/', '/index.html', '/docs/a.html', '/docs/a.html?v=1',
+                                                      '/docs/a.html?other=1'])
+        self.assertEqual(responses, [
+            (200, emulator.X_CACHE_MISS, b'home'),
+            (200, emulator.X_CACHE_HIT, b'home'),
+            (200, emulator.X_CACHE_MISS, b'docs'),
+            (200, emulator.X_CACHE_MISS, b'docs'),
+            (200, emulator.X_CACHE_HIT, b'docs'),
+        ])
+        stats = edge.stats.to_dict(edge.cache)
+        self.assertEqual((stats['requests'], stats['hits'], stats['origin_fetches']), (5, 2, 3))
+        self.assertEqual(stats['behaviors'], {'default': 2, '/docs/*': 3})
+
+    def test_ttl_and_error_responses(self):
+        edge, responses = self.serve(website, ['/missing', '/missing'])
+        self.assertEqual(responses, [(404, emulator.X_CACHE_ERROR, b'not here')] * 2)
+        self.assertEqual(edge.stats.origin_fetches, 2)
+        self.clock.now = 3601
+        _, responses = self.serve(website, ['/', '/'])
+        self.assertEqual([r[1] for r in responses], [emulator.X_CACHE_MISS, emulator.X_CACHE_HIT])
+
+    def test_directory_indexes_agree_with_invalidations(self):
+        write_files(os.path.join(self.dir.name, 'docs'), {'docs/index.html': b'docs index'})
+        _, responses = self.serve(policy_website, ['/docs/'])
+        self.assertEqual(responses[0][0], 404)
+        rules = functions.RequestRules([functions.IndexRewrite()])
+        _, responses = self.serve(policy_website, ['/docs/', '/docs/index.html'], request_rules=rules)
+        self.assertEqual(responses, [(200, emulator.X_CACHE_MISS, b'docs index'),
+                                     (200, emulator.X_CACHE_HIT, b'docs index')])
+        # the rewritten URI is the cache key, so it is the only path to invalidate
+        self.assertEqual(policy_website.invalidation_plan({'docs': ['docs/index.html']}).paths, ['/docs/index.html'])
+
+    def test_path_traversal(self):
+        write_files(self.dir.name, {'secret.txt': b'secret'})
+        os.symlink(os.path.join(self.dir.name, 'secret.txt'), os.path.join(self.dir.name, 'default', 'link.txt'))
+        edge, responses = self.serve(website, ['../secret.txt', '%2e%2e/secret.txt', '/%2e%2e/secret.txt',
+                                               '/link.txt'])
+        self.assertEqual([r[0] for r in responses], [400, 400, 404, 404])
+        self.assertNotIn(b'secret', b''.join(r[2] for r in responses))
+
+    def test_lru_eviction(self):
+        cache = emulator.EdgeCache(max_entries=2)
+        for key in ('a', 'b'):
+            cache.put(key, emulator.CachedResponse(200, {}, b'x', 0, 10))
+        cache.get('a', 1)
+        cache.put('c', emulator.CachedResponse(200, {}, b'x', 0, 10))
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertIsNone(cache.get('a', 10))
+        self.assertEqual((cache.evictions, cache.bytes), (1, 1))
+
+
+class TestWarmer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        write_files(os.path.join(self.dir.name, 'default'), {'index.html': b'home', 'a.html': b'a' * 100})
+        write_files(os.path.join(self.dir.name, 'docs'), {'docs/b.html': b'docs'})
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.dir.cleanup()
+
+    def warm(self, paths, runs=1, **kwargs):
+        edge = emulator.EdgeEmulator.from_website(policy_website, {'default': os.path.join(self.dir.name, 'default'),
+                                                                   'docs': os.path.join(self.dir.name, 'docs')})
+
+        async def run():
+            host, port = await edge.start()
+            warmer = warm.Warmer([f'{host}:{port}'], scheme='http', **kwargs)
+            reports = [await warmer.warm_async(paths) for _ in range(runs)]
+            await edge.stop()
+            await asyncio.sleep(0)
+            return reports
+
+        return edge, self.loop.run_until_complete(run())
+
+    def test_paths(self):
+        self.assertEqual(warm.paths_for_keys(['index.html', 'docs/index.html', 'a.html', 'index.html']),
+                         ['/index.html', '/', '/docs/index.html', '/a.html'])
+        sitemap = b'''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://example.com/</loc></url>
+  <url><loc>https://example.com/docs/b.html?v=2</loc></url>
+</urlset>'''
+        self.assertEqual(warm.parse_sitemap(sitemap), ['/', '/docs/b.html?v=2'])
+
+    def test_warm_every_encoding(self):
+        progress = []
+        edge, (first, second) = self.warm(['/', '/a.html', '/docs/b.html'], runs=2, connections_per_host=2,
+                                          progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual((first.requests, first.errors, first.bytes), (9, 0, 324))
+        self.assertEqual(first.x_cache, {emulator.X_CACHE_MISS: 9})
+        self.assertEqual(second.x_cache, {emulator.X_CACHE_HIT: 9})
+        self.assertEqual(sorted(first.latency), ['br', 'gzip', 'identity'])
+        self.assertEqual(progress[-1], (9, 9))
+        self.assertEqual(edge.stats.origin_fetches, 9)
+
+    def test_errors_and_rate_limit(self):
+        _, (report,) = self.warm(['/missing'], encodings=['identity'], rate=1000)
+        self.assertEqual((report.errors, report.statuses), (1, {404: 1}))
+        self.assertEqual(len(report.failures), 1)
+
+
+fleet = WebSiteFleet('fleet',
+                     issue='sre-123',
+                     stack='staging',
+                     cache_policy=config.CachePolicy(),
+                     max_parallel=2,
+                     log_retention_days=30,
+                     sites=[{
+                         'name': f'fleet-{i}',
+                         'zones': {'ABCDEF123': [f'fleet-{i}.jetbrains.com']},
+                         'viewer_certificate': config.ViewerCertificate(cloudfront_default_certificate=True),
+                         'additional_buckets_mapping': {'docs': '/docs/*'},
+                     } for i in range(5)])
+
+
+class TestWebSiteFleet(unittest.TestCase):
+    def test_shared_resources(self):
+        sites = list(fleet.sites.values())
+        self.assertEqual([s.name for s in sites], [f'fleet-{i}' for i in range(5)])
+        for site in sites:
+            self.assertIs(site.shared_resources, fleet.shared_resources)
+            self.assertIs(site.default_cache_behavior.cache_policy_id, fleet.shared_resources.cache_policy.id)
+            self.assertIs(site.cache_behaviors[0].cache_policy_id, fleet.shared_resources.cache_policy.id)
+            self.assertEqual(site.tags['website'], f'{site.name}-staging')
+            self.assertEqual(site.logging_config.prefix, f'{site.name}/')
+        self.assertEqual(sites[0].behavior_index().resolve('/x').ttl, 3600)
+
+    def test_bounded_parallelism(self):
+        sites = list(fleet.sites.values())
+        self.assertEqual([s.distribution_depends_on for s in sites[:2]], [None, None])
+        for i in range(2, 5):
+            self.assertEqual(sites[i].distribution_depends_on, [sites[i - 2].distribution])
+
+    def test_site_dependencies_are_kept(self):
+        spec = {'zones': {}, 'viewer_certificate': config.ViewerCertificate(cloudfront_default_certificate=True),
+                'distribution_depends_on': [fleet.logging_bucket]}
+        small = WebSiteFleet('small', issue='sre-123', stack='staging', max_parallel=1, logging=False,
+                             sites=[dict(spec, name='small-0'), dict(spec, name='small-1')])
+        first, second = small.sites.values()
+        self.assertEqual(second.distribution_depends_on, [fleet.logging_bucket, first.distribution])
+        self.assertEqual(first.distribution_depends_on, [fleet.logging_bucket])
+
+    def test_invalid(self):
+        with self.assertRaises(Exception):
+            WebSite('conflict', stack='staging', issue='sre-123', zones={},
+                    viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                    cache_policy=config.CachePolicy(), shared_resources=fleet.shared_resources)
+
+
+class TestFrozenConfig(unittest.TestCase):
+    def test_immutable(self):
+        behavior = config.CacheBehavior(target_origin_id='o')
+        with self.assertRaises(AttributeError):
+            behavior.path_pattern = '/docs/*'
+        with self.assertRaises(AttributeError):
+            config.CustomErrorResponse(404, 404, '/404.html').foo = 1
+        with self.assertRaises(TypeError):
+            behavior.replace(pattern='/docs/*')
+
+    def test_every_config_type_is_immutable(self):
+        origin = config.CustomOrigin('api', 'api.example.com', ['/api/*'])
+        values = [config.CachePolicy(query_strings=['v']), config.OriginRequestPolicy(headers=['Origin']),
+                  config.OriginGroup('group', 'primary', 'failover'), origin,
+                  config.LoggingConfig('logs', include_cookies=False, prefix='site/')]
+        for value in values:
+            with self.assertRaises(AttributeError):
+                value.comment = 'changed'
+        self.assertEqual(values[0].replace(max_ttl=60).query_strings, ('v',))
+        self.assertEqual(values[2].to_dict()['failoverCriteria']['statusCodes'], config.FAILOVER_STATUS_CODES)
+        with self.assertRaises(Exception):
+            origin.replace(connection_attempts=5)
+
+    def test_sequences_are_not_shared(self):
+        methods = ['GET', 'HEAD']
+        association = config.LambdaFunctionAssociation(config.LAMBDA_EVENT_TYPE_VIEWER_REQUEST, 'arn')
+        associations = [association]
+        behavior = config.CacheBehavior(allowed_methods=methods, lambda_function_associations=associations)
+        docs = behavior.with_path('/docs/*').replace(forwarded_values_headers=['Accept'])
+        methods.append('POST')
+        associations.append(association)
+        self.assertEqual((behavior.allowed_methods, len(behavior.lambda_function_associations)),
+                         (('GET', 'HEAD'), 1))
+        self.assertEqual(docs.forwarded_values_headers, ('Accept',))
+        with self.assertRaises(AttributeError):
+            docs.allowed_methods.append('POST')
+        self.assertEqual(docs.to_dict()['allowedMethods'], ['GET', 'HEAD'])
+        self.assertEqual(len(website.default_cache_behavior.lambda_function_associations), 0)
+
+    def test_derived_copies_share_values(self):
+        association = config.LambdaFunctionAssociation(config.LAMBDA_EVENT_TYPE_VIEWER_REQUEST, 'arn')
+        behavior = config.CacheBehavior(target_origin_id='o', lambda_function_associations=[association])
+        docs = behavior.with_path('/docs/*', 'docs')
+        self.assertEqual((docs.path_pattern, docs.target_origin_id), ('/docs/*', 'docs'))
+        self.assertEqual((behavior.path_pattern, behavior.target_origin_id), (None, 'o'))
+        self.assertIs(docs.lambda_function_associations, behavior.lambda_function_associations)
+        self.assertIs(docs.to_dict()['lambdaFunctionAssociations'][0], association.to_dict())
+        self.assertIs(behavior.to_dict(), behavior.to_dict())
+        self.assertIs(behavior.with_policies(), behavior)
+        self.assertEqual(behavior.with_policies(cache_policy_id='p').to_dict()['cachePolicyId'], 'p')
+        self.assertIs(copy.deepcopy(behavior), behavior)
+        restored = pickle.loads(pickle.dumps(docs))
+        self.assertEqual(restored.to_dict(), docs.to_dict())
+
+    def test_website_behaviors(self):
+        docs, default = policy_website.cache_behaviors[0], policy_website.default_cache_behavior
+        self.assertIs(docs.cache_policy_id, default.cache_policy_id)
+        self.assertIs(docs.allowed_methods, default.allowed_methods)
+        self.assertEqual(replicated_website.default_cache_behavior.target_origin_id, DEFAULT_ORIGIN_GROUP_ID)
+
+
+site_rules = functions.RequestRules([
+    functions.RedirectMap({'/old/': '/new/', '/gone': 'https://example.com/'}, preserve_query=False),
+    functions.RedirectMap({'/moved/': '/here/'}, status=302),
+    functions.TrailingSlashRedirect(),
+    functions.IndexRewrite(),
+    functions.NormalizeHeader('Accept-Language', ['de', 'en'], default='en'),
+    functions.NormalizeHeader('x-variant', ['a']),
+])
+
+rules_cases = [
+    functions.request('/old/', querystring={'a': '1'}),
+    functions.request('/gone'),
+    functions.request('/moved/', querystring={'a': '1', 'b': ''}),
+    functions.request('/docs', querystring={'q': 'x'}),
+    functions.request('/docs/'),
+    functions.request('/'),
+    functions.request('/app.js', headers={'Accept-Language': 'fr-FR, de;q=0.8', 'x-variant': 'b'}),
+    functions.request('/a.b/c.css', headers={'accept-language': 'EN', 'x-variant': 'A'}),
+]
+
+function_website = WebSite('functions',
+                           issue='sre-123',
+                           stack='staging',
+                           zones={
+                               'ABCDEF123': ['functions.jetbrains.com']
+                           },
+                           viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                           additional_buckets_mapping={'docs': '/docs/*'},
+                           function_associations=[config.FunctionAssociation(
+                               config.FUNCTION_EVENT_TYPE_VIEWER_REQUEST,
+                               site_rules.create_function('functions-staging-rules').arn)])
+
+
+class TestRequestRules(unittest.TestCase):
+    expected = [
+        {'statusCode': 301, 'location': '/new/'},
+        {'statusCode': 301, 'location': 'https://example.com/'},
+        {'statusCode': 302, 'location': '/here/?a=1&b='},
+        {'statusCode': 301, 'location': '/docs/?q=x'},
+        {'uri': '/docs/index.html', 'accept-language': 'en', 'x-variant': None},
+        {'uri': '/index.html', 'accept-language': 'en', 'x-variant': None},
+        {'uri': '/app.js', 'accept-language': 'de', 'x-variant': None},
+        {'uri': '/a.b/c.css', 'accept-language': 'en', 'x-variant': 'a'},
+    ]
+
+    @staticmethod
+    def summary(result):
+        if 'statusCode' in result:
+            return {'statusCode': result['statusCode'], 'location': result['headers']['location']['value']}
+        headers = result['headers']
+        return {'uri': result['uri'],
+                'accept-language': headers.get('accept-language', {}).get('value'),
+                'x-variant': headers.get('x-variant', {}).get('value')}
+
+    def test_evaluate(self):
+        self.assertEqual([self.summary(site_rules.evaluate(r)) for r in rules_cases], self.expected)
+        self.assertEqual(rules_cases[3]['uri'], '/docs')
+
+    @unittest.skipUnless(shutil.which('node'), 'needs node')
+    def test_generated_code_matches_evaluator(self):
+        script = site_rules.code() + f'''
+var cases = {json.dumps(rules_cases)};
+console.log(JSON.stringify(cases.map(function (r) {{ return handler({{request: r}}); }})));
+'''
+        output = subprocess.run(['node', '-e', script], check=True, stdout=subprocess.PIPE).stdout
+        results = json.loads(output)
+        self.assertEqual(results, [site_rules.evaluate(r) for r in rules_cases])
+
+    @unittest.skipUnless(shutil.which('node'), 'needs node')
+    def test_lambda_edge_code_matches_evaluator(self):
+        def edge_request(r):
+            return {'method': 'GET', 'uri': r['uri'],
+                    'querystring': '&'.join(f'{k}={v["value"]}' for k, v in r['querystring'].items()),
+                    'headers': {k: [{'key': k.title(), 'value': v['value']}] for k, v in r['headers'].items()}}
+
+        def edge_result(result):
+            if 'statusCode' in result:
+                return {'status': str(result['statusCode']), 'statusDescription': result['statusDescription'],
+                        'headers': {k: [{'key': k, 'value': v['value']}] for k, v in result['headers'].items()}}
+            return {'uri': result['uri'], 'headers': {k: v['value'] for k, v in result['headers'].items()}}
+
+        script = 'var exports = {};' + site_rules.lambda_edge_code() + f'''
+var cases = {json.dumps([edge_request(r) for r in rules_cases])};
+Promise.all(cases.map(function (r) {{ return exports.handler({{Records: [{{cf: {{request: r}}}}]}}); }}))
+    .then(function (results) {{ console.log(JSON.stringify(results)); }});
+'''
+        output = subprocess.run(['node', '-e', script], check=True, stdout=subprocess.PIPE).stdout
+        results = [r if 'status' in r else
+                   {'uri': r['uri'], 'headers': {k: v[0]['value'] for k, v in r['headers'].items()}}
+                   for r in json.loads(output)]
+        self.assertEqual(results, [edge_result(site_rules.evaluate(r)) for r in rules_cases])
+
+    def test_limits(self):
+        with self.assertRaises(Exception):
+            functions.TrailingSlashRedirect(status=404)
+        large = functions.RequestRules([functions.RedirectMap({f'/{i}/': f'/new/{i}/' for i in range(1000)})])
+        self.assertFalse(large.fits_function())
+        with self.assertRaises(Exception):
+            large.code()
+        self.assertIsInstance(large.create_association('large-rules'), config.LambdaFunctionAssociation)
+        self.assertIsInstance(site_rules.create_association('site-rules'), config.FunctionAssociation)
+        self.assertIn('lambda_function_associations',
+                      functions.association_args(config.LambdaFunctionAssociation('viewer-request', 'arn')))
+        with self.assertRaises(Exception):
+            config.FunctionAssociation('origin-request', 'arn')
+
+    def test_conflicting_viewer_request_associations(self):
+        behavior = config.CacheBehavior(lambda_function_associations=[
+            config.LambdaFunctionAssociation(config.LAMBDA_EVENT_TYPE_VIEWER_REQUEST, 'arn:lambda')])
+        function = config.FunctionAssociation(config.FUNCTION_EVENT_TYPE_VIEWER_REQUEST, 'arn:function')
+        with self.assertRaises(Exception):
+            behavior.replace(function_associations=[function])
+        with self.assertRaises(Exception):
+            WebSite('conflict', issue='sre-123', stack='staging', zones={},
+                    viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                    lambda_function_associations=list(behavior.lambda_function_associations),
+                    function_associations=[function])
+        viewer_response = config.FunctionAssociation(config.FUNCTION_EVENT_TYPE_VIEWER_RESPONSE, 'arn:function')
+        self.assertEqual(len(behavior.replace(function_associations=[viewer_response]).function_associations), 1)
+
+    def test_associations(self):
+        for behavior in [function_website.default_cache_behavior] + function_website.cache_behaviors:
+            self.assertEqual(behavior.to_dict()['functionAssociations'][0]['eventType'], 'viewer-request')
+        self.assertNotIn('functionAssociations', website.default_cache_behavior.to_dict())
+
+
+class TestMultipartUpload(unittest.TestCase):
+    part_size = multipart.MIN_PART_SIZE
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.s3 = FakeS3()
+        self.large = bytes(range(256)) * (self.part_size * 2 // 256) + b'tail'
+        write_files(self.dir.name, {'video.mp4': self.large, 'index.html': b'<html></html>'})
+        self.multipart = multipart.MultipartUpload(threshold=self.part_size, part_size=self.part_size,
+                                                   max_workers=3, state_dir=os.path.join(self.dir.name, '.state'))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def sync(self, **kwargs):
+        return sync.ContentSync('bucket', self.dir.name, client=self.s3, max_workers=4, multipart=self.multipart,
+                                exclude=['.state/*'], **kwargs).run()
+
+    def test_predicted_etag(self):
+        self.assertEqual(multipart.part_ranges(11, 5), [range(0, 5), range(5, 10), range(10, 11)])
+        self.assertEqual(self.multipart.part_size_for(self.part_size * 20000), self.part_size * 2)
+        result = self.sync()
+        self.assertEqual(result.uploaded, ['index.html', 'video.mp4'])
+        self.assertEqual(result.bytes_uploaded, len(self.large) + 13)
+        self.assertEqual(self.s3.objects[('bucket', 'video.mp4')][0], self.large)
+        self.assertEqual(self.s3.etags[('bucket', 'video.mp4')],
+                         self.multipart.etag(os.path.join(self.dir.name, 'video.mp4')))
+        self.assertEqual(self.s3.objects[('bucket', 'video.mp4')][1]['ContentType'], 'video/mp4')
+        self.assertEqual(sorted(c for c in self.s3.calls if c[0] == 'upload_part'),
+                         [('upload_part', 1), ('upload_part', 2), ('upload_part', 3)])
+
+    def test_unchanged_object_is_skipped_without_manifest(self):
+        self.sync()
+        del self.s3.objects[('bucket', sync.MANIFEST_KEY)]
+        self.s3.calls = []
+        result = self.sync()
+        self.assertEqual(result.bytes_uploaded, 13)
+        self.assertNotIn('upload_part', [c[0] for c in self.s3.calls])
+
+    def test_resume_uploads_missing_parts(self):
+        self.s3.failing_parts = {2}
+        with self.assertRaises(Exception):
+            self.sync()
+        self.assertEqual(len(self.s3.uploads), 1)
+        self.s3.calls = []
+        result = self.sync()
+        self.assertEqual(result.uploaded, ['video.mp4'])
+        self.assertEqual(result.bytes_uploaded, self.part_size)
+        self.assertEqual([c for c in self.s3.calls if c[0] == 'upload_part'], [('upload_part', 2)])
+        self.assertEqual(self.s3.objects[('bucket', 'video.mp4')][0], self.large)
+        self.assertEqual(self.s3.uploads, {})
+        self.assertEqual(os.listdir(os.path.join(self.dir.name, '.state')), [])
+
+
+dns_website = WebSite('dns',
+                      issue='sre-123',
+                      stack='staging',
+                      zones={
+                          'ZONE2': ['b.example.com', 'A.example.com.'],
+                          'ZONE1': ['a.example.com', 'a.example.com'],
+                      },
+                      viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                      latency_routing=dns.LatencyRouting('eu-west-1', health_check_id='check-1'))
+
+
+class TestAliasRecords(unittest.TestCase):
+    def test_records(self):
+        records = dns.alias_records({'ZONE2': ['b.example.com', 'A.example.com.'], 'ZONE1': ['a.example.com']})
+        self.assertEqual([r.resource_name for r in records], [
+            'a.example.com-A-ZONE1', 'a.example.com-AAAA-ZONE1',
+            'a.example.com-A-ZONE2', 'a.example.com-AAAA-ZONE2',
+            'b.example.com-A-ZONE2', 'b.example.com-AAAA-ZONE2',
+        ])
+        self.assertEqual([r.previous_name for r in records],
+                         ['a.example.com-record-2', None, 'A.example.com.-record-1', None, 'b.example.com-record-0', None])
+        args = records[1].record_args('d123.cloudfront.net', 'Z2FDTNDATAQYW2')
+        self.assertEqual(args, {'zone_id': 'ZONE1', 'name': 'a.example.com', 'type': 'AAAA', 'aliases': [{
+            'evaluateTargetHealth': False, 'name': 'd123.cloudfront.net', 'zone_id': 'Z2FDTNDATAQYW2'}]})
+        self.assertEqual([r.type for r in dns.alias_records({'ZONE1': ['a.example.com']}, ipv6=False)], ['A'])
+
+    def test_stable_and_unique_for_many_domains(self):
+        zones = {f'ZONE{z}': [f'site-{i}.zone{z}.example.com' for i in range(1000)] for z in range(5)}
+        zones['ZONE0'] += zones['ZONE0'][:100]
+        records = dns.alias_records(zones)
+        self.assertEqual(len(records), 10000)
+        self.assertEqual(len({r.resource_name for r in records}), 10000)
+        reordered = {z: list(reversed(domains)) for z, domains in reversed(list(zones.items()))}
+        self.assertEqual([r.resource_name for r in dns.alias_records(reordered)], [r.resource_name for r in records])
+        self.assertEqual(len(dns.unique_domains(zones)), 5000)
+
+    def test_latency_routing(self):
+        latency = dns.LatencyRouting('eu-west-1', health_check_id='check-1')
+        record = dns.alias_records({'ZONE1': ['a.example.com']}, latency_routing=latency)[0]
+        self.assertEqual(record.resource_name, 'a.example.com-A-ZONE1-eu-west-1')
+        args = record.record_args('d123.cloudfront.net', 'Z2FDTNDATAQYW2')
+        self.assertEqual(args['set_identifier'], 'eu-west-1')
+        self.assertEqual(args['latency_routing_policies'], [{'region': 'eu-west-1'}])
+        self.assertEqual(args['health_check_id'], 'check-1')
+
+    @pulumi.runtime.test
+    def test_website_records(self):
+        self.assertEqual(dns_website.aliases, ['b.example.com', 'a.example.com'])
+
+        def check(args):
+            types, names, policies = args
+            self.assertEqual(types, ['A', 'AAAA'] * 3)
+            self.assertEqual(names, ['a.example.com', 'a.example.com', 'a.example.com', 'a.example.com',
+                                     'b.example.com', 'b.example.com'])
+            self.assertEqual(policies[0], [{'region': 'eu-west-1'}])
+
+        return pulumi.Output.all(pulumi.Output.all(*[r.type for r in dns_website.records]),
+                                 pulumi.Output.all(*[r.name for r in dns_website.records]),
+                                 pulumi.Output.all(*[r.latency_routing_policies for r in dns_website.records])
+                                 ).apply(check)
+
+
+class StepClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1000
+        return self.now
+
+
+tracer = tracing.Tracer(clock=StepClock())
+traced_website = WebSite('traced',
+                         issue='sre-123',
+                         stack='staging',
+                         zones={'ABCDEF123': ['traced.example.com']},
+                         viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                         additional_buckets_mapping={'docs': '/docs/*'},
+                         tracer=tracer)
+
+
+class TestTracing(unittest.TestCase):
+    @pulumi.runtime.test
+    def test_spans(self):
+        self.assertEqual([s.name for s in tracer.spans],
+                         ['create_bucket', 'create_bucket', 'create_cloudfront', 'create_record', 'create_record'])
+        self.assertEqual(tracer.spans[1].attributes, {'website': 'traced-staging', 'bucket': 'website-traced-staging-docs'})
+        self.assertEqual(tracer.spans[4].attributes['record'], 'traced.example.com-AAAA-ABCDEF123')
+
+        def check(_):
+            for span in tracer.spans:
+                self.assertGreater(span.registration_ms, 0)
+                self.assertGreaterEqual(span.resolution_ms, span.registration_ms)
+            rows = {r['name']: r for r in tracer.summary()}
+            self.assertEqual(rows['create_bucket']['count'], 2)
+            self.assertEqual(rows['create_record']['unresolved'], 0)
+            self.assertIn('create_cloudfront', tracer.format_summary())
+
+            with tempfile.TemporaryDirectory() as d:
+                tracer.write(os.path.join(d, 'trace.json'))
+                with open(os.path.join(d, 'trace.json')) as f:
+                    events = json.load(f)['traceEvents']
+            self.assertEqual(sorted({e['ph'] for e in events}), ['M', 'X', 'b', 'e'])
+            self.assertEqual(len([e for e in events if e['ph'] == 'X']), 5)
+
+            otlp = tracer.to_otlp()['resourceSpans'][0]
+            self.assertEqual(otlp['resource']['attributes'],
+                             [{'key': 'service.name', 'value': {'stringValue': 'pulumi-aws-website'}}])
+            spans = otlp['scopeSpans'][0]['spans']
+            self.assertEqual(len(spans), 5)
+            self.assertEqual({len(s['traceId']) for s in spans}, {32})
+            self.assertTrue(all(int(s['endTimeUnixNano']) > int(s['startTimeUnixNano']) for s in spans))
+
+        return tracer.finished().apply(check)
+
+    def test_nesting_and_disabled(self):
+        nested = tracing.Tracer(clock=StepClock())
+        with nested.span('outer') as outer:
+            with nested.span('inner', n=1) as inner:
+                pass
+        self.assertEqual(inner.parent_id, outer.span_id)
+        self.assertEqual((outer.registration_ms, inner.registration_ms), (0.003, 0.001))
+        self.assertEqual(nested.to_otlp()['resourceSpans'][0]['scopeSpans'][0]['spans'][1]['attributes'],
+                         [{'key': 'n', 'value': {'intValue': '1'}}])
+        with tracing.optional_span(None, 'off') as span:
+            span.track(pulumi.Output.from_input(1))
+        self.assertIsNone(span.resolved_ns)
+
+    def test_default_clock(self):
+        self.assertAlmostEqual(tracing.Tracer().clock() / 1e9, time.time(), delta=1)
+
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def image_bytes(image_format, width, height):
+    # a gradient, so encoders have something to compress
+    image = PILImage.linear_gradient('L').resize((width, height)).convert('RGB')
+    out = io.BytesIO()
+    image.save(out, format=image_format, quality=95)
+    return out.getvalue()
+
+
+@unittest.skipUnless(PILImage, 'needs Pillow')
+class TestImageVariants(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        write_files(self.dir.name, {
+            'src/img/photo.jpg': image_bytes('JPEG', 800, 600),
+            'src/logo.png': image_bytes('PNG', 300, 100),
+            'src/icon.png': b'\x89PNG tiny',
+            'src/index.html': b'<img src="/img/photo.jpg">',
+        })
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def process(self):
+        stage = images.ImageVariants(formats=['webp'], widths=[400, 1000], cache_dir=os.path.join(self.dir.name, 'cache'),
+                                     min_size=100, max_workers=1)
+        objects = sync.scan_directory(os.path.join(self.dir.name, 'src'))
+        return stage, {o.key: o for o in stage.process(objects)}
+
+    def test_variants(self):
+        stage, objects = self.process()
+        self.assertEqual(sorted(stage.variants), ['icon.png.webp', 'img/photo-400w.jpg', 'img/photo-400w.jpg.webp',
+                                                  'img/photo.jpg.webp', 'logo.png.webp'])
+        self.assertEqual(stage.responsive, {'img/photo.jpg': {400: 'img/photo-400w.jpg'}})
+        self.assertEqual(objects['img/photo.jpg.webp'].headers['Content-Type'], 'image/webp')
+        self.assertEqual(objects['img/photo-400w.jpg'].headers['Content-Type'], 'image/jpeg')
+        with PILImage.open(objects['img/photo-400w.jpg.webp'].path) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (400, 300)))
+        # too small to encode, the variant key holds the original
+        self.assertEqual(objects['icon.png.webp'].md5, objects['icon.png'].md5)
+        self.assertEqual(objects['icon.png.webp'].headers['Content-Type'], 'image/png')
+        report = stage.report
+        self.assertEqual((report.images, report.variants, report.encoded), (3, 5, 4))
+        self.assertEqual(report.original_bytes, objects['img/photo.jpg'].size + objects['logo.png'].size + 9)
+        self.assertGreater(report.saved_bytes, 0)
+        self.assertIn('bytes saved', report.format())
+
+    def test_cache_is_reused(self):
+        _, first = self.process()
+        mtime = os.path.getmtime(first['img/photo.jpg.webp'].path)
+        stage, second = self.process()
+        self.assertEqual(stage.report.encoded, 0)
+        self.assertEqual(os.path.getmtime(second['img/photo.jpg.webp'].path), mtime)
+        self.assertEqual(second['img/photo.jpg.webp'].fingerprint, first['img/photo.jpg.webp'].fingerprint)
+
+
+class TestImageNegotiation(unittest.TestCase):
+    rules = functions.RequestRules([images.ImageNegotiation(), functions.IndexRewrite()])
+    cases = [
+        functions.request('/img/photo.jpg', headers={'Accept': 'image/avif,image/webp,*/*'}),
+        functions.request('/img/photo-400w.JPG', headers={'Accept': 'image/webp;q=0.9, */*'}),
+        functions.request('/logo.png', headers={'Accept': '*/*'}),
+        functions.request('/logo.png'),
+        functions.request('/app.js', headers={'Accept': 'image/avif'}),
+        functions.request('/docs/'),
+    ]
+    expected = ['/img/photo.jpg.avif', '/img/photo-400w.JPG.webp', '/logo.png', '/logo.png', '/app.js',
+                '/docs/index.html']
+
+    def test_evaluate(self):
+        self.assertEqual([self.rules.evaluate(r)['uri'] for r in self.cases], self.expected)
+        self.assertEqual(images.select_variant('/a.png', 'image/avif, image/webp', ['webp']), '/a.png.webp')
+
+    @unittest.skipUnless(shutil.which('node'), 'needs node')
+    def test_generated_code_matches_evaluator(self):
+        script = self.rules.code() + f'''
+var cases = {json.dumps(self.cases)};
+console.log(JSON.stringify(cases.map(function (r) {{ return handler({{request: r}}).uri; }})));
+'''
+        output = subprocess.run(['node', '-e', script], check=True, stdout=subprocess.PIPE).stdout
+        self.assertEqual(json.loads(output), self.expected)
+
+    def test_cache_behavior(self):
+        behavior = images.cache_behavior(config.CacheBehavior(path_pattern='/img/*'), 'arn:function', 'policy-id')
+        self.assertEqual(behavior.to_dict()['functionAssociations'],
+                         [{'eventType': 'viewer-request', 'functionArn': 'arn:function'}])
+        self.assertFalse(behavior.forwarded_values_query_string)
+        self.assertEqual(behavior.response_headers_policy_id, 'policy-id')
+
+    @pulumi.runtime.test
+    def test_vary_accept(self):
+        ws = WebSite('negotiated', issue='sre-123', stack='staging', zones={},
+                     viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                     cache_policy=config.CachePolicy(enable_accept_encoding_brotli=True),
+                     precompressed=True, image_negotiation=True)
+
+        def check(items):
+            self.assertEqual(items[0]['value'], 'Accept, Accept-Encoding')
+
+        self.assertIs(ws.default_cache_behavior.response_headers_policy_id, ws.response_headers_policy.id)
+        return ws.response_headers_policy.custom_headers_config.apply(lambda c: check(c['items']))
+
+
+lint_website = WebSite('lint',
+                       issue='sre-123',
+                       stack='staging',
+                       zones={'ABCDEF123': ['lint.example.com']},
+                       viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),
+                       lambda_function_associations=[config.LambdaFunctionAssociation('viewer-request', 'arn:lambda')],
+                       additional_buckets_mapping={'docs': '/docs/*'},
+                       default_cache_behavior=config.CacheBehavior(forwarded_values_headers=['User-Agent'],
+                                                                   compress=False),
+                       custom_origins=[api_origin])
+
+
+# content that outlives the max_ttl of the default CacheBehavior
+long_lived_rules = [fingerprint.CacheControlRule('*.js', 'public, max-age=31536000, immutable')]
+
+
+class TestLint(unittest.TestCase):
+    def findings(self, records=None):
+        return {(f.rule, f.behavior): f for f in lint.lint_website(lint_website, records, long_lived_rules)}
+
+    def test_findings(self):
+        findings = self.findings()
+        self.assertEqual(sorted(findings), [
+            ('compress', '/docs/*'),
+            ('compress', 'default'),
+            ('headers', '/docs/*'),
+            ('headers', 'default'),
+            ('lambda-copies', '/docs/*'),
+            ('query-string', '/docs/*'),
+            ('query-string', 'default'),
+            ('ttl', '/docs/*'),
+            ('ttl', 'default'),
+        ])
+        self.assertIn('max_ttl=86400', findings[('ttl', 'default')].message)
+        self.assertEqual(findings[('lambda-copies', '/docs/*')].severity, lint.SEVERITY_INFO)
+        self.assertEqual({f.rule for f in lint.lint_website(policy_website, cache_control_rules=long_lived_rules)},
+                         {lint.RULE_TTL})
+        self.assertEqual(lint.lint_website(policy_website), [])
+        self.assertIn('default: compress: compress=False', lint.format_findings(list(findings.values())))
+
+    def test_impact(self):
+        lines = [
+            log_line('/index.html', query='utm_source=a', **{'cs(User-Agent)': 'firefox'}),
+            log_line('/index.html', query='utm_source=b', **{'cs(User-Agent)': 'chrome'}),
+            log_line('/index.html', query='-', **{'cs(User-Agent)': 'chrome', 'date': '2026-10-19'}),
+            log_line('/index.html', query='-', **{'cs(User-Agent)': 'chrome', 'date': '2026-10-19',
+                                                  'time': '11:00:00',
+                                                  'sc-content-type': 'text/html'}),
+            log_line('/docs/a.html', query='-', edge='FRA2-C1', time='10:00:00'),
+            log_line('/docs/a.html', query='-', edge='FRA2-C1', time='11:00:00'),
+            log_line('/api/users', query='page=1'),
+        ]
+        findings = self.findings(logs.parse_records(lines))
+        query = findings[('query-string', 'default')].impact
+        self.assertEqual((query.requests, query.cache_keys, query.fixed_cache_keys), (4, 3, 1))
+        self.assertEqual((query.hit_ratio, query.fixed_hit_ratio), (0.25, 0.75))
+        headers = findings[('headers', 'default')].impact
+        self.assertEqual((headers.cache_keys, headers.fixed_cache_keys), (2, 1))
+        self.assertEqual(findings[('ttl', 'default')].impact.to_dict(),
+                         {'requests': 4, 'hit_ratio': 0.5, 'fixed_hit_ratio': 0.75})
+        self.assertEqual(findings[('ttl', '/docs/*')].impact.fixed_hit_ratio, 0.5)
+        self.assertEqual(findings[('compress', 'default')].impact.note, '100 of 400 bytes had a compressible content type')
+        self.assertEqual(findings[('lambda-copies', '/docs/*')].impact.note, '2 Lambda@Edge viewer invocations')
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as d:
+            program = os.path.join(d, '__main__.py')
+            with open(program, 'w') as f:
+                f.write('from pulumi_aws_website import WebSite, config\n'
+                        'site = WebSite("cli", stack="staging", issue="sre-123", zones={},\n'
+                        '               viewer_certificate=config.ViewerCertificate(cloudfront_default_certificate=True),\n'
+                        '               default_cache_behavior=config.CacheBehavior(compress=False))\n')
+            with open(os.path.join(d, 'log.gz'), 'wb') as f:
+                f.write(gzip_log([log_line('/a.css', **{'sc-content-type': 'text/css'})]))
+            out = io.StringIO()
+            with unittest.mock.patch('sys.stdout', out), self.assertRaises(SystemExit):
+                lint.main([program, '--logs', os.path.join(d, 'log.gz'), '--json'])
+            pulumi.runtime.set_mocks(MyMocks())
+        result = json.loads(out.getvalue())
+        self.assertEqual(sorted(f['rule'] for f in result['site']), ['compress', 'query-string'])
+        self.assertEqual(result['site'][0]['impact']['requests'], 1)
+
+
+@unittest.skipUnless(numpy, 'needs numpy')
+class TestSimulate(unittest.TestCase):
+    def setUp(self):
+        self.simulator = simulate.Simulator(routing.BehaviorIndex.from_website(lint_website),
+                                            [fingerprint.CacheControlRule('*.css', 'public, max-age=60')])
+
+    def trace(self, requests):
+        paths = sorted({path for _, path, _ in requests})
+        edges = sorted({edge for _, _, edge in requests})
+        return simulate.Trace(times=numpy.array([t * 1000 for t, _, _ in requests], dtype=numpy.int64),
+                              keys=numpy.array([paths.index(p) for _, p, _ in requests], dtype=numpy.int32),
+                              edge_ids=numpy.array([edges.index(e) for _, _, e in requests], dtype=numpy.int16),
+                              paths=paths,
+                              sizes=numpy.full(len(paths), 10, dtype=numpy.int64),
+                              edges=edges)
+
+    def test_ttl(self):
+        self.assertEqual(self.simulator.resolve(['/index.html', '/a.css', '/api/users'])[1].tolist(),
+                         [3600000, 60000, 0])
+        requests = [(0, '/a.css', 'IAD'), (30, '/a.css', 'IAD'), (30, '/a.css', 'FRA'), (60, '/a.css', 'IAD'),
+                    (61, '/index.html', 'IAD'), (62, '/index.html', 'IAD'),
+                    (63, '/api/users', 'IAD'), (63, '/api/users', 'IAD')]
+        result = self.simulator.run(self.trace(requests), interval=30)
+        self.assertEqual(result.requests.tolist(), [1, 2, 5])
+        self.assertEqual(result.origin_requests.tolist(), [1, 1, 4])
+        self.assertEqual(result.origin_bytes.tolist(), [10, 10, 40])
+        self.assertEqual(result.hit_ratio, 0.25)
+        self.assertEqual(result.behaviors['/api/*'], {'requests': 2, 'origin_requests': 2, 'origin_bytes': 20})
+        self.assertEqual(result.s3_request_cost(price_per_1000=1000), 6)
+
+    def test_invalidations(self):
+        requests = [(0, '/index.html', 'IAD'), (0, '/docs/a.html', 'IAD'),
+                    (20, '/index.html', 'IAD'), (20, '/docs/a.html', 'IAD'),
+                    (40, '/index.html', 'IAD'), (40, '/docs/a.html', 'IAD')]
+        trace = self.trace(requests)
+        self.assertEqual(self.simulator.run(trace).origin_requests.sum(), 2)
+        self.assertEqual(self.simulator.run(trace, [simulate.Invalidation(10, ['/docs/*'])]).origin_requests.sum(), 3)
+        result = self.simulator.run(trace, [simulate.Invalidation(10, ['/docs/*']), simulate.Invalidation(30, ['/*'])])
+        self.assertEqual(result.origin_requests.sum(), 5)
+
+    def test_shards(self):
+        trace = simulate.zipf_trace(20000, objects=500, duration=600, edges=5, seed=3)
+        self.assertTrue(numpy.all(numpy.diff(trace.times) >= 0))
+        invalidations = [simulate.Invalidation(300, ['/objects/1*'])]
+        result = self.simulator.run(trace, invalidations)
+        sharded = simulate.Simulator(self.simulator.index, shard_size=3000).run(trace, invalidations)
+        self.assertEqual(result.origin_requests.tolist(), sharded.origin_requests.tolist())
+        self.assertTrue(0.5 < result.hit_ratio < 1)
+        self.assertEqual(result.to_dict()['requests'], 20000)
+
+    def test_from_records(self):
+        trace = simulate.Trace.from_records(logs.parse_records([
+            log_line('/b.html', edge='FRA2-C1', sc_bytes=50, time='10:00:05'),
+            log_line('/a.html', edge='IAD89-C1', time='10:00:00'),
+            log_line('/b.html', edge='FRA50-C2', sc_bytes=70, time='10:00:10'),
+        ]))
+        self.assertEqual(trace.times.tolist(), [0, 5000, 10000])
+        self.assertEqual([trace.paths[k] for k in trace.keys], ['/a.html', '/b.html', '/b.html'])
+        self.assertEqual([trace.edges[e] for e in trace.edge_ids], ['IAD', 'FRA', 'FRA'])
+        self.assertEqual(trace.sizes.tolist(), [70, 100])
+        self.assertEqual(self.simulator.run(trace).origin_requests.sum(), 2)
@@ -0,0 +1,228 @@
+"""
+Spans around the resources a WebSite registers, with the time until their Outputs resolved, so a slow
+update shows whether the time goes to the buckets, the distribution or the records.
+
+    tracer = tracing.Tracer()
+    website = WebSite('my-site', ..., tracer=tracer)
+
+    def export(_):
+        tracer.write('trace.json')
+        pulumi.log.info(tracer.format_summary())
+
+    tracer.finished().apply(export)
+
+write() produces a Chrome trace (chrome://tracing, Perfetto) or OTLP/JSON, see FORMAT_CHROME and FORMAT_OTLP.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pulumi
+
+FORMAT_CHROME = 'chrome'
+FORMAT_OTLP = 'otlp'
+SCOPE_NAME = 'pulumi_aws_website'
+
+
+def wall_clock_ns() -> int:
+    """
+    Nanoseconds since the epoch, time.time_ns needs Python 3.7
+    """
+    return int(time.time() * 1e9)
+
+
+class Span:
+    """
+    Registration is the time the resources took to be declared, resolution the time from the start of the
+    span until its Outputs resolved, which includes the provider work during an update
+    """
+    name: str
+    attributes: Dict
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int]
+    resolved_ns: Optional[int]
+
+    def __init__(self, name: str, attributes: Dict, span_id: str, parent_id: Optional[str], start_ns: int,
+                 tracer: 'Tracer' = None):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns = None
+        self.resolved_ns = None
+        self._tracer = tracer
+
+    def track(self, *outputs: pulumi.Output):
+        """
+        Records when every one of outputs resolved, see Tracer.track
+        """
+        if self._tracer is not None:
+            self._tracer.track(self, *outputs)
+
+    @property
+    def registration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def resolution_ms(self) -> Optional[float]:
+        return None if self.resolved_ns is None else (self.resolved_ns - self.start_ns) / 1e6
+
+    def __repr__(self):
+        return f'Span({self.name!r}, {self.attributes!r})'
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # int64 is a string in OTLP/JSON
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    return [{'key': k, 'value': _otlp_value(v)} for k, v in attributes.items()]
+
+
+class Tracer:
+    """
+    Collects the spans of one or more WebSites. Outputs resolve only while the Pulumi program runs,
+    export after finished() resolved or at the end of a pulumi.runtime.test.
+    """
+    service_name: str
+    spans: List[Span]
+
+    def __init__(self, service_name: str = 'pulumi-aws-website', clock: Callable[[], int] = None):
+        """
+        :param clock: Wall clock in nanoseconds since the epoch, wall_clock_ns by default
+        """
+        self.service_name = service_name
+        self.clock = clock if clock is not None else wall_clock_ns
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self._stack = []
+        self._pending = []
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """
+        Span around the registration of resources, nested spans get it as parent
+        """
+        span = Span(name, attributes, os.urandom(8).hex(), self._stack[-1].span_id if self._stack else None,
+                    self.clock(), tracer=self)
+        self.spans.append(span)
+        self._stack.append(span)
+        try:
+            yield span
+        finally:
+            self._stack.pop()
+            span.end_ns = self.clock()
+
+    def track(self, span: Span, *outputs: pulumi.Output):
+        """
+        Records when every one of outputs resolved. During preview unknown Outputs never resolve.
+        """
+        def resolved(_):
+            span.resolved_ns = self.clock()
+
+        self._pending.append(pulumi.Output.all(*outputs).apply(resolved))
+
+    def finished(self) -> pulumi.Output:
+        """
+        Output resolving after every tracked Output resolved
+        """
+        return pulumi.Output.all(*self._pending)
+
+    def to_chrome_trace(self) -> Dict:
+        """
+        Registration spans are complete events on the main track, resolutions async events on their own tracks
+        """
+        if not self.spans:
+            return {'traceEvents': []}
+        origin = min(s.start_ns for s in self.spans)
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': self.service_name}}]
+        for span in self.spans:
+            if span.end_ns is not None:
+                events.append({'name': span.name, 'cat': 'registration', 'ph': 'X', 'pid': 1, 'tid': 1,
+                               'ts': (span.start_ns - origin) / 1e3, 'dur': (span.end_ns - span.start_ns) / 1e3,
+                               'args': span.attributes})
+            if span.resolved_ns is not None:
+                for phase, ns in (('b', span.start_ns), ('e', span.resolved_ns)):
+                    events.append({'name': span.name, 'cat': 'resolution', 'ph': phase, 'pid': 1, 'tid': 1,
+                                   'id': span.span_id, 'ts': (ns - origin) / 1e3, 'args': span.attributes})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_otlp(self) -> Dict:
+        """
+        ExportTraceServiceRequest in OTLP/JSON, a span lasts until its Outputs resolved and has a 'registered' event
+        """
+        spans = []
+        for span in self.spans:
+            end_ns = max(t for t in (span.end_ns, span.resolved_ns, span.start_ns) if t is not None)
+            otlp = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(end_ns),
+                'attributes': _otlp_attributes(span.attributes),
+                'events': [] if span.end_ns is None else [
+                    {'timeUnixNano': str(span.end_ns), 'name': 'registered', 'attributes': []}],
+            }
+            if span.parent_id is not None:
+                otlp['parentSpanId'] = span.parent_id
+            spans.append(otlp)
+        return {'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': self.service_name})},
+            'scopeSpans': [{'scope': {'name': SCOPE_NAME}, 'spans': spans}],
+        }]}
+
+    def write(self, path: str, format: str = FORMAT_CHROME):
+        data = {FORMAT_CHROME: self.to_chrome_trace, FORMAT_OTLP: self.to_otlp}[format]()
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    def summary(self) -> List[Dict]:
+        """
+        Spans grouped by name in order of the total resolution time
+        """
+        rows = {}
+        for span in self.spans:
+            row = rows.setdefault(span.name, {'name': span.name, 'count': 0, 'registration_ms': 0.0,
+                                              'resolution_ms': 0.0, 'max_resolution_ms': 0.0, 'unresolved': 0})
+            row['count'] += 1
+            row['registration_ms'] += span.registration_ms or 0.0
+            if span.resolution_ms is None:
+                row['unresolved'] += 1
+            else:
+                row['resolution_ms'] += span.resolution_ms
+                row['max_resolution_ms'] = max(row['max_resolution_ms'], span.resolution_ms)
+        return sorted(rows.values(), key=lambda r: (-r['resolution_ms'], r['name']))
+
+    def format_summary(self) -> str:
+        lines = [f'{"span":<24} {"count":>6} {"register ms":>12} {"resolve ms":>12} {"max resolve ms":>15} '
+                 f'{"unresolved":>10}']
+        for row in self.summary():
+            lines.append(f'{row["name"]:<24} {row["count"]:>6} {row["registration_ms"]:>12.1f} '
+                         f'{row["resolution_ms"]:>12.1f} {row["max_resolution_ms"]:>15.1f} {row["unresolved"]:>10}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def optional_span(tracer: Optional[Tracer], name: str, **attributes) -> Iterator[Span]:
+    """
+    tracer.span(), or a span which records nothing when tracing is off
+    """
+    if tracer is None:
+        yield Span(name, attributes, '', None, 0)
+    else:
+        with tracer.span(name, **attributes) as span:
+            yield span
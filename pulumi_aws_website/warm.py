@@ -0,0 +1,339 @@
+"""
+Post-deploy cache warmer: requests changed paths through every alias of a distribution and every
+Accept-Encoding variant the cache key distinguishes, so the first viewers after a deploy get cache hits.
+
+    website-warm --host www.example.com --sitemap https://www.example.com/sitemap.xml --rate 50
+"""
+import argparse
+import asyncio
+import json
+import ssl
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+from typing import Callable, Dict, Iterable, List, Tuple
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+from pulumi_aws_website.config import DEFAULT_ROOT_OBJECT
+from pulumi_aws_website.invalidation import key_to_paths
+from pulumi_aws_website.logs import LatencyHistogram
+
+DEFAULT_ENCODINGS = ['br', 'gzip', 'identity']
+DEFAULT_CONNECTIONS_PER_HOST = 8
+DEFAULT_TIMEOUT = 30
+SITEMAP_NAMESPACE = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+USER_AGENT = 'pulumi-aws-website-warmer'
+
+
+def paths_for_keys(keys: Iterable[str], default_root_object: str = DEFAULT_ROOT_OBJECT) -> List[str]:
+    """
+    Viewer paths of object keys, for example SyncResult.changed_keys
+    """
+    paths = []
+    seen = set()
+    for key in keys:
+        for path in key_to_paths(key, default_root_object):
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def parse_sitemap(data: bytes) -> List[str]:
+    """
+    Paths of the <loc> entries of a sitemap, nested sitemap indexes are not followed
+    """
+    root = ElementTree.fromstring(data)
+    paths = []
+    for loc in root.iter(f'{SITEMAP_NAMESPACE}loc'):
+        url = urlsplit(loc.text.strip())
+        paths.append((url.path or '/') + (f'?{url.query}' if url.query else ''))
+    return paths
+
+
+def load_sitemap(source: str) -> List[str]:
+    if '://' in source:
+        with urlopen(source, timeout=DEFAULT_TIMEOUT) as response:
+            return parse_sitemap(response.read())
+    with open(source, 'rb') as f:
+        return parse_sitemap(f.read())
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all requests, rate requests per second with bursts of up to burst requests
+    """
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'size')
+
+    def __init__(self, status: int, headers: Dict[str, str], size: int):
+        self.status = status
+        self.headers = headers
+        self.size = size
+
+
+class HostPool:
+    """
+    Keep-alive HTTP/1.1 connections to one host, at most max_connections requests in flight
+    """
+    def __init__(self, scheme: str, host: str, max_connections: int, timeout: float):
+        self.scheme = scheme
+        self.hostname, _, port = host.partition(':')
+        self.host = host
+        self.port = int(port) if port else (443 if scheme == 'https' else 80)
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.idle = []
+        self.opened = 0
+
+    async def _connect(self):
+        self.opened += 1
+        if self.scheme == 'https':
+            return await asyncio.open_connection(self.hostname, self.port, ssl=ssl.create_default_context(),
+                                                 server_hostname=self.hostname)
+        return await asyncio.open_connection(self.hostname, self.port)
+
+    async def get(self, path: str, headers: Dict[str, str]) -> Response:
+        async with self.semaphore:
+            connection = self.idle.pop() if self.idle else await self._connect()
+            try:
+                response, keep_alive = await asyncio.wait_for(self._request(connection, path, headers),
+                                                              self.timeout)
+            except BaseException:
+                connection[1].close()
+                raise
+            if keep_alive:
+                self.idle.append(connection)
+            else:
+                connection[1].close()
+            return response
+
+    async def _request(self, connection, path: str, headers: Dict[str, str]) -> Tuple[Response, bool]:
+        reader, writer = connection
+        lines = [f'GET {path} HTTP/1.1', f'Host: {self.host}', f'User-Agent: {USER_AGENT}']
+        lines += [f'{k}: {v}' for k, v in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by the server')
+        version, status = status_line.decode('latin-1').split()[:2]
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            size = 0
+            while True:
+                chunk_size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(chunk_size + 2)
+                size += chunk_size
+                if chunk_size == 0:
+                    break
+        elif 'content-length' in response_headers:
+            size = int(response_headers['content-length'])
+            await reader.readexactly(size)
+        else:
+            size = len(await reader.read())
+            keep_alive = False
+        return Response(int(status), response_headers, size), keep_alive
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+class WarmReport:
+    requests: int
+    errors: int
+    bytes: int
+    statuses: Dict[int, int]
+    x_cache: Dict[str, int]
+    latency: Dict[str, LatencyHistogram]
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.statuses = {}
+        self.x_cache = {}
+        self.latency = {}
+        self.failures = []
+        self.elapsed = 0.0
+
+    def add(self, encoding: str, response: Response, ms: float):
+        self.requests += 1
+        self.bytes += response.size
+        self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+        x_cache = response.headers.get('x-cache', '-')
+        self.x_cache[x_cache] = self.x_cache.get(x_cache, 0) + 1
+        self.latency.setdefault(encoding, LatencyHistogram()).add(ms)
+
+    def to_dict(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'elapsed': self.elapsed,
+            'statuses': {str(k): v for k, v in sorted(self.statuses.items())},
+            'x_cache': self.x_cache,
+            'latency': {e: {f'p{p}': h.percentile(p) for p in (50, 90, 99)} for e, h in self.latency.items()},
+            'failures': self.failures[:100],
+        }
+
+    def format(self) -> str:
+        lines = [f'{self.requests} requests, {self.errors} errors, {self.bytes} bytes in {self.elapsed:.1f}s',
+                 'status ' + ' '.join(f'{k}={v}' for k, v in sorted(self.statuses.items())),
+                 'x-cache ' + ', '.join(f'{k}={v}' for k, v in sorted(self.x_cache.items()))]
+        lines.append(f'{"encoding":<10} {"count":>8} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9}')
+        for encoding, h in sorted(self.latency.items()):
+            lines.append(f'{encoding:<10} {h.count:>8} {h.percentile(50):>9.1f} {h.percentile(90):>9.1f} '
+                         f'{h.percentile(99):>9.1f}')
+        return '\n'.join(lines)
+
+
+class Warmer:
+    """
+    Requests every path on every host once per Accept-Encoding variant, with a per-host connection cap
+    and a global rate limit
+    """
+    hosts: List[str]
+    encodings: List[str]
+
+    def __init__(self, hosts: List[str], encodings: List[str] = None, scheme: str = 'https',
+                 connections_per_host: int = DEFAULT_CONNECTIONS_PER_HOST, rate: float = None,
+                 timeout: float = DEFAULT_TIMEOUT, progress: Callable[[int, int], None] = None):
+        """
+        :param hosts: Host names, with an optional port, for example WebSite.aliases
+        :param encodings: Accept-Encoding values, one request per value. Use the encodings the cache policy
+            normalizes, every value is a separate cache entry
+        :param connections_per_host: Keep-alive connections, and requests in flight, per host
+        :param rate: Requests per second over all hosts, unlimited by default
+        :param progress: Called with (done, total) after every request
+        """
+        self.hosts = hosts
+        self.encodings = encodings if encodings is not None else DEFAULT_ENCODINGS
+        self.scheme = scheme
+        self.connections_per_host = connections_per_host
+        self.rate = rate
+        self.timeout = timeout
+        self.progress = progress
+
+    async def warm_async(self, paths: List[str]) -> WarmReport:
+        report = WarmReport()
+        pools = {h: HostPool(self.scheme, h, self.connections_per_host, self.timeout) for h in self.hosts}
+        limiter = RateLimiter(self.rate, burst=max(1, int(self.rate))) if self.rate else None
+        total = len(paths) * len(self.hosts) * len(self.encodings)
+        started = time.perf_counter()
+        done = 0
+
+        async def fetch(pool: HostPool, path: str, encoding: str):
+            nonlocal done
+            if limiter is not None:
+                await limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = await pool.get(path, {'Accept-Encoding': encoding})
+            except (OSError, asyncio.TimeoutError, ValueError, asyncio.IncompleteReadError) as e:
+                report.errors += 1
+                report.failures.append(f'{pool.host}{path} {encoding}: {e!r}')
+            else:
+                report.add(encoding, response, (time.perf_counter() - start) * 1000)
+                if response.status >= 400:
+                    report.errors += 1
+                    report.failures.append(f'{pool.host}{path} {encoding}: HTTP {response.status}')
+            done += 1
+            if self.progress is not None:
+                self.progress(done, total)
+
+        try:
+            # one queue per host keeps at most connections_per_host tasks per host alive at a time
+            async def worker(pool: HostPool, queue: List[Tuple[str, str]]):
+                while queue:
+                    path, encoding = queue.pop()
+                    await fetch(pool, path, encoding)
+
+            workers = []
+            for pool in pools.values():
+                queue = [(p, e) for p in reversed(paths) for e in reversed(self.encodings)]
+                workers += [worker(pool, queue) for _ in range(self.connections_per_host)]
+            await asyncio.gather(*workers)
+        finally:
+            for pool in pools.values():
+                pool.close()
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    def warm(self, paths: List[str]) -> WarmReport:
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.warm_async(paths))
+        finally:
+            loop.close()
+
+
+def _print_progress(done: int, total: int):
+    if done == total or done % 100 == 0:
+        print(f'\r{done}/{total}', end='\n' if done == total else '', file=sys.stderr, flush=True)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Warm CloudFront edge caches after a deploy')
+    parser.add_argument('--host', action='append', required=True, help='Alias of the distribution, can be repeated')
+    parser.add_argument('--sitemap', help='Sitemap file or URL')
+    parser.add_argument('--keys', help='File with one changed object key per line')
+    parser.add_argument('paths', nargs='*', help='Paths to warm')
+    parser.add_argument('--encoding', action='append', help=f'Accept-Encoding variants, {DEFAULT_ENCODINGS} by default')
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS_PER_HOST, help='Connections per host')
+    parser.add_argument('--rate', type=float, help='Requests per second')
+    parser.add_argument('--scheme', default='https')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    paths = list(args.paths)
+    if args.sitemap:
+        paths += load_sitemap(args.sitemap)
+    if args.keys:
+        with open(args.keys) as f:
+            paths += paths_for_keys(line.strip() for line in f if line.strip())
+    if not paths:
+        parser.error('nothing to warm, pass paths, --sitemap or --keys')
+
+    warmer = Warmer(args.host, encodings=args.encoding, scheme=args.scheme, connections_per_host=args.connections,
+                    rate=args.rate, progress=None if args.json else _print_progress)
+    report = warmer.warm(paths)
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report.format())
+    if report.errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
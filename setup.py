@@ -23,4 +23,18 @@ setup(name='pulumi-aws-website',
       packages=find_packages(exclude=("tests",)),
       data_files=['requirements.txt'],
       install_requires=get_content('requirements.txt').split('\n'),
+      entry_points={
+          'console_scripts': [
+              'website-logs=pulumi_aws_website.logs:main',
+              'website-emulator=pulumi_aws_website.emulator:main',
+              'website-warm=pulumi_aws_website.warm:main',
+              'website-lint=pulumi_aws_website.lint:main',
+          ],
+      },
+      extras_require={
+          'sync': ['boto3'],
+          'compression': ['brotli'],
+          'images': ['Pillow'],
+          'simulate': ['numpy'],
+      },
       zip_safe=False)